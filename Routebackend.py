@@ -0,0 +1,508 @@
+"""System routing table backends.
+
+A backend lists, adds, deletes and replaces IPv4 routes given as routes file
+style records ({"ip", "mask", "gateway"}). Listed records also carry "metric"
+and "interface", like the ones parse_route_print returns, so they can be
+passed to plan_reconcile as {"active": records, "persistent": []}.
+
+  route.exe - Windows; each operation runs route.exe (needs elevation)
+  netlink   - Linux; talks rtnetlink over a socket, so operations spawn no
+              process and a batch goes to the kernel in a few sends
+  fake      - an in-memory table, for tests and for trying the tool out
+
+Operations return an exit code (0 for success) and pass any messages to an
+optional emit(line) callback, so results look the same whichever backend
+ran them. The backend is chosen at runtime by create_backend: ROUTES_BACKEND
+in the environment if set, otherwise the platform's native one.
+
+RouteTableMonitor watches a backend's table and reports only what changed,
+waking early on netlink change notifications where they are available.
+"""
+import abc
+import os
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+from Routecore import (
+    build_route_command, diff_route_snapshots, int_to_ip, ip_to_int, is_valid_ip, is_valid_mask,
+    iter_process_lines, mask_to_prefix, parse_route_print, prefix_to_mask, route_snapshot,
+)
+
+# Requests per send; every request is acknowledged, and the acks of one send
+# must fit in the receive buffer or the kernel drops them (ENOBUFS)
+NETLINK_BATCH_SIZE = 200
+NETLINK_RECEIVE_BUFFER = 1 << 20
+MONITOR_SETTLE = 0.2  # Seconds to let a burst of change notifications finish before listing
+
+# rtnetlink constants from linux/netlink.h and linux/rtnetlink.h
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RT_TABLE_MAIN = 254
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_NOWHERE = 255
+RTN_UNICAST = 1
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+RTMGRP_IPV4_ROUTE = 0x40
+NLMSG_HEADER = struct.Struct("=IHHII")  # length, type, flags, sequence, port id
+RTMSG = struct.Struct("=BBBBBBBBI")  # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+RTATTR = struct.Struct("=HH")  # length, type
+
+class RouteBackend(abc.ABC):
+    """Base class for routing table backends
+    
+    A backend that does not implement every abstract method cannot be
+    created, so a missing operation fails at once rather than mid-batch.
+    """
+    
+    name = None
+    
+    def needs_elevation(self):
+        """Whether changing routes needs a privileged helper process"""
+        return False
+    
+    @abc.abstractmethod
+    def list_routes(self):
+        """Return the installed IPv4 routes as records"""
+    
+    @abc.abstractmethod
+    def add(self, route, emit=None):
+        """Install a route; returns an exit code"""
+    
+    @abc.abstractmethod
+    def delete(self, route, emit=None):
+        """Remove an installed route; returns an exit code"""
+    
+    @abc.abstractmethod
+    def replace(self, route, emit=None):
+        """Point an installed prefix at the route's gateway; returns an exit code"""
+    
+    def apply(self, action, route, emit=None):
+        """Run one plan_reconcile style action ("add", "change" or "delete")"""
+        if action == "add":
+            return self.add(route, emit)
+        if action == "change":
+            return self.replace(route, emit)
+        return self.delete(route, emit)
+    
+    def apply_batch(self, operations, emit=None):
+        """Run a list of operation dicts with an "action", returning their exit codes in order
+        
+        emit, if given, is called with (index, line) for messages of the
+        operation at index.
+        """
+        exit_codes = []
+        for index, operation in enumerate(operations):
+            exit_codes.append(self.apply(operation["action"], operation,
+                                         emit and (lambda line, index=index: emit(index, line))))
+        return exit_codes
+    
+    def describe(self, action, route):
+        """The command line a user would type for the same operation"""
+        return build_route_command(action, route)
+    
+    def table_lines(self):
+        """Yield the routing table as text, in a layout parse_route_print reads"""
+        yield "IPv4 Route Table"
+        yield "Active Routes:"
+        yield "Network Destination        Netmask          Gateway       Interface  Metric"
+        for record in sorted(self.list_routes(), key=lambda record: (ip_to_int(record["ip"]),
+                                                                     ip_to_int(record["mask"]))):
+            yield (f"{record['ip']:>18} {record['mask']:>16} {record['gateway']:>16} "
+                   f"{record.get('interface', ''):>15} {record.get('metric', 0):>6}")
+    
+    def print_table(self, emit):
+        """Pass the routing table text to emit line by line; returns an exit code"""
+        for line in self.table_lines():
+            emit(line)
+        return 0
+    
+    def change_notifier(self):
+        """Return an object whose wait(timeout) returns True early when the table may have changed
+        
+        None means the backend cannot notify and the table has to be polled.
+        """
+        return None
+
+class RouteExeBackend(RouteBackend):
+    """Windows route.exe, one process per operation"""
+    
+    name = "route.exe"
+    
+    def needs_elevation(self):
+        return True
+    
+    def run(self, arguments, emit):
+        process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, errors="replace")
+        for line in iter_process_lines(process):
+            if emit:
+                emit(line)
+        return process.returncode
+    
+    def list_routes(self):
+        result = subprocess.run(["route", "print"], capture_output=True, universal_newlines=True)
+        tables = parse_route_print(result.stdout)
+        return tables["active"] + tables["persistent"]
+    
+    def add(self, route, emit=None):
+        return self.run(["route", "add", route["ip"], "mask", route["mask"], route["gateway"]], emit)
+    
+    def delete(self, route, emit=None):
+        return self.run(["route", "delete", route["ip"], "mask", route["mask"]], emit)
+    
+    def replace(self, route, emit=None):
+        return self.run(["route", "change", route["ip"], "mask", route["mask"], route["gateway"]], emit)
+    
+    def table_lines(self):
+        process = subprocess.Popen(["route", "print"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, errors="replace")
+        yield from iter_process_lines(process)
+
+class NetlinkBackend(RouteBackend):
+    """Linux main routing table over an rtnetlink socket
+    
+    Routes are added with protocol "static", like `ip route add`. A delete
+    matches on the prefix alone, like route.exe, and removes one route.
+    Failures are reported with the errno as exit code and the message `ip`
+    would print.
+    """
+    
+    name = "netlink"
+    
+    def __init__(self):
+        self.sequence = 0
+    
+    def needs_elevation(self):
+        return os.geteuid() != 0
+    
+    def _message(self, message_type, flags, route, with_gateway=True):
+        prefix_length = mask_to_prefix(ip_to_int(route["mask"]))
+        network = ip_to_int(route["ip"]) & prefix_to_mask(prefix_length)
+        if message_type == RTM_DELROUTE:
+            rtmsg = RTMSG.pack(socket.AF_INET, prefix_length, 0, 0, RT_TABLE_MAIN, 0, RT_SCOPE_NOWHERE, 0, 0)
+        else:
+            rtmsg = RTMSG.pack(socket.AF_INET, prefix_length, 0, 0, RT_TABLE_MAIN, RTPROT_STATIC,
+                               RT_SCOPE_UNIVERSE, RTN_UNICAST, 0)
+        attributes = RTATTR.pack(8, RTA_DST) + struct.pack("!I", network)
+        if with_gateway:
+            attributes += RTATTR.pack(8, RTA_GATEWAY) + socket.inet_aton(route["gateway"])
+        self.sequence += 1
+        header = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(rtmsg) + len(attributes), message_type,
+                                   flags | NLM_F_REQUEST, self.sequence, 0)
+        return self.sequence, header + rtmsg + attributes
+    
+    def _request(self, operation):
+        action = operation["action"]
+        if action == "add":
+            return self._message(RTM_NEWROUTE, NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL, operation)
+        if action == "change":
+            return self._message(RTM_NEWROUTE, NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE, operation)
+        return self._message(RTM_DELROUTE, NLM_F_ACK, operation, with_gateway=False)
+    
+    @staticmethod
+    def _messages(data):
+        """Yield (type, sequence, payload) for each netlink message in a datagram"""
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, message_type, flags, sequence, port = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+            yield message_type, sequence, data[offset + NLMSG_HEADER.size:offset + length]
+            offset += (length + 3) & ~3
+    
+    @staticmethod
+    def _attributes(payload):
+        attributes = {}
+        offset = RTMSG.size
+        while offset + RTATTR.size <= len(payload):
+            length, attribute_type = RTATTR.unpack_from(payload, offset)
+            if length < RTATTR.size:
+                break
+            attributes[attribute_type] = payload[offset + RTATTR.size:offset + length]
+            offset += (length + 3) & ~3
+        return attributes
+    
+    def list_routes(self):
+        records = []
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+            self.sequence += 1
+            rtmsg = RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)
+            sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(rtmsg), RTM_GETROUTE,
+                                        NLM_F_REQUEST | NLM_F_DUMP, self.sequence, 0) + rtmsg)
+            while True:
+                for message_type, sequence, payload in self._messages(sock.recv(65536)):
+                    if message_type == NLMSG_DONE:
+                        return records
+                    if message_type == NLMSG_ERROR:
+                        error = -struct.unpack_from("=i", payload)[0]
+                        raise OSError(error, os.strerror(error))
+                    if message_type != RTM_NEWROUTE:
+                        continue
+                    family, prefix_length, _, _, table, _, scope, route_type, _ = RTMSG.unpack_from(payload)
+                    attributes = self._attributes(payload)
+                    if RTA_TABLE in attributes:
+                        table = struct.unpack("=I", attributes[RTA_TABLE])[0]
+                    if table != RT_TABLE_MAIN or route_type != RTN_UNICAST:
+                        continue
+                    destination = attributes.get(RTA_DST, b"\0\0\0\0")
+                    gateway = attributes.get(RTA_GATEWAY)
+                    interface = ""
+                    if RTA_OIF in attributes:
+                        index = struct.unpack("=I", attributes[RTA_OIF])[0]
+                        try:
+                            interface = socket.if_indextoname(index)
+                        except OSError:
+                            interface = str(index)
+                    records.append({
+                        "ip": socket.inet_ntoa(destination),
+                        "mask": int_to_ip(prefix_to_mask(prefix_length)),
+                        "gateway": socket.inet_ntoa(gateway) if gateway else "On-link",
+                        "metric": struct.unpack("=I", attributes.get(RTA_PRIORITY, b"\0\0\0\0"))[0],
+                        "interface": interface,
+                    })
+    
+    def apply_batch(self, operations, emit=None):
+        """Send the operations to the kernel in a few datagrams and collect one ack per operation"""
+        exit_codes = [None] * len(operations)
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, NETLINK_RECEIVE_BUFFER)
+            for start in range(0, len(operations), NETLINK_BATCH_SIZE):
+                pending = {}
+                data = []
+                for index in range(start, min(start + NETLINK_BATCH_SIZE, len(operations))):
+                    sequence, message = self._request(operations[index])
+                    pending[sequence] = index
+                    data.append(message)
+                sock.send(b"".join(data))
+                while pending:
+                    for message_type, sequence, payload in self._messages(sock.recv(65536)):
+                        if message_type != NLMSG_ERROR or sequence not in pending:
+                            continue
+                        index = pending.pop(sequence)
+                        error = -struct.unpack_from("=i", payload)[0]
+                        exit_codes[index] = error
+                        if error and emit:
+                            emit(index, f"{self.describe(operations[index]['action'], operations[index])}: "
+                                 f"RTNETLINK answers: {os.strerror(error)}")
+        return exit_codes
+    
+    def apply(self, action, route, emit=None):
+        return self.apply_batch([dict(route, action=action)], emit and (lambda index, line: emit(line)))[0]
+    
+    def add(self, route, emit=None):
+        return self.apply("add", route, emit)
+    
+    def delete(self, route, emit=None):
+        return self.apply("delete", route, emit)
+    
+    def replace(self, route, emit=None):
+        return self.apply("change", route, emit)
+    
+    def change_notifier(self):
+        return NetlinkChangeNotifier()
+    
+    def describe(self, action, route):
+        cidr = f"{route['ip']}/{mask_to_prefix(ip_to_int(route['mask']))}"
+        if action == "delete":
+            return f"ip route del {cidr}"
+        return f"ip route {'replace' if action == 'change' else 'add'} {cidr} via {route['gateway']}"
+
+class NetlinkChangeNotifier:
+    """Wakes up on the kernel's IPv4 route change notifications"""
+    
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_IPV4_ROUTE))
+        self.sock.setblocking(False)
+    
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return False
+        # Only the fact that something changed matters; the table is listed afresh
+        try:
+            while self.sock.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError:
+            pass  # ENOBUFS: notifications were dropped, which is still a change
+        return True
+    
+    def close(self):
+        self.sock.close()
+
+class FakeRouteBackend(RouteBackend):
+    """In-memory routing table with route.exe's messages and exit codes"""
+    
+    name = "fake"
+    
+    def __init__(self, records=()):
+        self.table = {}  # (ip, mask) -> set of gateways
+        for record in records:
+            self.table.setdefault((record["ip"], record["mask"]), set()).add(record["gateway"])
+    
+    def list_routes(self):
+        return [{"ip": ip, "mask": mask, "gateway": gateway, "metric": 25, "interface": "127.0.0.1"}
+                for (ip, mask), gateways in self.table.items() for gateway in sorted(gateways)]
+    
+    def _result(self, message, exit_code, emit):
+        if emit:
+            emit(message)
+        return exit_code
+    
+    def add(self, route, emit=None):
+        key = (route["ip"], route["mask"])
+        if route["gateway"] in self.table.get(key, ()):
+            return self._result("The route addition failed: The object already exists.", 1, emit)
+        self.table.setdefault(key, set()).add(route["gateway"])
+        return self._result(" OK!", 0, emit)
+    
+    def delete(self, route, emit=None):
+        if self.table.pop((route["ip"], route["mask"]), None) is None:
+            return self._result("The route deletion failed: Element not found.", 1, emit)
+        return self._result(" OK!", 0, emit)
+    
+    def replace(self, route, emit=None):
+        key = (route["ip"], route["mask"])
+        if key not in self.table:
+            return self._result("The route change failed: Element not found.", 1, emit)
+        self.table[key] = {route["gateway"]}
+        return self._result(" OK!", 0, emit)
+
+def check_operation(operation):
+    """Return a clean copy of a route operation, or raise ValueError if it is not runnable
+    
+    Backends assume valid addresses, and the elevated helper must never pass
+    anything else to route.exe, so operations from outside are checked here.
+    """
+    action = operation.get("action")
+    if action not in ("add", "change", "delete"):
+        raise ValueError(f"unsupported action: {action}")
+    ip, mask, gateway = operation.get("ip", ""), operation.get("mask", ""), operation.get("gateway", "")
+    if not is_valid_ip(ip) or not is_valid_mask(mask):
+        raise ValueError(f"invalid route: {ip} mask {mask}")
+    if action != "delete" and not is_valid_ip(gateway):
+        raise ValueError(f"invalid gateway: {gateway}")
+    return {"action": action, "ip": ip, "mask": mask, "gateway": gateway}
+
+def result_status(exit_code):
+    """Describe a result's exit code the way bulk results are reported"""
+    if exit_code is None:
+        return "not run"
+    if exit_code == 0:
+        return "ok"
+    return f"failed (exit {exit_code})"
+
+BACKENDS = {backend.name: backend for backend in (RouteExeBackend, NetlinkBackend, FakeRouteBackend)}
+
+class RouteTableMonitor:
+    """Watches a backend's routing table on a worker thread and reports what changed
+    
+    The table is listed every interval seconds, and soon after a change
+    notification where the backend has them. on_event is called on the worker
+    thread with dicts of these types:
+      snapshot - {"time", "snapshot", "diff", "notified"} diff is None for the
+                 first listing and only reported when something changed
+      error    - {"time", "message"} listing failed; the monitor keeps trying
+    The last snapshot is kept in the snapshot attribute.
+    """
+    
+    def __init__(self, backend, interval, on_event):
+        self.backend = backend
+        self.interval = interval
+        self.on_event = on_event
+        self.snapshot = None
+        self.notifying = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def _run(self):
+        try:
+            notifier = self.backend.change_notifier()
+        except OSError:
+            notifier = None
+        self.notifying = notifier is not None
+        notified = False
+        try:
+            while not self.stopped.is_set():
+                self._check(notified)
+                notified = self._wait(notifier)
+        finally:
+            if notifier is not None:
+                notifier.close()
+    
+    def _check(self, notified):
+        try:
+            snapshot = route_snapshot(self.backend.list_routes())
+        except Exception as e:
+            self.on_event({"type": "error", "time": time.time(), "message": str(e)})
+            return
+        if self.snapshot is None:
+            diff = None
+        else:
+            diff = diff_route_snapshots(self.snapshot, snapshot)
+            if not (diff["added"] or diff["removed"] or diff["changed"]):
+                return
+        self.snapshot = snapshot
+        if not self.stopped.is_set():
+            self.on_event({"type": "snapshot", "time": time.time(), "snapshot": snapshot, "diff": diff,
+                           "notified": notified})
+    
+    def _wait(self, notifier):
+        """Wait for the next check; returns True when woken by a change notification"""
+        started = time.monotonic()
+        while not self.stopped.is_set():
+            remaining = started + self.interval - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Short waits keep stop() and interval changes responsive
+            if notifier is None:
+                self.stopped.wait(min(remaining, 0.5))
+            elif notifier.wait(min(remaining, 0.5)):
+                self.stopped.wait(MONITOR_SETTLE)
+                notifier.wait(0)
+                return True
+        return False
+
+def default_backend_name():
+    """The backend to use when none is named: ROUTES_BACKEND, else the platform's own"""
+    name = os.environ.get("ROUTES_BACKEND")
+    if name:
+        return name
+    if os.name == "nt":
+        return "route.exe"
+    if hasattr(socket, "AF_NETLINK"):
+        return "netlink"
+    return "fake"
+
+def create_backend(name=None):
+    """Create a backend by name, or the default one; raises ValueError for unknown names"""
+    name = name or default_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown routing backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
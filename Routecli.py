@@ -0,0 +1,468 @@
+"""Command line interface to the routes tools, for servers without a display.
+
+Usage: python Routecli.py {validate,info,plan,apply,export,merge,gateways,repoint,trace} ...
+
+Only Routecore and Routebackend are imported, never tkinter, so the tool starts quickly and runs
+from schedulers and configuration management. Exit status is 0 on success, 1
+when routes are invalid or commands fail, and 2 when a file cannot be read.
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+
+from Routebackend import BACKENDS, create_backend, result_status
+from Routecore import (
+    NAME_CONFLICT_POLICIES, PREFIX_CONFLICT_POLICIES, VALIDATION_MESSAGES, GatewayIndex, SqliteGatewayIndex,
+    SqliteRouteStore, aggregate_routes, compute_network_info, int_to_ip, is_sqlite_path, is_valid_ip, is_valid_mask,
+    load_site_files, merge_site_routes, parse_route_print, plan_reconcile, plan_repoint, read_destinations,
+    read_routes_file, route_prefix, simulate_flows, site_route_files, validate_routes_bulk, write_json_atomic,
+)
+
+class CliError(Exception):
+    """An error reported as a single line on stderr with exit status 2"""
+
+def load_routes(file_path):
+    """Read a routes file, turning read errors into CliError"""
+    try:
+        routes = read_routes_file(file_path)
+    except FileNotFoundError:
+        raise CliError(f"{file_path}: file not found")
+    except json.JSONDecodeError as e:
+        raise CliError(f"{file_path}: {e}")
+    if not isinstance(routes, dict) or not isinstance(routes.get("routes"), (dict, SqliteRouteStore)):
+        raise CliError(f'{file_path}: expected an object with a "routes" object')
+    if isinstance(routes["routes"], dict):
+        for name, details in routes["routes"].items():
+            if not isinstance(details, dict):
+                raise CliError(f'{file_path}: route "{name}" is not an object')
+    return routes["routes"]
+
+def get_backend(args):
+    """The routing backend named on the command line, or the platform's own"""
+    try:
+        backend = create_backend(args.backend)
+    except ValueError as e:
+        raise CliError(str(e))
+    if backend.name == "route.exe" and os.name != "nt":
+        raise CliError("route.exe is only available on Windows; choose another --backend")
+    return backend
+
+def read_system_routes(file_path, backend):
+    """Parse `route print` output from a file or stdin ("-"), or list the backend's routes"""
+    if file_path == "-":
+        return parse_route_print(sys.stdin.read())
+    if file_path:
+        with open(file_path, "r", errors="replace") as file:
+            return parse_route_print(file.read())
+    return {"active": backend.list_routes(), "persistent": []}
+
+def print_json(data):
+    json.dump(data, sys.stdout, indent=4)
+    sys.stdout.write("\n")
+
+def command_validate(args):
+    """Check every route the way the form does"""
+    table = validate_routes_bulk(load_routes(args.routes_file))
+    problems = []
+    for flag, message in VALIDATION_MESSAGES.items():
+        level = "WARNING" if flag == "route_ip_error" else "ERROR"
+        for name, error in zip(table["names"], table[flag]):
+            if error:
+                problems.append({"name": name, "level": level, "message": message})
+    errors = sum(1 for problem in problems if problem["level"] == "ERROR")
+    warnings = len(problems) - errors
+    
+    if args.json:
+        print_json({"routes": len(table["names"]), "errors": errors, "warnings": warnings,
+                    "problems": problems})
+    else:
+        for problem in problems:
+            print(f"{problem['level']}: {problem['name']}: {problem['message']}")
+        print(f"Validated {len(table['names'])} routes: {errors} errors, {warnings} warnings")
+    return 1 if errors else 0
+
+def command_info(args):
+    """Show subnet information for an address and mask, or for routes in a file"""
+    if args.ip:
+        ip, _, prefix_length = args.ip.partition("/")
+        mask = args.mask
+        if prefix_length:
+            if not prefix_length.isdigit() or int(prefix_length) > 32:
+                raise CliError(f"invalid prefix length: {prefix_length}")
+            mask = int_to_ip((0xFFFFFFFF << (32 - int(prefix_length))) & 0xFFFFFFFF)
+        if not mask:
+            raise CliError("give a mask with --mask or as IP/prefix")
+        if not is_valid_ip(ip):
+            raise CliError(f"invalid IP address: {ip}")
+        if not is_valid_mask(mask):
+            raise CliError(f"invalid subnet mask: {mask}")
+        entries = [(None, {"ip": ip, "mask": mask, "gateway": ""})]
+    elif args.routes_file:
+        routes = load_routes(args.routes_file)
+        if args.names:
+            missing = [name for name in args.names if name not in routes]
+            if missing:
+                raise CliError(f"no such route: {', '.join(missing)}")
+            entries = [(name, routes[name]) for name in args.names]
+        else:
+            entries = routes.items()
+    else:
+        raise CliError("give a routes file or --ip")
+    
+    results = []
+    for name, details in entries:
+        info = compute_network_info(details.get("ip", ""), details.get("mask", ""))
+        result = {"name": name, "ip": details.get("ip", ""), "mask": details.get("mask", ""),
+                  "gateway": details.get("gateway", "")}
+        if info is None:
+            result["error"] = "Invalid IP address or subnet mask"
+        else:
+            result.update(info)
+        results.append(result)
+        if not args.json:
+            label = f"{name}: " if name is not None else ""
+            if info is None:
+                print(f"{label}{result['error']}")
+            else:
+                warning = "" if info["route_ip_correct"] else "  (IP is not the network address)"
+                print(f"{label}{info['cidr']} broadcast {info['broadcast']} hosts {info['first_host']}"
+                      f"-{info['last_host']} ({info['num_hosts']} usable){warning}")
+    if args.json:
+        print_json(results)
+    return 1 if any("error" in result for result in results) else 0
+
+def plan_operations(args, routes, backend):
+    """The route operations requested on the command line, as plan_reconcile style dicts
+    
+    Routes that cannot be run are left out and reported on stderr as SKIPPED,
+    so plan shows exactly what apply would run.
+    """
+    if args.reconcile:
+        skipped = []
+        operations = plan_reconcile(routes, read_system_routes(args.route_print, backend), prune=args.prune,
+                                    skipped=skipped)
+        for name in skipped:
+            print(f"SKIPPED: {name}: invalid route", file=sys.stderr)
+    else:
+        names = args.names or list(routes)
+        missing = [name for name in names if name not in routes]
+        if missing:
+            raise CliError(f"no such route: {', '.join(missing)}")
+        operations = []
+        for name in names:
+            details = routes[name]
+            operations.append({"action": args.action, "name": name, "ip": details.get("ip", ""),
+                               "mask": details.get("mask", ""), "gateway": details.get("gateway", "")})
+    
+    # Never hand route.exe a route that the form would refuse
+    runnable = []
+    for operation in operations:
+        gateway_ok = operation["action"] == "delete" or is_valid_ip(operation["gateway"])
+        if route_prefix(operation) is None or not gateway_ok:
+            print(f"SKIPPED: {operation['name']}: invalid route", file=sys.stderr)
+        else:
+            runnable.append(operation)
+    return runnable
+
+def command_plan(args):
+    """Show the commands that bring the system table in line with the file"""
+    backend = get_backend(args)
+    operations = plan_operations(args, load_routes(args.routes_file), backend)
+    if args.json:
+        print_json(operations)
+    else:
+        for operation in operations:
+            print(backend.describe(operation["action"], operation))
+        print(f"{len(operations)} operations", file=sys.stderr)
+    return 0
+
+def command_apply(args):
+    """Apply each requested route with the backend, or print the commands with --dry-run"""
+    backend = get_backend(args)
+    runnable = plan_operations(args, load_routes(args.routes_file), backend)
+    
+    if args.dry_run:
+        for operation in runnable:
+            print(backend.describe(operation["action"], operation))
+        return 0
+    
+    output = [[] for operation in runnable]
+    exit_codes = backend.apply_batch(runnable, lambda index, line: output[index].append(line))
+    failed = 0
+    for operation, exit_code, lines in zip(runnable, exit_codes, output):
+        command = backend.describe(operation["action"], operation)
+        failed += exit_code != 0
+        print(f"{operation['name'] or command}: {result_status(exit_code)}")
+        for line in lines:
+            if line.strip():
+                print(f"    {line.strip()}")
+    print(f"Applied {len(runnable) - failed} of {len(runnable)} operations", file=sys.stderr)
+    return 1 if failed else 0
+
+def command_export(args):
+    """Write the routes to another file; the format follows the output extension"""
+    routes = load_routes(args.routes_file)
+    if args.aggregate:
+        routes, report = aggregate_routes(routes)
+        if not report["verified"]:
+            raise CliError("aggregated routes would change next hops; nothing written")
+        print(f"Aggregated {report['before']} routes into {report['after']}", file=sys.stderr)
+    
+    if args.output == "-":
+        print_json({"routes": dict(routes.items())})
+    elif is_sqlite_path(args.output):
+        SqliteRouteStore.create(args.output, routes)
+    else:
+        write_json_atomic({"routes": routes}, args.output)
+    if args.output != "-":
+        print(f"Wrote {len(routes)} routes to {args.output}", file=sys.stderr)
+    return 0
+
+def command_merge(args):
+    """Load per-site routes files in parallel and merge them into one routes file"""
+    file_paths = []
+    for path in args.paths:
+        file_paths.extend(site_route_files(path) if os.path.isdir(path) else [path])
+    if not file_paths:
+        raise CliError("no routes files found")
+    
+    def on_report(report):
+        if not args.json:
+            print(f"loaded {report['file_path']}", file=sys.stderr)
+    
+    reports = load_site_files(file_paths, on_report, workers=args.workers, use_processes=not args.threads)
+    merge = merge_site_routes(reports, args.names, args.prefixes)
+    routes = merge["routes"]
+    if args.output == "-":
+        print_json({"routes": dict(routes.items())})
+    elif is_sqlite_path(args.output):
+        SqliteRouteStore.create(args.output, routes)
+    else:
+        write_json_atomic({"routes": routes}, args.output)
+    if args.sources:
+        write_json_atomic(merge["sources"], args.sources)
+    
+    files = [{key: value for key, value in report.items() if key != "routes"} for report in reports]
+    failed = sum(1 for report in files if report["error"])
+    if args.json:
+        print_json({"files": files, "conflicts": merge["conflicts"], "routes": len(routes)})
+    else:
+        # Slowest first, so the files worth a look are at the top
+        for report in sorted(files, key=lambda report: -report["seconds"]):
+            status = f"FAILED: {report['error']}" if report["error"] else \
+                f"{report['count']} routes, {report['errors']} errors, {report['warnings']} warnings"
+            print(f"{report['seconds'] * 1000:9.1f} ms  {report['file_path']}: {status}")
+        for conflict in merge["conflicts"]:
+            print(f"CONFLICT ({conflict['kind']}): {conflict['route']} in {', '.join(conflict['files'])}: "
+                  f"{conflict['resolution']}")
+    if args.output != "-":
+        print(f"Merged {len(routes)} routes from {len(files) - failed} of {len(files)} files into {args.output}, "
+              f"{len(merge['conflicts'])} conflicts", file=sys.stderr)
+    return 2 if failed else 0
+
+def gateway_index(routes):
+    """A switch address index over a routes dict, or the store's own for a SQLite route store"""
+    if isinstance(routes, SqliteRouteStore):
+        return SqliteGatewayIndex(routes)
+    return GatewayIndex(routes)
+
+def command_gateways(args):
+    """Count the routes per switch address, or list the routes through one"""
+    gateways = gateway_index(load_routes(args.routes_file))
+    if args.gateway is not None:
+        names = gateways.routes_for(args.gateway)
+        if args.json:
+            print_json(names)
+        else:
+            for name in names:
+                print(name)
+            print(f"{len(names)} routes through {args.gateway}", file=sys.stderr)
+        return 0
+    counts = gateways.counts()
+    if args.json:
+        print_json([{"gateway": gateway, "routes": count} for gateway, count in counts])
+    else:
+        for gateway, count in counts:
+            print(f"{count:8}  {gateway or '(none)'}")
+    return 0
+
+def command_repoint(args):
+    """Move every route through one switch address to another, and print the system table commands for it"""
+    if not is_valid_ip(args.new_gateway):
+        raise CliError(f"invalid switch address: {args.new_gateway}")
+    backend = get_backend(args)
+    routes = load_routes(args.routes_file)
+    route_names = gateway_index(routes).routes_for(args.gateway)
+    if not route_names:
+        raise CliError(f"no routes through {args.gateway}")
+    changes, operations = plan_repoint(routes, route_names, args.new_gateway)
+    
+    if args.json:
+        print_json(operations)
+    else:
+        for operation in operations:
+            print(backend.describe(operation["action"], operation))
+    if args.dry_run:
+        return 0
+    output = args.output or args.routes_file
+    if isinstance(routes, SqliteRouteStore) and output == args.routes_file:
+        routes.apply_changes([(name, after) for name, before, after in changes])  # One transaction
+    else:
+        routes = dict(routes.items())
+        routes.update((name, after) for name, before, after in changes)
+        if is_sqlite_path(output):
+            SqliteRouteStore.create(output, routes)
+        else:
+            write_json_atomic({"routes": routes}, output)
+            if output == args.routes_file and os.path.exists(f"{output}.journal"):
+                os.remove(f"{output}.journal")  # Already folded into the file
+    print(f"Re-pointed {len(changes)} routes from {args.gateway} to {args.new_gateway} in {output}", file=sys.stderr)
+    return 0
+
+def command_trace(args):
+    """Resolve a destination list against the routes and report where its traffic would go"""
+    routes = load_routes(args.routes_file)
+    system_routes = None
+    if args.route_print or args.system:
+        system_routes = read_system_routes(args.route_print, None if args.route_print else get_backend(args))
+    column = int(args.column) if args.column and args.column.isdigit() else args.column
+    try:
+        if args.destinations == "-":
+            report = simulate_flows(routes, read_destinations(sys.stdin, column), system_routes)
+        else:
+            with open(args.destinations, "r", errors="replace") as file:
+                report = simulate_flows(routes, read_destinations(file, column), system_routes)
+    except ValueError as e:
+        raise CliError(f"{args.destinations}: {e}")
+    
+    if args.json:
+        print_json(report)
+        return 0
+    rate = report["destinations"] / report["seconds"] if report["seconds"] else 0
+    print(f"Traced {report['destinations']} destinations in {report['seconds']:.2f} s ({rate:,.0f} per second): "
+          f"{report['matched']} matched, {report['unmatched']} unmatched, {report['invalid']} invalid")
+    busiest = heapq.nlargest(args.top, report["route_hits"].items(), key=lambda item: item[1])
+    for name, hits in busiest:
+        if hits:
+            print(f"{hits:10}  {name}  {routes[name].get('gateway', '')}")
+    idle = sum(1 for hits in report["route_hits"].values() if not hits)
+    print(f"{idle} of {len(report['route_hits'])} routes carried nothing")
+    for cidr, hits in heapq.nlargest(args.top, report["system_hits"].items(), key=lambda item: item[1]):
+        print(f"{hits:10}  system route {cidr}")
+    if report["unmatched_sample"]:
+        print(f"Unmatched, e.g. {', '.join(report['unmatched_sample'])}")
+    if system_routes is not None:
+        print(f"{report['changed']} destinations change next hop")
+        for change in report["changes"][:args.top]:
+            print(f"{change['count']:10}  {change['old'] or '(no route)'} -> {change['new'] or '(no route)'}"
+                  f"  e.g. {', '.join(change['sample'][:3])}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="Routecli.py",
+                                     description="Validate, inspect, plan and apply routes files without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    validate = commands.add_parser("validate", help="validate every route in a routes file")
+    validate.add_argument("routes_file")
+    validate.add_argument("--json", action="store_true", help="print the results as JSON")
+    validate.set_defaults(handler=command_validate)
+    
+    info = commands.add_parser("info", help="subnet information for an address or for routes")
+    info.add_argument("routes_file", nargs="?")
+    info.add_argument("names", nargs="*", help="routes to show (default: all)")
+    info.add_argument("--ip", help="address, or address/prefix, to describe instead of a file")
+    info.add_argument("--mask", help="subnet mask for --ip")
+    info.add_argument("--json", action="store_true", help="print the results as JSON")
+    info.set_defaults(handler=command_info)
+    
+    for name, handler, help_text in (
+            ("plan", command_plan, "show the commands needed to apply a routes file"),
+            ("apply", command_apply, "apply a routes file to the system routing table")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("routes_file")
+        sub.add_argument("--action", choices=("add", "delete"),
+                         help="add or delete the routes as listed instead of reconciling with the system table")
+        sub.add_argument("--names", nargs="+", help="routes to use with --action (default: all)")
+        sub.add_argument("--route-print", metavar="FILE",
+                         help="`route print` output to reconcile against (- for stdin; default: ask the backend)")
+        sub.add_argument("--backend", choices=sorted(BACKENDS),
+                         help="routing table backend (default: ROUTES_BACKEND or the platform's own)")
+        sub.add_argument("--prune", action="store_true",
+                         help="also delete system routes through the file's switch addresses that are not in it")
+        if name == "plan":
+            sub.add_argument("--json", action="store_true", help="print the operations as JSON")
+        else:
+            sub.add_argument("--dry-run", action="store_true", help="print the commands instead of running them")
+        sub.set_defaults(handler=handler)
+    
+    export = commands.add_parser("export", help="convert a routes file to JSON or a SQLite route store")
+    export.add_argument("routes_file")
+    export.add_argument("output", help="output file (.json, .db/.sqlite/.sqlite3, or - for stdout)")
+    export.add_argument("--aggregate", action="store_true", help="merge routes into supernets first")
+    export.set_defaults(handler=command_export)
+    
+    merge = commands.add_parser("merge", help="merge per-site routes files (or folders of them) into one")
+    merge.add_argument("paths", nargs="+", help="routes files, or folders whose routes files are all merged")
+    merge.add_argument("--output", required=True, help="merged routes file (.json, .db/.sqlite/.sqlite3, or -)")
+    merge.add_argument("--names", choices=NAME_CONFLICT_POLICIES, default="rename",
+                       help="a route name in several files: rename it name@site, or keep the first or last")
+    merge.add_argument("--prefixes", choices=PREFIX_CONFLICT_POLICIES, default="keep",
+                       help="a prefix with different switch addresses: keep all, or the first or last file's")
+    merge.add_argument("--sources", metavar="FILE", help="also write a JSON map of route name to source file")
+    merge.add_argument("--workers", type=int, help="files loaded at once (default: one per CPU)")
+    merge.add_argument("--threads", action="store_true", help="load on threads instead of processes")
+    merge.add_argument("--json", action="store_true", help="print per-file timings and conflicts as JSON")
+    merge.set_defaults(handler=command_merge)
+    
+    gateways = commands.add_parser("gateways", help="count the routes per switch address")
+    gateways.add_argument("routes_file")
+    gateways.add_argument("gateway", nargs="?", help="list the routes through this switch address instead")
+    gateways.add_argument("--json", action="store_true", help="print the results as JSON")
+    gateways.set_defaults(handler=command_gateways)
+    
+    repoint = commands.add_parser("repoint", help="move every route through a switch address to a new one")
+    repoint.add_argument("routes_file")
+    repoint.add_argument("gateway", help="current switch address")
+    repoint.add_argument("new_gateway", help="new switch address")
+    repoint.add_argument("--output", help="write the changed routes here instead of back to routes_file")
+    repoint.add_argument("--dry-run", action="store_true", help="only print the system table commands")
+    repoint.add_argument("--backend", choices=sorted(BACKENDS),
+                         help="backend whose commands are printed (default: ROUTES_BACKEND or the platform's own)")
+    repoint.add_argument("--json", action="store_true", help="print the operations as JSON")
+    repoint.set_defaults(handler=command_repoint)
+    
+    trace = commands.add_parser("trace", help="resolve a destination list against a routes file")
+    trace.add_argument("routes_file")
+    trace.add_argument("destinations", help="CSV or flow-log export with a destination column, or - for stdin")
+    trace.add_argument("--column", help="name or 0-based number of the destination column (default: by header)")
+    trace.add_argument("--route-print", metavar="FILE",
+                       help="`route print` output to layer under the routes and compare with (- for stdin)")
+    trace.add_argument("--system", action="store_true",
+                       help="layer the backend's routing table under the routes and compare with it")
+    trace.add_argument("--backend", choices=sorted(BACKENDS),
+                       help="routing table backend for --system (default: ROUTES_BACKEND or the platform's own)")
+    trace.add_argument("--top", type=int, default=10, help="routes and next hop changes to list (default: 10)")
+    trace.add_argument("--json", action="store_true", help="print the full report as JSON")
+    trace.set_defaults(handler=command_trace)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("plan", "apply"):
+        args.reconcile = args.action is None
+        if args.names and args.action is None:
+            build_parser().error("--names needs --action")
+    try:
+        return args.handler(args)
+    except CliError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
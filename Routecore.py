@@ -0,0 +1,2416 @@
+"""Route model, validation, subnet math and route command generation.
+
+Everything here works without a display; Routegui.py builds the window on
+top of it and Routecli.py exposes it on the command line.
+"""
+import json
+import sqlite3
+import os
+import array
+import socket
+import uuid
+import threading
+import queue
+import re
+import time
+import collections.abc
+import codecs
+import functools
+import bisect
+import heapq
+import itertools
+import concurrent.futures
+
+# Route edits are journaled; the routes file is rewritten after this many edits
+JOURNAL_COMPACT_EVERY = 200
+
+# Undo history keeps this many edits
+HISTORY_LIMIT = 1000
+
+# Routes files are read in chunks on a worker and handed over in batches
+ROUTE_LOAD_CHUNK_SIZE = 1 << 20
+ROUTE_LOAD_BATCH_MAX = 1000
+
+# Routes files with these extensions are SQLite route stores instead of JSON
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# A compact route table rebuilds its columns once this many deleted slots make up half of them
+COMPACT_TABLE_MIN_GARBAGE = 1024
+
+# Merging per-site routes files: what to do when a route name, or a prefix
+# with a different switch address, comes from more than one file. The merged
+# view is saved by default under MERGED_ROUTES_FILE, which folder merges skip.
+NAME_CONFLICT_POLICIES = ("rename", "first", "last")
+PREFIX_CONFLICT_POLICIES = ("keep", "first", "last")
+MERGED_ROUTES_FILE = "merged_routes.json"
+
+# Messages for the validation flags of validate_routes_bulk
+VALIDATION_MESSAGES = {
+    "ip_error": "Invalid IP address format",
+    "mask_error": "Invalid subnet mask format",
+    "gateway_error": "Invalid Switch address format",
+    "route_ip_error": "The route IP is not set to the network address",
+}
+
+# Flow traces read destination files in chunks of this many characters and
+# resolve the destinations in batches of this many
+DESTINATION_READ_SIZE = 1 << 22
+FLOW_BATCH_SIZE = 1 << 18
+
+# Headers of the destination column in CSV and flow-log exports, in order of preference
+DESTINATION_COLUMNS = ("dstaddr", "dst_addr", "dst_ip", "dstip", "dest_ip", "destination_ip", "destination",
+                       "dst", "dest", "daddr")
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """Import NumPy on first use, or return None if it is not installed
+    
+    Kept out of module import so that the command line starts quickly.
+    """
+    try:
+        import numpy
+    except ImportError:  # Bulk validation falls back to a pure Python path
+        return None
+    return numpy
+
+def iter_process_lines(process):
+    """Yield lines of a process's stdout as soon as they are written"""
+    for line in process.stdout:
+        yield line.rstrip("\r\n")
+    process.wait()
+
+def write_json_atomic(data, file_path):
+    """Write JSON to a temp file next to file_path and rename it into place
+    
+    Readers see either the old or the new file, never a partly written one.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(temp_path, "w") as file:
+            if isinstance(data.get("routes"), (SqliteRouteStore, CompactRouteTable)):
+                data["routes"].dump_json(file)  # Streamed, never held in memory as dicts
+            else:
+                json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def dump_routes_json(items, file):
+    """Write (name, details) pairs to an open file as json.dump({"routes": ...}, indent=4) would"""
+    file.write('{\n    "routes": {')
+    separator = "\n"
+    for name, details in items:
+        route = json.dumps(details, indent=4).replace("\n", "\n        ")
+        file.write(f"{separator}        {json.dumps(name)}: {route}")
+        separator = ",\n"
+    file.write("\n    }\n}" if separator == ",\n" else "}\n}")
+
+class RoutesFileError(json.JSONDecodeError):
+    """A routes file that is not valid JSON, with the line and column of the error"""
+    
+    def __init__(self, msg, pos, lineno, colno):
+        ValueError.__init__(self, f"{msg}: line {lineno} column {colno} (char {pos})")
+        self.msg = msg
+        self.doc = None
+        self.pos = pos
+        self.lineno = lineno
+        self.colno = colno
+    
+    def __reduce__(self):
+        return self.__class__, (self.msg, self.pos, self.lineno, self.colno)
+
+class RoutesFileReader:
+    """Incremental reader for {"routes": {...}} JSON files
+    
+    The file is read in chunks and routes are decoded as soon as they are
+    complete, so they can be used before the whole file has been read and
+    only about a chunk of text is held at a time. Top-level keys other than
+    "routes" are skipped. Syntax errors raise RoutesFileError with the
+    position in the file, as json.load would.
+    
+    All complete routes in a chunk are normally decoded with one call to the
+    json module, by cutting the text after the last "}," and decoding it as
+    an object. That is only trusted if every route decodes to a flat object:
+    a cut inside a string cannot decode, and a cut after a nested object
+    leaves that object inside the last route. Anything else is decoded one
+    route at a time, which is also what locates syntax errors.
+    """
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    
+    def __init__(self, file, chunk_size=ROUTE_LOAD_CHUNK_SIZE):
+        self.file = file  # Opened in binary mode
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0      # Position in the file of buffer[0]
+        self.line = 1        # Line number at buffer[0]
+        self.line_start = 0  # Position in the file where that line starts
+        self.bytes_read = 0
+        self.eof = False
+        self.slow_until = 0  # Decode one route at a time up to this position in the file
+    
+    def _fill(self):
+        """Drop the text already parsed and read the next chunk; returns False at end of file"""
+        if self.eof:
+            return False
+        done = self.buffer[:self.pos]
+        newlines = done.count("\n")
+        if newlines:
+            self.line += newlines
+            self.line_start = self.offset + done.rfind("\n") + 1
+        self.offset += self.pos
+        
+        data = self.file.read(self.chunk_size)
+        self.bytes_read += len(data)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return True
+    
+    def _error(self, msg, pos):
+        newline = self.buffer.rfind("\n", 0, pos)
+        lineno = self.line + self.buffer.count("\n", 0, pos)
+        colno = pos - newline if newline >= 0 else self.offset + pos - self.line_start + 1
+        return RoutesFileError(msg, self.offset + pos, lineno, colno)
+    
+    def _peek(self):
+        """Skip whitespace and return the next character, or "" at end of file"""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+    
+    def _expect(self, chars, msg):
+        char = self._peek()
+        if not char or char not in chars:
+            raise self._error(msg, self.pos)
+        self.pos += 1
+        return char
+    
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Most likely the value runs on into the next chunk
+                if self._fill():
+                    continue
+                raise self._error(e.msg, e.pos)
+            # A number cut at the end of the buffer decodes short: "1500" of "1500.25", or "1" of "1e+5",
+            # leaving at most the two characters "e+" undecoded, so it may continue in the next chunk
+            if end >= len(self.buffer) - 2 and self.buffer[self.pos] in "-0123456789" and self._fill():
+                continue
+            self.pos = end
+            return value
+    
+    def _key(self):
+        if self._peek() != '"':
+            raise self._error("Expecting property name enclosed in double quotes", self.pos)
+        key = self._value()
+        self._expect(":", "Expecting ':' delimiter")
+        return key
+    
+    def _routes_in_buffer(self):
+        """Decode every complete route left in the buffer at once, or return None"""
+        if self.offset + self.pos < self.slow_until:
+            return None
+        end = self.buffer.rfind("},", self.pos)
+        if end < 0:
+            return None
+        try:
+            routes = self.json_decoder.decode(f"{{{self.buffer[self.pos:end + 1]}}}")
+            flat = all(type(details) is dict and
+                       not any(isinstance(value, (dict, list)) for value in details.values())
+                       for details in routes.values())
+        except ValueError:
+            flat = False
+        if not flat:
+            self.slow_until = self.offset + end + 1
+            return None
+        self.pos = end + 1
+        return routes
+    
+    def __iter__(self):
+        """Yield (name, details) for each route in the file"""
+        self._expect("{", "Expecting value")
+        if self._peek() == "}":
+            self.pos += 1
+        else:
+            while True:
+                if self._key() != "routes":
+                    self._value()
+                elif self._peek() != "{":
+                    raise self._error("Expecting an object of routes", self.pos)
+                else:
+                    self.pos += 1
+                    if self._peek() == "}":
+                        self.pos += 1
+                    else:
+                        while True:
+                            self._peek()
+                            routes = self._routes_in_buffer()
+                            if routes is not None:
+                                yield from routes.items()
+                            else:
+                                name = self._key()
+                                yield name, self._value()
+                            if self._expect(",}", "Expecting ',' delimiter") == "}":
+                                break
+                if self._expect(",}", "Expecting ',' delimiter") == "}":
+                    break
+        if self._peek():
+            raise self._error("Extra data", self.pos)
+
+class RouteFileLoad:
+    """A routes file read on a worker thread and handed to the UI in batches
+    
+    The worker puts ("routes", [(name, details, prefix), ...]) on a small
+    bounded queue, so it never runs far ahead of the UI, and ends with
+    ("done", [...]) or ("error", exception). Each route comes with its
+    route_prefix, so the UI thread does not have to parse addresses. Batches
+    start small so the first routes show up at once, then grow to
+    ROUTE_LOAD_BATCH_MAX.
+    """
+    
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.size = os.path.getsize(file_path)
+        self.bytes_read = 0
+        self.routes_read = 0
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+        self.queue = queue.Queue(maxsize=16)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        # Kept by the UI: routes not yet added to the route browser
+        self.pending = {}
+        self.shown_at = 0.0
+    
+    def start(self):
+        self.thread.start()
+    
+    def cancel(self):
+        self.cancelled.set()
+    
+    def progress(self):
+        """Fraction of the file read so far"""
+        return self.bytes_read / self.size if self.size else 1.0
+    
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _run(self):
+        try:
+            with open(self.file_path, "rb") as file:
+                reader = RoutesFileReader(file)
+                batch = []
+                batch_size = 100
+                for route_name, details in reader:
+                    prefix = route_prefix(details) if isinstance(details, dict) else None
+                    batch.append((route_name, details, prefix))
+                    if len(batch) >= batch_size:
+                        self.bytes_read = reader.bytes_read
+                        self.routes_read += len(batch)
+                        if not self._put(("routes", batch)):
+                            return
+                        batch = []
+                        batch_size = min(batch_size * 2, ROUTE_LOAD_BATCH_MAX)
+                self.bytes_read = reader.bytes_read
+                self.routes_read += len(batch)
+                self._put(("done", batch))
+        except Exception as e:
+            self._put(("error", e))
+
+class RouteJournal:
+    """Append-only change journal kept next to a routes file
+    
+    Each route edit appends one JSON line ({"set": name, "route": {...}} or
+    {"delete": name}) to <routes file>.journal, so an edit costs the size of
+    the change; edits made together are one {"batch": [...]} line, so they
+    are replayed all or not at all. compact() writes the full routes file atomically and empties
+    the journal. Loading reads the routes file and replays the journal on top;
+    a torn last line from a crash mid-append is ignored.
+    """
+    
+    def __init__(self, file_path, compact_every=JOURNAL_COMPACT_EVERY):
+        self.file_path = file_path
+        self.journal_path = f"{file_path}.journal"
+        self.compact_every = compact_every
+        self.entries = 0
+    
+    def read(self):
+        """Yield the journaled changes as (name, route or None for deleted)"""
+        self.entries = 0
+        if not os.path.exists(self.journal_path):
+            return
+        valid_length = 0
+        with open(self.journal_path, "rb") as journal:
+            for line in journal:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn write at the end of the journal
+                valid_length += len(line)
+                for entry in entry["batch"] if "batch" in entry else [entry]:
+                    self.entries += 1
+                    if "set" in entry:
+                        yield entry["set"], entry["route"]
+                    else:
+                        yield entry["delete"], None
+        
+        # Cut off a torn tail so later appends start on a clean line
+        if valid_length < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as journal:
+                journal.truncate(valid_length)
+    
+    def replay(self, routes):
+        """Apply the journal to a loaded routes dict; returns the number of entries applied"""
+        for route_name, route in self.read():
+            if route is not None:
+                routes["routes"][route_name] = route
+            else:
+                routes["routes"].pop(route_name, None)
+        return self.entries
+    
+    def record(self, route_name, route):
+        """Append a change (route None means deleted); returns True when compaction is due"""
+        return self.record_batch([(route_name, route)])
+    
+    def record_batch(self, changes):
+        """Append changes of several (name, route or None) as one line; returns True when compaction is due"""
+        entries = [{"set": route_name, "route": route} if route is not None else {"delete": route_name}
+                   for route_name, route in changes]
+        with open(self.journal_path, "a") as journal:
+            journal.write(json.dumps(entries[0] if len(entries) == 1 else {"batch": entries}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.entries += len(entries)
+        return self.entries >= self.compact_every
+    
+    def compact(self, routes):
+        """Write the full routes file atomically and empty the journal"""
+        write_json_atomic(routes, self.file_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.entries = 0
+
+class _TrieLeaf:
+    """The (key, value) pairs whose keys share one hash; more than one only on a full hash collision"""
+    
+    __slots__ = ("hash", "pairs")
+    
+    def __init__(self, key_hash, pairs):
+        self.hash = key_hash
+        self.pairs = pairs
+
+_TRIE_BITS = 5
+_TRIE_MASK = (1 << _TRIE_BITS) - 1
+_EMPTY_TRIE = (None,) * (1 << _TRIE_BITS)
+
+def _trie_hash(key):
+    return hash(key) & 0xFFFFFFFFFFFFFFFF
+
+def _trie_set(node, key_hash, shift, key, value):
+    """Return a copy of node with key set, and whether the key is new"""
+    index = (key_hash >> shift) & _TRIE_MASK
+    entry = node[index]
+    if entry is None:
+        new, added = _TrieLeaf(key_hash, ((key, value),)), True
+    elif type(entry) is _TrieLeaf:
+        if entry.hash == key_hash:
+            pairs = tuple(pair for pair in entry.pairs if pair[0] != key)
+            new, added = _TrieLeaf(key_hash, pairs + ((key, value),)), len(pairs) == len(entry.pairs)
+        else:
+            # Two hashes share this slot: move the leaf one level down and try again there
+            child = list(_EMPTY_TRIE)
+            child[(entry.hash >> (shift + _TRIE_BITS)) & _TRIE_MASK] = entry
+            new, added = _trie_set(tuple(child), key_hash, shift + _TRIE_BITS, key, value)
+    else:
+        new, added = _trie_set(entry, key_hash, shift + _TRIE_BITS, key, value)
+    return node[:index] + (new,) + node[index + 1:], added
+
+def _trie_remove(node, key_hash, shift, key):
+    """Return a copy of node without key, None if that leaves it empty, or node itself if key is absent"""
+    index = (key_hash >> shift) & _TRIE_MASK
+    entry = node[index]
+    if entry is None:
+        return node
+    if type(entry) is _TrieLeaf:
+        if entry.hash != key_hash:
+            return node
+        pairs = tuple(pair for pair in entry.pairs if pair[0] != key)
+        if len(pairs) == len(entry.pairs):
+            return node
+        new = _TrieLeaf(key_hash, pairs) if pairs else None
+    else:
+        new = _trie_remove(entry, key_hash, shift + _TRIE_BITS, key)
+        if new is entry:
+            return node
+    node = node[:index] + (new,) + node[index + 1:]
+    return node if any(node) else None
+
+def _trie_items(entry):
+    if entry is None:
+        return
+    if type(entry) is _TrieLeaf:
+        yield from entry.pairs
+        return
+    for child in entry:
+        yield from _trie_items(child)
+
+def _trie_diff(left, right, missing):
+    if left is right:
+        return  # Shared by both versions
+    if type(left) is tuple and type(right) is tuple:
+        for left_entry, right_entry in zip(left, right):
+            if left_entry is not right_entry:
+                yield from _trie_diff(left_entry, right_entry, missing)
+        return
+    right_items = dict(_trie_items(right))
+    for key, value in _trie_items(left):
+        other = right_items.pop(key, missing)
+        if other is missing or other != value:
+            yield key, value, other
+    for key, value in right_items.items():
+        yield key, missing, value
+
+class PersistentMap:
+    """Immutable hash map (a hash array mapped trie)
+    
+    set and remove return a new map that shares every node off the changed
+    path with the old one, so each costs O(log n) time and memory and old
+    versions stay valid. diff skips the shared nodes of two versions, so it
+    costs about as much as the keys that differ.
+    """
+    
+    __slots__ = ("root", "size")
+    
+    def __init__(self, root=_EMPTY_TRIE, size=0):
+        self.root = root
+        self.size = size
+    
+    def __len__(self):
+        return self.size
+    
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+    
+    def __iter__(self):
+        return (key for key, value in _trie_items(self.root))
+    
+    def items(self):
+        return _trie_items(self.root)
+    
+    def get(self, key, default=None):
+        key_hash = _trie_hash(key)
+        node = self.root
+        shift = 0
+        while True:
+            entry = node[(key_hash >> shift) & _TRIE_MASK]
+            if entry is None:
+                return default
+            if type(entry) is _TrieLeaf:
+                if entry.hash == key_hash:
+                    for pair_key, value in entry.pairs:
+                        if pair_key == key:
+                            return value
+                return default
+            node = entry
+            shift += _TRIE_BITS
+    
+    def set(self, key, value):
+        root, added = _trie_set(self.root, _trie_hash(key), 0, key, value)
+        return PersistentMap(root, self.size + added)
+    
+    def remove(self, key):
+        root = _trie_remove(self.root, _trie_hash(key), 0, key)
+        if root is self.root:
+            return self
+        return PersistentMap(root or _EMPTY_TRIE, self.size - 1)
+    
+    def diff(self, other, missing=None):
+        """Yield (key, value here, value in other) for keys that differ, with missing for absent ones"""
+        return _trie_diff(self.root, other.root, missing)
+
+# Marks a route in a history state that has not been edited, i.e. is as loaded
+_ORIGINAL = object()
+
+class RouteHistory:
+    """Undo/redo history of route edits, from which any earlier state can be restored
+    
+    Each entry holds its changes and a PersistentMap from every route edited
+    so far to its details at that point (None once deleted). Consecutive
+    entries share all but the edited paths, so an entry costs about the size
+    of its changes; routes never edited are as loaded and kept once, in
+    originals. Moving between two entries diffs their maps, which costs
+    O(k log n) for the k routes that differ, however large the routes file.
+    """
+    
+    def __init__(self, limit=HISTORY_LIMIT):
+        self.limit = limit
+        self.originals = {}
+        self.entries = [{"time": time.time(), "description": "Opened", "changes": [], "state": PersistentMap()}]
+        self.position = 0
+    
+    @property
+    def can_undo(self):
+        return self.position > 0
+    
+    @property
+    def can_redo(self):
+        return self.position < len(self.entries) - 1
+    
+    def record(self, description, changes):
+        """Add an entry after the current one, dropping the entries that could be redone
+        
+        changes are (route name, details before, details after), with None
+        for a route that does not exist.
+        """
+        if not changes:
+            return
+        state = self.entries[self.position]["state"]
+        for route_name, before, after in changes:
+            if route_name not in self.originals:
+                self.originals[route_name] = dict(before) if before is not None else None
+            state = state.set(route_name, dict(after) if after is not None else None)
+        del self.entries[self.position + 1:]
+        self.entries.append({"time": time.time(), "description": description,
+                             "changes": [(route_name, after) for route_name, before, after in changes],
+                             "state": state})
+        if len(self.entries) > self.limit:
+            del self.entries[:len(self.entries) - self.limit]
+        self.position = len(self.entries) - 1
+    
+    def move_to(self, index):
+        """Make entry index the current one; returns the (route name, details or None) changes that get there"""
+        current = self.entries[self.position]["state"]
+        target = self.entries[index]["state"]
+        changes = []
+        for route_name, now, then in current.diff(target, _ORIGINAL):
+            if now is _ORIGINAL:
+                now = self.originals[route_name]
+            if then is _ORIGINAL:
+                then = self.originals[route_name]
+            if now != then:
+                changes.append((route_name, dict(then) if then is not None else None))
+        self.position = index
+        return changes
+    
+    def undo(self):
+        return self.move_to(self.position - 1)
+    
+    def redo(self):
+        return self.move_to(self.position + 1)
+
+def read_routes_file(file_path):
+    """Read a routes file in one go: JSON with its journal replayed, or a SQLite route store"""
+    if is_sqlite_path(file_path):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"No such route store: {file_path}")
+        return {"routes": SqliteRouteStore(file_path)}
+    with open(file_path, "r") as file:
+        routes = json.load(file)
+    RouteJournal(file_path).replay(routes)
+    return routes
+
+def build_route_command(action, details):
+    """Build the route.exe command line for adding, changing or deleting a route"""
+    if action == "add":
+        return f"route add {details['ip']} mask {details['mask']} {details['gateway']}"
+    if action == "change":
+        return f"route change {details['ip']} mask {details['mask']} {details['gateway']}"
+    return f"route delete {details['ip']} mask {details['mask']}"
+
+def ip_to_int(ip_str):
+    """Convert a dotted-quad IPv4 address to an integer, or None if invalid
+    
+    Accepts exactly what ipaddress.IPv4Address accepts for strings, without
+    building an address object, since whole route files go through here.
+    """
+    parts = ip_str.split(".")
+    if len(parts) != 4:
+        return None
+    value = 0
+    for part in parts:
+        if not part or len(part) > 3 or not (part.isascii() and part.isdigit()):
+            return None
+        if len(part) > 1 and part[0] == "0":
+            return None
+        octet = int(part)
+        if octet > 255:
+            return None
+        value = (value << 8) | octet
+    return value
+
+def int_to_ip(value):
+    """Convert an integer to a dotted-quad IPv4 address"""
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+def mask_to_prefix(mask_int):
+    """Return the prefix length of a contiguous subnet mask, or None if not contiguous"""
+    host_bits = ~mask_int & 0xFFFFFFFF
+    if host_bits & (host_bits + 1):
+        return None
+    return 32 - host_bits.bit_length()
+
+def prefix_to_mask(prefix_length):
+    """Return the subnet mask integer for a prefix length"""
+    return (0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF
+
+@functools.lru_cache(maxsize=4096)
+def compute_network_info(ip_str, mask_str):
+    """Calculate network information for an IP and mask, or None if invalid
+    
+    Results are cached by (ip, mask) and shared, so callers must not modify
+    the returned dict.
+    """
+    ip = ip_to_int(ip_str)
+    mask = ip_to_int(mask_str)
+    if ip is None or mask is None:
+        return None
+    
+    # Prefix length is the number of set bits in the mask
+    prefix_length = bin(mask).count("1")
+    network = ip & prefix_to_mask(prefix_length)
+    broadcast = network | (~prefix_to_mask(prefix_length) & 0xFFFFFFFF)
+    first_host = network + 1
+    last_host = broadcast - 1
+    if first_host > 0xFFFFFFFF or last_host < 0:
+        return None
+    
+    return {
+        "network_address": int_to_ip(network),
+        "broadcast": int_to_ip(broadcast),
+        "first_host": int_to_ip(first_host),
+        "last_host": int_to_ip(last_host),
+        "num_hosts": 2 ** (32 - prefix_length) - 2,  # Subtract network and broadcast addresses
+        "prefix_length": prefix_length,
+        "cidr": f"{int_to_ip(network)}/{prefix_length}",
+        "route_ip_correct": ip == network
+    }
+
+def route_prefix(details):
+    """Return the (network, prefix_length) a route covers, or None if invalid"""
+    ip = ip_to_int(details.get("ip", ""))
+    mask = ip_to_int(details.get("mask", ""))
+    if ip is None or mask is None:
+        return None
+    prefix_length = mask_to_prefix(mask)
+    if prefix_length is None:
+        return None
+    return ip & mask, prefix_length
+
+def is_valid_ip(ip_str):
+    """Check if the IP address is valid"""
+    return ip_to_int(ip_str) is not None
+
+def is_valid_mask(mask_str):
+    """Check if the subnet mask is valid"""
+    # Must be a valid address made of contiguous 1's followed by 0's
+    mask = ip_to_int(mask_str)
+    return mask is not None and mask_to_prefix(mask) is not None
+
+def route_cidr(details):
+    """Return the "network/prefix" text of a route, or "" if invalid"""
+    prefix = route_prefix(details)
+    return f"{int_to_ip(prefix[0])}/{prefix[1]}" if prefix else ""
+
+class GatewayIndex:
+    """Reverse index from switch address to the names of the routes that use it
+    
+    Routes are indexed whether or not their prefix is valid, so re-pointing a
+    switch reaches every route that names it.
+    """
+    
+    def __init__(self, routes=None):
+        self._gateways = {}  # route name -> switch address
+        self._routes = {}    # switch address -> set of route names
+        if isinstance(routes, CompactRouteTable):
+            for route_name, gateway in routes.route_gateways():
+                self._add(route_name, gateway)
+            return
+        for route_name, details in (routes or {}).items():
+            self.add(route_name, details)
+    
+    def _add(self, route_name, gateway):
+        names = self._routes.get(gateway)
+        if names is None:
+            names = self._routes[gateway] = set()
+        names.add(route_name)
+        self._gateways[route_name] = gateway
+    
+    def add(self, route_name, details):
+        """Index a route's switch address, replacing any previous entry with the same name"""
+        self.remove(route_name)
+        self._add(route_name, details.get("gateway", "") if isinstance(details, dict) else "")
+    
+    def remove(self, route_name):
+        gateway = self._gateways.pop(route_name, None)
+        if gateway is None:
+            return False
+        names = self._routes[gateway]
+        names.discard(route_name)
+        if not names:
+            del self._routes[gateway]
+        return True
+    
+    def routes_for(self, gateway):
+        """The names of the routes through a switch address, sorted"""
+        return sorted(self._routes.get(gateway, ()))
+    
+    def counts(self):
+        """(switch address, number of routes) for every switch address, busiest first"""
+        return sorted(((gateway, len(names)) for gateway, names in self._routes.items()),
+                      key=lambda item: (-item[1], item[0]))
+    
+    def matching(self, text):
+        """The names of the routes whose switch address starts with text"""
+        return [name for gateway, names in self._routes.items() if gateway.startswith(text) for name in names]
+
+class _RadixNode:
+    """A node of the route index; nodes without names only join two branches"""
+    __slots__ = ("network", "prefix_length", "names", "children")
+    
+    def __init__(self, network, prefix_length):
+        self.network = network
+        self.prefix_length = prefix_length
+        self.names = set()
+        self.children = [None, None]
+
+class RouteIndex:
+    """Path-compressed binary (Patricia) trie over the prefixes of a routes dict
+    
+    Lookups walk at most 32 levels regardless of the number of routes. Several
+    route names may share a prefix, so each node holds a set of names. The
+    switch addresses are kept alongside, in a GatewayIndex in gateways.
+    """
+    
+    def __init__(self, routes=None):
+        self._root = None
+        self._prefixes = {}  # route name -> (network, prefix_length)
+        if isinstance(routes, CompactRouteTable):
+            self.gateways = GatewayIndex(routes)
+            for route_name, prefix in routes.prefixes():
+                if prefix is not None:
+                    self.add(route_name, None, prefix)
+            return
+        self.gateways = GatewayIndex()
+        for route_name, details in (routes or {}).items():
+            self.add(route_name, details)
+    
+    def __len__(self):
+        return len(self._prefixes)
+    
+    def __contains__(self, route_name):
+        return route_name in self._prefixes
+    
+    @staticmethod
+    def _bit(value, position):
+        return (value >> (31 - position)) & 1
+    
+    def add(self, route_name, details, prefix=None):
+        """Index a route, replacing any previous entry with the same name
+        
+        prefix may be passed when route_prefix(details) is already known;
+        details may then be None if the switch address is indexed already.
+        """
+        if details is not None:
+            self.gateways.add(route_name, details)
+        if route_name in self._prefixes:
+            self._remove_prefix(route_name)
+        if prefix is None:
+            prefix = route_prefix(details)
+        if prefix is None:
+            return False
+        network, prefix_length = prefix
+        self._prefixes[route_name] = prefix
+        
+        parent, node = None, self._root
+        while node is not None:
+            # Length of the prefix shared by the new route and this node
+            limit = prefix_length if prefix_length < node.prefix_length else node.prefix_length
+            diff = (network ^ node.network) >> (32 - limit) if limit else 0
+            common = limit - diff.bit_length()
+            if common == node.prefix_length:
+                if common == prefix_length:
+                    node.names.add(route_name)
+                    return True
+                parent, node = node, node.children[(network >> (31 - common)) & 1]
+                continue
+            
+            # The new prefix diverges from this node or sits above it
+            new_node = _RadixNode(network, prefix_length)
+            new_node.names.add(route_name)
+            if common == prefix_length:
+                new_node.children[self._bit(node.network, common)] = node
+                replacement = new_node
+            else:
+                replacement = _RadixNode(network & prefix_to_mask(common), common)
+                replacement.children[self._bit(network, common)] = new_node
+                replacement.children[self._bit(node.network, common)] = node
+            self._replace(parent, node, replacement)
+            return True
+        
+        new_node = _RadixNode(network, prefix_length)
+        new_node.names.add(route_name)
+        if parent is None:
+            self._root = new_node
+        else:
+            parent.children[self._bit(network, parent.prefix_length)] = new_node
+        return True
+    
+    def remove(self, route_name):
+        """Remove a route from the index if present"""
+        self.gateways.remove(route_name)
+        return self._remove_prefix(route_name)
+    
+    def _remove_prefix(self, route_name):
+        prefix = self._prefixes.pop(route_name, None)
+        if prefix is None:
+            return False
+        network, prefix_length = prefix
+        
+        path = []
+        node = self._root
+        while node is not None and node.prefix_length < prefix_length:
+            path.append(node)
+            node = node.children[self._bit(network, node.prefix_length)]
+        if node is None or node.network != network or node.prefix_length != prefix_length:
+            return False
+        node.names.discard(route_name)
+        
+        # Prune empty nodes and collapse join nodes left with a single branch
+        while node is not None and not node.names:
+            parent = path.pop() if path else None
+            children = [child for child in node.children if child is not None]
+            if len(children) == 2:
+                break
+            self._replace(parent, node, children[0] if children else None)
+            node = parent
+        return True
+    
+    def _replace(self, parent, old, new):
+        if parent is None:
+            self._root = new
+        elif parent.children[0] is old:
+            parent.children[0] = new
+        else:
+            parent.children[1] = new
+    
+    def lookup(self, ip_str):
+        """Return (cidr, route names) of the longest prefix containing ip_str, or None"""
+        address = ip_to_int(ip_str)
+        if address is None:
+            return None
+        best = None
+        node = self._root
+        while node is not None:
+            if node.prefix_length and (address ^ node.network) >> (32 - node.prefix_length):
+                break
+            if node.names:
+                best = node
+            if node.prefix_length == 32:
+                break
+            node = node.children[self._bit(address, node.prefix_length)]
+        if best is None:
+            return None
+        cidr = f"{int_to_ip(best.network)}/{best.prefix_length}"
+        return cidr, sorted(best.names)
+    
+    def covering(self, ip_str):
+        """Return the names of every route whose prefix contains ip_str"""
+        address = ip_to_int(ip_str)
+        if address is None:
+            return []
+        names = []
+        node = self._root
+        while node is not None:
+            if node.prefix_length and (address ^ node.network) >> (32 - node.prefix_length):
+                break
+            names.extend(node.names)
+            if node.prefix_length == 32:
+                break
+            node = node.children[self._bit(address, node.prefix_length)]
+        return names
+
+def is_sqlite_path(file_path):
+    """Check whether a routes file should be opened as a SQLite route store"""
+    return os.path.splitext(file_path)[1].lower() in SQLITE_EXTENSIONS
+
+class SqliteRouteStore(collections.abc.MutableMapping):
+    """Routes kept in a SQLite database, usable in place of the routes dict
+    
+    Each route is one row. Besides the ip, mask and gateway text, the network
+    address, prefix length and gateway are stored as indexed integers, so the
+    route browser can page, filter and count with SQL and longest-prefix
+    matches probe the (network, prefix_length) index once per prefix length.
+    Only the rows being shown are ever read, so opening a store is instant and
+    memory use does not grow with the number of routes. Writes are committed
+    as they are made; there is no journal.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS routes (
+            name TEXT PRIMARY KEY,
+            ip TEXT NOT NULL,
+            mask TEXT NOT NULL,
+            gateway TEXT NOT NULL,
+            network INTEGER,
+            prefix_length INTEGER,
+            gateway_int INTEGER,
+            cidr TEXT NOT NULL
+        )"""
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS routes_prefix ON routes (network, prefix_length);
+        CREATE INDEX IF NOT EXISTS routes_gateway ON routes (gateway_int);"""
+    UPSERT = ("INSERT INTO routes VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+              "ip = excluded.ip, mask = excluded.mask, gateway = excluded.gateway, network = excluded.network, "
+              "prefix_length = excluded.prefix_length, gateway_int = excluded.gateway_int, cidr = excluded.cidr")
+    
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute(self.SCHEMA)
+        self.connection.executescript(self.INDEXES)
+        self.connection.commit()
+        self._length = None
+    
+    @classmethod
+    def create(cls, file_path, routes):
+        """Write a routes dict (or another store) to a new database, replacing file_path atomically"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        temp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            connection = sqlite3.connect(temp_path)
+            try:
+                # Indexes are built once after the rows are in, which is much faster
+                connection.execute(cls.SCHEMA)
+                connection.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       (cls._row(name, details) for name, details in routes.items()))
+                connection.executescript(cls.INDEXES)
+                connection.commit()
+            finally:
+                connection.close()
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    @staticmethod
+    def _row(name, details):
+        prefix = route_prefix(details)
+        network, prefix_length = prefix if prefix else (None, None)
+        cidr = f"{int_to_ip(network)}/{prefix_length}" if prefix else ""
+        gateway = details.get("gateway", "")
+        return (name, details.get("ip", ""), details.get("mask", ""), gateway,
+                network, prefix_length, ip_to_int(gateway), cidr)
+    
+    def close(self):
+        self.connection.close()
+    
+    def __getitem__(self, name):
+        row = self.connection.execute("SELECT ip, mask, gateway FROM routes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return {"ip": row[0], "mask": row[1], "gateway": row[2]}
+    
+    def __setitem__(self, name, details):
+        with self.connection:
+            self.connection.execute(self.UPSERT, self._row(name, details))
+        self._length = None
+    
+    def apply_changes(self, changes):
+        """Set or delete (name, details or None) routes in a single transaction"""
+        with self.connection:
+            self.connection.executemany(self.UPSERT, (self._row(name, details) for name, details in changes
+                                                      if details is not None))
+            self.connection.executemany("DELETE FROM routes WHERE name = ?",
+                                        ((name,) for name, details in changes if details is None))
+        self._length = None
+    
+    def __delitem__(self, name):
+        with self.connection:
+            deleted = self.connection.execute("DELETE FROM routes WHERE name = ?", (name,)).rowcount
+        if not deleted:
+            raise KeyError(name)
+        self._length = None
+    
+    def __contains__(self, name):
+        return self.connection.execute("SELECT 1 FROM routes WHERE name = ?", (name,)).fetchone() is not None
+    
+    def __iter__(self):
+        for (name,) in self.connection.execute("SELECT name FROM routes ORDER BY rowid"):
+            yield name
+    
+    def __len__(self):
+        if self._length is None:
+            self._length = self.count()
+        return self._length
+    
+    def items(self):
+        """Yield (name, details) pairs from a single query rather than one query per route"""
+        for name, ip, mask, gateway in self.connection.execute(
+                "SELECT name, ip, mask, gateway FROM routes ORDER BY rowid"):
+            yield name, {"ip": ip, "mask": mask, "gateway": gateway}
+    
+    def values(self):
+        for name, details in self.items():
+            yield details
+    
+    def dump_json(self, file):
+        """Write the store to an open file in the {"routes": {...}} JSON format, row by row"""
+        dump_routes_json(self.items(), file)
+    
+    def count(self, where="", params=()):
+        """Count the routes matching an SQL condition"""
+        query = "SELECT COUNT(*) FROM routes" + (f" WHERE {where}" if where else "")
+        return self.connection.execute(query, params).fetchone()[0]
+    
+    def page(self, where, params, offset, limit):
+        """Return (name, cidr, gateway) rows offset..offset+limit of the matching routes, by name"""
+        query = ("SELECT name, cidr, gateway FROM routes" + (f" WHERE {where}" if where else "") +
+                 " ORDER BY name LIMIT ? OFFSET ?")
+        return self.connection.execute(query, (*params, limit, offset)).fetchall()
+    
+    def rank(self, name, where="", params=()):
+        """Return the position of name among the matching routes, or None if it does not match"""
+        condition = f" AND ({where})" if where else ""
+        if self.connection.execute(f"SELECT 1 FROM routes WHERE name = ?{condition}",
+                                   (name, *params)).fetchone() is None:
+            return None
+        return self.count(f"name < ?{condition}", (name, *params))
+    
+    def _covering_rows(self, ip_str):
+        address = ip_to_int(ip_str)
+        if address is None:
+            return []
+        probes = [(address & prefix_to_mask(prefix_length), prefix_length) for prefix_length in range(33)]
+        condition = " OR ".join(["(network = ? AND prefix_length = ?)"] * len(probes))
+        return self.connection.execute(
+            f"SELECT name, network, prefix_length FROM routes WHERE {condition} ORDER BY prefix_length DESC, name",
+            [value for probe in probes for value in probe]).fetchall()
+    
+    def lookup(self, ip_str):
+        """Return (cidr, route names) of the longest prefix containing ip_str, or None"""
+        rows = self._covering_rows(ip_str)
+        if not rows:
+            return None
+        name, network, prefix_length = rows[0]
+        names = [row[0] for row in rows if row[2] == prefix_length]
+        return f"{int_to_ip(network)}/{prefix_length}", names
+    
+    def covering(self, ip_str):
+        """Return the names of every route whose prefix contains ip_str"""
+        return [row[0] for row in self._covering_rows(ip_str)]
+    
+    def gateway_routes(self, gateway):
+        """The names of the routes through a switch address, sorted"""
+        address = ip_to_int(gateway)
+        if address is None:
+            rows = self.connection.execute("SELECT name FROM routes WHERE gateway_int IS NULL AND gateway = ? "
+                                           "ORDER BY name", (gateway,))
+        else:
+            rows = self.connection.execute("SELECT name FROM routes WHERE gateway_int = ? ORDER BY name",
+                                           (address,))
+        return [row[0] for row in rows]
+    
+    def gateway_counts(self):
+        """(switch address, number of routes) for every switch address, busiest first"""
+        # Valid addresses are counted off the gateway_int index alone
+        counts = [(int_to_ip(address), count) for address, count in self.connection.execute(
+            "SELECT gateway_int, COUNT(*) FROM routes WHERE gateway_int IS NOT NULL GROUP BY gateway_int")]
+        counts += self.connection.execute(
+            "SELECT gateway, COUNT(*) FROM routes WHERE gateway_int IS NULL GROUP BY gateway").fetchall()
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+class SqliteGatewayIndex:
+    """GatewayIndex interface over a SqliteRouteStore"""
+    
+    def __init__(self, store):
+        self.store = store
+    
+    def add(self, route_name, details):
+        return True
+    
+    def remove(self, route_name):
+        return True
+    
+    def routes_for(self, gateway):
+        return self.store.gateway_routes(gateway)
+    
+    def counts(self):
+        return self.store.gateway_counts()
+
+class SqliteRouteIndex:
+    """RouteIndex interface over a SqliteRouteStore, which indexes its own rows"""
+    
+    def __init__(self, store):
+        self.store = store
+        self.gateways = SqliteGatewayIndex(store)
+    
+    def __len__(self):
+        return self.store.count("network IS NOT NULL")
+    
+    def __contains__(self, route_name):
+        return route_name in self.store
+    
+    def add(self, route_name, details, prefix=None):
+        return True  # The row was indexed when it was written
+    
+    def remove(self, route_name):
+        return True
+    
+    def lookup(self, ip_str):
+        return self.store.lookup(ip_str)
+    
+    def covering(self, ip_str):
+        return self.store.covering(ip_str)
+
+class CompactRouteTable(collections.abc.MutableMapping):
+    """Routes held as packed address columns, usable in place of the routes dict
+    
+    Each route's ip, mask and gateway are kept as unsigned 32-bit integers in
+    three array columns, and its name once, in a slot list with a name ->
+    slot dict; a route dict is built only when one is read. A route that
+    would not come back byte for byte (an address that is not canonical
+    dotted quad, other keys, other key order) is kept as given in a side
+    dict, so writing the table out reproduces the file it was read from.
+    
+    Per route this costs 12 bytes of columns, 8 for the slot list, the
+    name -> slot dict entry (about 40 bytes, plus 32 for a slot number over
+    256) and the name string itself (49 bytes plus its length for ASCII):
+    about 150 bytes for a route named "route_0000001", against about 460
+    for the same route as a dict of three strings (measured with
+    tracemalloc on a million routes). Nothing per route is a
+    container, so the garbage collector never has to walk the routes.
+    Deleting leaves a free slot; the columns are rebuilt once free slots
+    are half of them.
+    """
+    
+    KEYS = ("ip", "mask", "gateway")
+    
+    def __init__(self, routes=None):
+        self.ips = array.array("I")
+        self.masks = array.array("I")
+        self.gateways = array.array("I")
+        self.names = []  # slot -> route name, None for a deleted slot
+        self.slots = {}  # route name -> slot
+        self.irregular = {}  # slot -> details of a route that does not pack losslessly
+        if routes is not None:
+            self.update(routes)
+    
+    @classmethod
+    def read(cls, file_path):
+        """Stream a JSON routes file into a new table, without building a dict for the whole file"""
+        table = cls()
+        with open(file_path, "rb") as file:
+            for name, details in RoutesFileReader(file):
+                table[name] = details
+        return table
+    
+    @classmethod
+    def _pack(cls, details):
+        """Return (ip, mask, gateway) integers, or None if the route would not round-trip"""
+        if type(details) is not dict or tuple(details) != cls.KEYS:
+            return None
+        packed = (cls._address(details["ip"]), cls._address(details["mask"]), cls._address(details["gateway"]))
+        return None if None in packed else packed
+    
+    @staticmethod
+    def _address(text):
+        """Pack a canonical dotted quad (the only form int_to_ip gives back), else return None"""
+        # inet_aton also takes short and octal forms, so only text that converts back unchanged is packed
+        try:
+            packed = socket.inet_aton(text)
+        except (OSError, TypeError, ValueError):
+            return None
+        return int.from_bytes(packed, "big") if socket.inet_ntoa(packed) == text else None
+    
+    def __getitem__(self, name):
+        slot = self.slots[name]
+        if slot in self.irregular:
+            details = self.irregular[slot]
+            return dict(details) if isinstance(details, dict) else details
+        return {"ip": int_to_ip(self.ips[slot]), "mask": int_to_ip(self.masks[slot]),
+                "gateway": int_to_ip(self.gateways[slot])}
+    
+    def __setitem__(self, name, details):
+        packed = self._pack(details)
+        slot = self.slots.get(name)
+        if packed is None:
+            if slot is None:
+                slot = self._append(name, (0, 0, 0))
+            self.irregular[slot] = dict(details) if isinstance(details, dict) else details
+        elif slot is None:
+            self._append(name, packed)
+        else:
+            self.irregular.pop(slot, None)
+            self.ips[slot], self.masks[slot], self.gateways[slot] = packed
+    
+    def _append(self, name, packed):
+        slot = self.slots[name] = len(self.names)
+        self.names.append(name)
+        self.ips.append(packed[0])
+        self.masks.append(packed[1])
+        self.gateways.append(packed[2])
+        return slot
+    
+    def __delitem__(self, name):
+        slot = self.slots.pop(name)
+        self.names[slot] = None
+        self.irregular.pop(slot, None)
+        garbage = len(self.names) - len(self.slots)
+        if garbage >= COMPACT_TABLE_MIN_GARBAGE and garbage * 2 >= len(self.names):
+            self._compact()
+    
+    def _compact(self):
+        """Rebuild the columns without deleted slots, keeping the order of the routes"""
+        keep = [slot for slot, name in enumerate(self.names) if name is not None]
+        self.ips = array.array("I", [self.ips[slot] for slot in keep])
+        self.masks = array.array("I", [self.masks[slot] for slot in keep])
+        self.gateways = array.array("I", [self.gateways[slot] for slot in keep])
+        self.irregular = {new: self.irregular[old] for new, old in enumerate(keep) if old in self.irregular}
+        self.names = [self.names[slot] for slot in keep]
+        self.slots = {name: slot for slot, name in enumerate(self.names)}
+    
+    def __contains__(self, name):
+        return name in self.slots
+    
+    def __iter__(self):
+        for name in self.names:
+            if name is not None:
+                yield name
+    
+    def __len__(self):
+        return len(self.slots)
+    
+    def items(self):
+        """Yield (name, details) pairs in the order the routes were added"""
+        for name in self:
+            yield name, self[name]
+    
+    def values(self):
+        for name, details in self.items():
+            yield details
+    
+    def copy(self):
+        """A copy sharing no columns with this table, e.g. for a worker thread to read while this one changes"""
+        table = CompactRouteTable()
+        table.ips, table.masks, table.gateways = self.ips[:], self.masks[:], self.gateways[:]
+        table.names = self.names[:]
+        table.slots = dict(self.slots)
+        table.irregular = dict(self.irregular)
+        return table
+    
+    def packed(self, name):
+        """Return a route's (ip, mask, gateway) integers, or None if it is kept as given"""
+        slot = self.slots[name]
+        if slot in self.irregular:
+            return None
+        return self.ips[slot], self.masks[slot], self.gateways[slot]
+    
+    def rows(self):
+        """Yield (name, packed, details) for every route: its (ip, mask, gateway) integers and None,
+        or None and the details it is kept as"""
+        ips, masks, gateways, irregular = self.ips, self.masks, self.gateways, self.irregular
+        for slot, name in enumerate(self.names):
+            if name is None:
+                continue
+            if slot in irregular:
+                yield name, None, irregular[slot]
+            else:
+                yield name, (ips[slot], masks[slot], gateways[slot]), None
+    
+    def set_row(self, name, packed, details=None):
+        """Add or replace a route as given by rows(), without converting it to text and back"""
+        if packed is None or name in self.slots:
+            self[name] = details if packed is None else {"ip": int_to_ip(packed[0]), "mask": int_to_ip(packed[1]),
+                                                         "gateway": int_to_ip(packed[2])}
+        else:
+            self._append(name, packed)
+    
+    def prefixes(self):
+        """Yield (name, route_prefix) for every route, straight from the columns where possible"""
+        ips, masks, irregular = self.ips, self.masks, self.irregular
+        for slot, name in enumerate(self.names):
+            if name is None:
+                continue
+            if slot in irregular:
+                details = irregular[slot]
+                yield name, route_prefix(details) if isinstance(details, dict) else None
+                continue
+            prefix_length = mask_to_prefix(masks[slot])
+            yield name, (ips[slot] & masks[slot], prefix_length) if prefix_length is not None else None
+    
+    def route_gateways(self):
+        """Yield (name, switch address) for every route, converting each distinct address once"""
+        gateways, irregular = self.gateways, self.irregular
+        texts = {}
+        for slot, name in enumerate(self.names):
+            if name is None:
+                continue
+            if slot in irregular:
+                details = irregular[slot]
+                yield name, details.get("gateway", "") if isinstance(details, dict) else ""
+                continue
+            gateway = gateways[slot]
+            text = texts.get(gateway)
+            if text is None:
+                text = texts[gateway] = int_to_ip(gateway)
+            yield name, text
+    
+    def dump_json(self, file):
+        """Write the table to an open file in the {"routes": {...}} JSON format, route by route"""
+        dump_routes_json(self.items(), file)
+    
+    def __getstate__(self):
+        # The name -> slot dict is the largest part and cheap to rebuild, so it is not pickled
+        state = dict(self.__dict__)
+        del state["slots"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.slots = {name: slot for slot, name in enumerate(self.names) if name is not None}
+
+def parse_route_print(text):
+    """Parse the IPv4 sections of `route print` output into route records
+    
+    Returns a dict with "active" and "persistent" lists of records shaped like
+    routes file entries ({"ip", "mask", "gateway"}) plus "metric" and, for
+    active routes, "interface". Rows are recognised by their shape rather than
+    by the (localised) section headings: active rows have five columns and
+    persistent rows four, both starting with a destination and a mask. IPv6
+    rows start with an interface number and are skipped. A persistent route
+    added without a metric shows "Default" (localised) in the Metric column;
+    its metric is None.
+    """
+    tables = {"active": [], "persistent": []}
+    for line in text.splitlines():
+        columns = line.split()
+        if len(columns) not in (4, 5) or ip_to_int(columns[0]) is None or ip_to_int(columns[1]) is None:
+            continue
+        if columns[-1].isdigit():
+            metric = int(columns[-1])
+        elif len(columns) == 4 and ip_to_int(columns[2]) is not None:
+            metric = None
+        else:
+            continue
+        record = {"ip": columns[0], "mask": columns[1], "gateway": columns[2], "metric": metric}
+        if len(columns) == 5:
+            record["interface"] = columns[3]
+            tables["active"].append(record)
+        else:
+            tables["persistent"].append(record)
+    return tables
+
+def plan_reconcile(routes, system_routes, prune=False, skipped=None):
+    """Work out the route.exe operations that bring the system in line with routes
+    
+    system_routes is the output of parse_route_print; active and persistent
+    routes both count as installed. Returns a list of operations, each a
+    routes file style dict with an "action" of "add", "change" or "delete" and
+    the "name" of the route it serves:
+      add    - the prefix is not installed
+      change - the prefix is installed through a single other switch address
+               ("old_gateway" records it)
+      delete - the prefix is installed through several switch addresses; it is
+               deleted and followed by an add, since route.exe deletes a prefix
+               as a whole
+    With prune, installed prefixes that are not in routes but go through one of
+    its switch addresses are deleted as well, with a name of None. The default
+    route and other system routes are never touched. Routes with an invalid
+    prefix or switch address are left out; their names are appended to
+    skipped when a list is given.
+    """
+    installed = {}
+    for record in system_routes["active"] + system_routes["persistent"]:
+        prefix = route_prefix(record)
+        if prefix is not None:
+            installed.setdefault(prefix, {}).setdefault(record["gateway"], record)
+    
+    plan = []
+    desired = {}
+    for route_name, details in routes.items():
+        prefix = route_prefix(details)
+        gateway = details.get("gateway", "")
+        if prefix is None or not isinstance(gateway, str) or not is_valid_ip(gateway):
+            if skipped is not None:
+                skipped.append(route_name)
+            continue
+        if prefix in desired:
+            continue
+        desired[prefix] = route_name
+        
+        # Always use the network address, like the installed table does
+        operation = {"name": route_name, "ip": int_to_ip(prefix[0]),
+                     "mask": int_to_ip(prefix_to_mask(prefix[1])), "gateway": gateway}
+        gateways = installed.get(prefix, {})
+        if not gateways:
+            plan.append(dict(operation, action="add"))
+        elif len(gateways) == 1 and gateway not in gateways:
+            plan.append(dict(operation, action="change", old_gateway=next(iter(gateways))))
+        elif len(gateways) > 1:
+            plan.append(dict(operation, action="delete"))
+            plan.append(dict(operation, action="add"))
+    
+    if prune:
+        managed_gateways = {details.get("gateway") for details in routes.values()}
+        for prefix in sorted(installed):
+            if prefix in desired or prefix[1] == 0:
+                continue
+            for gateway, record in installed[prefix].items():
+                if gateway in managed_gateways:
+                    plan.append({"name": None, "action": "delete", "ip": record["ip"],
+                                 "mask": record["mask"], "gateway": gateway})
+                    break
+    return plan
+
+def plan_repoint(routes, route_names, new_gateway):
+    """Point routes at another switch address, e.g. after a core switch is readdressed
+    
+    Returns (changes, operations): the (name, details before, details after)
+    of every route, to apply to the routes file in one go, and plan_reconcile
+    style operations for the system table, a delete of each route's entry
+    through its old switch address followed at once by an add through the
+    new one. Routes with an invalid prefix are changed in the file only.
+    """
+    changes = []
+    operations = []
+    for route_name in route_names:
+        before = routes[route_name]
+        after = dict(before, gateway=new_gateway)
+        changes.append((route_name, before, after))
+        prefix = route_prefix(before)
+        if prefix is not None:
+            # Always use the network address, like the installed table does
+            operation = {"name": route_name, "ip": int_to_ip(prefix[0]), "mask": int_to_ip(prefix_to_mask(prefix[1]))}
+            operations.append(dict(operation, action="delete", gateway=before.get("gateway", "")))
+            operations.append(dict(operation, action="add", gateway=new_gateway))
+    return changes, operations
+
+def route_snapshot(records):
+    """Return a routing table's records as a set of (ip, mask, gateway, interface, metric) tuples"""
+    return {(record["ip"], record["mask"], record["gateway"], record.get("interface", ""), record.get("metric", 0))
+            for record in records}
+
+def diff_route_snapshots(old, new):
+    """Return the records added, removed and changed between two route_snapshot sets
+    
+    The symmetric difference is computed in C and holds only the entries that
+    differ, so an unchanged table of any size costs a single pass. A removed
+    and an added entry with the same destination, mask and gateway are
+    reported as one changed record, with the old values in "previous".
+    """
+    added, removed = {}, {}
+    for entry in old ^ new:
+        (added if entry in new else removed).setdefault(entry[:3], []).append(entry)
+    
+    def record(entry):
+        return {"ip": entry[0], "mask": entry[1], "gateway": entry[2], "interface": entry[3], "metric": entry[4]}
+    
+    diff = {"added": [], "removed": [], "changed": []}
+    for key, entries in removed.items():
+        if len(entries) == 1 and len(added.get(key, ())) == 1:
+            changed = record(added.pop(key)[0])
+            changed["previous"] = {"interface": entries[0][3], "metric": entries[0][4]}
+            diff["changed"].append(changed)
+        else:
+            diff["removed"].extend(record(entry) for entry in entries)
+    for entries in added.values():
+        diff["added"].extend(record(entry) for entry in entries)
+    return diff
+
+class SavedRouteWatch:
+    """Tracks which saved routes are missing from the system routing table
+    
+    A saved route is present while its prefix is installed through its
+    gateway. Snapshots and route edits update the missing set incrementally,
+    so a monitor can keep it current every few seconds for any table size.
+    """
+    
+    def __init__(self, routes):
+        self.keys = {}  # route name -> (network, mask, gateway)
+        self.names = {}  # (network, mask, gateway) -> set of route names
+        self.installed = {}  # (network, mask, gateway) -> number of system entries
+        self.missing = set()
+        for route_name, details in routes.items():
+            self.set_route(route_name, details)
+    
+    def set_route(self, route_name, details):
+        """Update one saved route after an edit; details is None when it was deleted"""
+        key = self.keys.pop(route_name, None)
+        if key is not None:
+            self.names[key].discard(route_name)
+            if not self.names[key]:
+                del self.names[key]
+        self.missing.discard(route_name)
+        prefix = None if details is None else route_prefix(details)
+        if prefix is None:
+            return
+        # System tables list the network address, so compare against that
+        key = (int_to_ip(prefix[0]), int_to_ip(prefix_to_mask(prefix[1])), details.get("gateway", ""))
+        self.keys[route_name] = key
+        self.names.setdefault(key, set()).add(route_name)
+        if key not in self.installed:
+            self.missing.add(route_name)
+    
+    def set_snapshot(self, snapshot):
+        """Start over from a full route_snapshot"""
+        self.installed = {}
+        for entry in snapshot:
+            self.installed[entry[:3]] = self.installed.get(entry[:3], 0) + 1
+        self.missing = {route_name for route_name, key in self.keys.items() if key not in self.installed}
+    
+    def apply_diff(self, diff):
+        """Update from a diff_route_snapshots result, looking only at the entries that changed"""
+        for record in diff["removed"]:
+            key = (record["ip"], record["mask"], record["gateway"])
+            self.installed[key] -= 1
+            if not self.installed[key]:
+                del self.installed[key]
+                self.missing.update(self.names.get(key, ()))
+        for record in diff["added"]:
+            key = (record["ip"], record["mask"], record["gateway"])
+            self.installed[key] = self.installed.get(key, 0) + 1
+            self.missing.difference_update(self.names.get(key, ()))
+
+def route_file_site(file_path):
+    """The site a per-site routes file is for: its file name without the extension"""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+def site_route_files(folder):
+    """The routes files (JSON and SQLite route stores) in a folder, sorted by name"""
+    file_paths = []
+    for entry in sorted(os.listdir(folder)):
+        extension = os.path.splitext(entry)[1].lower()
+        if entry.startswith(".") or entry == MERGED_ROUTES_FILE:
+            continue  # Temp files from atomic writes, and an earlier merge
+        if extension == ".json" or extension in SQLITE_EXTENSIONS:
+            file_paths.append(os.path.join(folder, entry))
+    return file_paths
+
+def read_site_routes(file_path):
+    """Read and validate one routes file for a merge; runs in a worker process
+    
+    Never raises: returns a report {"file_path", "routes" (a
+    CompactRouteTable, None if the file could not be read), "count",
+    "errors", "warnings", "seconds", "error"}, where errors and warnings
+    count routes with validation errors and misaligned route IPs.
+    """
+    started = time.perf_counter()
+    report = {"file_path": file_path, "routes": None, "count": 0, "errors": 0, "warnings": 0,
+              "seconds": 0.0, "error": None}
+    try:
+        if is_sqlite_path(file_path):
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"No such route store: {file_path}")
+            store = SqliteRouteStore(file_path)
+            try:
+                routes = CompactRouteTable(store.items())
+            finally:
+                store.close()
+        else:
+            routes = CompactRouteTable.read(file_path)
+            RouteJournal(file_path).replay({"routes": routes})
+        table = validate_routes_bulk(routes)
+        report["routes"] = routes
+        report["count"] = len(routes)
+        report["errors"] = sum(map(any, zip(table["ip_error"], table["mask_error"], table["gateway_error"])))
+        report["warnings"] = sum(map(bool, table["route_ip_error"]))
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {str(e)}"
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+def load_site_files(file_paths, on_report=None, workers=None, use_processes=True):
+    """Read and validate routes files in parallel; returns their reports in the order given
+    
+    Files are parsed in worker processes (or threads, with use_processes
+    False) and come back as packed tables. on_report is called on the
+    calling thread with each report as its file finishes.
+    """
+    reports = [None] * len(file_paths)
+    if use_processes:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        futures = {pool.submit(read_site_routes, file_path): index for index, file_path in enumerate(file_paths)}
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:  # The worker process died
+                report = {"file_path": file_paths[index], "routes": None, "count": 0, "errors": 0, "warnings": 0,
+                          "seconds": 0.0, "error": f"{type(e).__name__}: {str(e)}"}
+            reports[index] = report
+            if on_report:
+                on_report(report)
+    return reports
+
+def merge_site_routes(reports, name_policy="rename", prefix_policy="keep"):
+    """Merge per-site routes, read by read_site_routes, into one table
+    
+    Files are taken in order. A route name already taken by another file is
+    renamed to "name@site" (rename), skipped (first) or replaces the earlier
+    route (last). A prefix already routed to a different switch address by
+    another file is kept alongside it (keep), skipped (first) or replaces the
+    earlier routes (last). Returns {"routes": CompactRouteTable, "sources":
+    {route name: file path}, "conflicts": [{"kind", "route", "files",
+    "resolution"}]}.
+    """
+    if name_policy not in NAME_CONFLICT_POLICIES:
+        raise ValueError(f"unknown name conflict policy: {name_policy}")
+    if prefix_policy not in PREFIX_CONFLICT_POLICIES:
+        raise ValueError(f"unknown prefix conflict policy: {prefix_policy}")
+    
+    merged = CompactRouteTable()
+    sources = {}
+    conflicts = []
+    by_prefix = {}  # prefix -> {route name: switch address, as an integer when valid} of merged routes
+    prefixes = {}  # route name -> prefix, for routes with a valid prefix
+    
+    def remove(route_name):
+        del merged[route_name]
+        del sources[route_name]
+        prefix = prefixes.pop(route_name, None)
+        if prefix is not None:
+            del by_prefix[prefix][route_name]
+    
+    for report in reports:
+        routes = report["routes"]
+        if routes is None:
+            continue
+        file_path = report["file_path"]
+        site = route_file_site(file_path)
+        for route_name, packed, details in routes.rows():
+            if route_name in sources:
+                files = [sources[route_name], file_path]
+                if name_policy == "first":
+                    conflicts.append({"kind": "name", "route": route_name, "files": files,
+                                      "resolution": "kept the first"})
+                    continue
+                if name_policy == "last":
+                    conflicts.append({"kind": "name", "route": route_name, "files": files,
+                                      "resolution": "replaced by the last"})
+                    remove(route_name)
+                else:
+                    original = route_name
+                    route_name = f"{original}@{site}"
+                    suffix = 2
+                    while route_name in sources:
+                        route_name = f"{original}@{site}.{suffix}"
+                        suffix += 1
+                    conflicts.append({"kind": "name", "route": original, "files": files,
+                                      "resolution": f"renamed to {route_name}"})
+            
+            if packed is not None:
+                ip, mask, gateway = packed
+                prefix_length = mask_to_prefix(mask)
+                prefix = (ip & mask, prefix_length) if prefix_length is not None else None
+            else:
+                prefix = route_prefix(details) if isinstance(details, dict) else None
+                gateway = details.get("gateway", "") if isinstance(details, dict) else ""
+                gateway = ip_to_int(gateway) if isinstance(gateway, str) and ip_to_int(gateway) is not None \
+                    else gateway
+            if prefix is not None:
+                rivals = [name for name, other in by_prefix.get(prefix, {}).items()
+                          if other != gateway and sources[name] != file_path]
+                if rivals:
+                    cidr = f"{int_to_ip(prefix[0])}/{prefix[1]}"
+                    files = sorted({sources[name] for name in rivals}) + [file_path]
+                    if prefix_policy == "first":
+                        conflicts.append({"kind": "prefix", "route": f"{route_name} ({cidr})", "files": files,
+                                          "resolution": "kept the first"})
+                        continue
+                    if prefix_policy == "last":
+                        for name in rivals:
+                            remove(name)
+                        resolution = f"replaced {', '.join(rivals)}"
+                    else:
+                        resolution = "kept both"
+                    conflicts.append({"kind": "prefix", "route": f"{route_name} ({cidr})", "files": files,
+                                      "resolution": resolution})
+                by_prefix.setdefault(prefix, {})[route_name] = gateway
+                prefixes[route_name] = prefix
+            merged.set_row(route_name, packed, details)
+            sources[route_name] = file_path
+    return {"routes": merged, "sources": sources, "conflicts": conflicts}
+
+def analyse_routes(routes):
+    """Find duplicate, conflicting and nested prefixes in a routes dict
+    
+    Every valid route becomes a [network, broadcast] interval. Prefixes are
+    either nested or disjoint, so after sorting by (network, prefix length) a
+    single sweep with a stack of open intervals finds each route's closest
+    enclosing prefix in O(n log n) overall.
+    
+    Returns a dict of lists:
+      invalid    - route names whose IP or mask cannot be parsed
+      duplicates - (cidr, names) for prefixes listed more than once with one gateway
+      conflicts  - (cidr, [(name, gateway), ...]) for prefixes with several gateways
+      redundant  - (cidr, names, outer_cidr, outer_names) for more specific routes
+                   that use the same gateway as their enclosing route
+      shadowing  - (cidr, names, outer_cidr, outer_names) for more specific routes
+                   that send part of the enclosing route elsewhere
+    """
+    result = {"invalid": [], "duplicates": [], "conflicts": [], "redundant": [], "shadowing": []}
+    
+    # Group routes sharing the same prefix
+    groups = {}
+    for route_name, details in routes.items():
+        prefix = route_prefix(details)
+        if prefix is None:
+            result["invalid"].append(route_name)
+            continue
+        groups.setdefault(prefix, []).append((route_name, details.get("gateway", "")))
+    
+    def cidr(prefix):
+        return f"{int_to_ip(prefix[0])}/{prefix[1]}"
+    
+    def names(prefix):
+        return [route_name for route_name, gateway in groups[prefix]]
+    
+    gateways = {}
+    for prefix, members in groups.items():
+        gateways[prefix] = {gateway for route_name, gateway in members}
+        if len(gateways[prefix]) > 1:
+            result["conflicts"].append((cidr(prefix), members))
+        elif len(members) > 1:
+            result["duplicates"].append((cidr(prefix), names(prefix)))
+    
+    # Sweep prefixes in address order keeping the chain of enclosing prefixes
+    stack = []
+    for prefix in sorted(groups):
+        network, prefix_length = prefix
+        while stack and stack[-1][0] < network:
+            stack.pop()
+        if stack:
+            outer = stack[-1][1]
+            category = "redundant" if gateways[outer] == gateways[prefix] else "shadowing"
+            result[category].append((cidr(prefix), names(prefix), cidr(outer), names(outer)))
+        broadcast = network | (~prefix_to_mask(prefix_length) & 0xFFFFFFFF)
+        stack.append((broadcast, prefix))
+    
+    return result
+
+def forwarding_segments(prefix_gateways):
+    """Describe the longest-prefix-match forwarding of a route set as segments
+    
+    prefix_gateways maps (network, prefix_length) to the set of gateways for
+    that prefix. Returns sorted, non-overlapping (start, end, gateways) address
+    ranges covering the whole IPv4 space, where gateways is a frozenset (empty
+    for addresses no route covers) and adjacent ranges always differ. Two route
+    sets forward every destination identically exactly when their segments
+    are equal.
+    """
+    segments = []
+    
+    def emit(start, end, gateways):
+        if segments and segments[-1][2] == gateways and segments[-1][1] + 1 == start:
+            segments[-1] = (segments[-1][0], end, gateways)
+        else:
+            segments.append((start, end, gateways))
+    
+    none = frozenset()
+    position = 0
+    stack = []  # (broadcast, gateways) of the prefixes enclosing position
+    for network, prefix_length in sorted(prefix_gateways):
+        while stack and stack[-1][0] < network:
+            broadcast, gateways = stack.pop()
+            if position <= broadcast:
+                emit(position, broadcast, gateways)
+                position = broadcast + 1
+        if position < network:
+            emit(position, network - 1, stack[-1][1] if stack else none)
+            position = network
+        broadcast = network | (~prefix_to_mask(prefix_length) & 0xFFFFFFFF)
+        stack.append((broadcast, frozenset(prefix_gateways[(network, prefix_length)])))
+    while stack:
+        broadcast, gateways = stack.pop()
+        if position <= broadcast:
+            emit(position, broadcast, gateways)
+            position = broadcast + 1
+    if position <= 0xFFFFFFFF:
+        emit(position, 0xFFFFFFFF, none)
+    return segments
+
+def aggregate_routes(routes):
+    """Collapse routes into the fewest prefixes without changing any next hop
+    
+    Routes are grouped by switch address and sibling prefixes of the same
+    group are merged into their parent, repeatedly, from /32 upwards. A merge
+    is refused when the parent prefix is already routed to another switch
+    address; because siblings cover their parent exactly, that is the only way
+    a merge can change a next hop. Routes covered by a less specific route with
+    the same switch address are then dropped unless another switch address
+    sits in between. Invalid routes and prefixes listed with several switch
+    addresses are passed through untouched.
+    
+    Returns (aggregated_routes, report) where report holds the before and
+    after route counts and "verified", the result of comparing the longest
+    prefix match forwarding of both route sets over the whole address space.
+    """
+    prefix_gateways = {}
+    prefix_names = {}
+    passthrough = {}
+    for route_name, details in routes.items():
+        prefix = route_prefix(details)
+        if prefix is None:
+            passthrough[route_name] = details
+            continue
+        prefix_gateways.setdefault(prefix, set()).add(details.get("gateway", ""))
+        prefix_names.setdefault(prefix, []).append(route_name)
+    
+    # Only prefixes with a single switch address take part in aggregation
+    by_gateway = {}
+    for prefix, gateways in prefix_gateways.items():
+        if len(gateways) == 1:
+            by_gateway.setdefault(next(iter(gateways)), set()).add(prefix)
+        else:
+            for route_name in prefix_names[prefix]:
+                passthrough[route_name] = routes[route_name]
+    
+    aggregated = {}
+    for gateway, prefixes in by_gateway.items():
+        levels = [set() for prefix_length in range(33)]
+        for network, prefix_length in prefixes:
+            levels[prefix_length].add(network)
+        
+        for prefix_length in range(32, 0, -1):
+            step = 1 << (32 - prefix_length)
+            parent_mask = prefix_to_mask(prefix_length - 1)
+            for network in sorted(levels[prefix_length]):
+                sibling = network ^ step
+                if network & step or sibling not in levels[prefix_length]:
+                    continue
+                parent = (network & parent_mask, prefix_length - 1)
+                if prefix_gateways.get(parent, {gateway}) != {gateway}:
+                    continue
+                levels[prefix_length].discard(network)
+                levels[prefix_length].discard(sibling)
+                levels[parent[1]].add(parent[0])
+        
+        # Drop prefixes made redundant by an enclosing prefix of this gateway
+        kept = set()
+        for prefix_length in range(33):
+            for network in levels[prefix_length]:
+                redundant = False
+                for outer_length in range(prefix_length - 1, -1, -1):
+                    outer = (network & prefix_to_mask(outer_length), outer_length)
+                    if outer[0] in levels[outer_length] or outer in kept:
+                        redundant = True
+                        break
+                    if outer in prefix_gateways:
+                        break  # Another switch address routes the space in between
+                if not redundant:
+                    kept.add((network, prefix_length))
+        
+        for prefix in kept:
+            if prefix in prefix_names:
+                # Unchanged routes keep their original name and details
+                for route_name in prefix_names[prefix]:
+                    aggregated[route_name] = routes[route_name]
+                continue
+            network, prefix_length = prefix
+            name = f"{int_to_ip(network)}/{prefix_length} via {gateway}"
+            while name in routes or name in aggregated:
+                name += " (aggregate)"
+            aggregated[name] = {"ip": int_to_ip(network),
+                                "mask": int_to_ip(prefix_to_mask(prefix_length)),
+                                "gateway": gateway}
+    
+    aggregated.update(passthrough)
+    
+    after_gateways = {}
+    for details in aggregated.values():
+        prefix = route_prefix(details)
+        if prefix is not None:
+            after_gateways.setdefault(prefix, set()).add(details.get("gateway", ""))
+    verified = forwarding_segments(prefix_gateways) == forwarding_segments(after_gateways)
+    
+    report = {"before": len(routes), "after": len(aggregated), "verified": verified}
+    return aggregated, report
+
+def _parse_ipv4_array(values):
+    """Parse dotted-quad strings into (uint32 addresses, valid flags) arrays
+    
+    The strings are packed into a byte matrix with one column per string. The
+    shape checks (only digits and three dots, one to three digits per octet,
+    no leading zeros) are whole-matrix comparisons; the octet values are then
+    accumulated a character position at a time for all strings together, so
+    no Python code runs per string apart from the initial packing.
+    """
+    np = load_numpy()
+    count = len(values)
+    try:
+        joined = "".join(values)
+        packable = joined.isascii() and "\0" not in joined and max(map(len, values)) <= 15
+    except TypeError:
+        packable = False
+    if not packable:
+        # Anything that cannot fit the matrix or is not plain ASCII is invalid
+        values = [value if isinstance(value, str) and len(value) <= 15 and value.isascii()
+                  and "\0" not in value else "" for value in values]
+    # Row i holds character i of every string; the extra last row ends strings of 15 characters
+    chars = np.zeros((16, count), dtype=np.uint8)
+    chars[:15] = np.array(values, dtype="S15").view(np.uint8).reshape(count, 15).T
+    
+    digits = chars - np.uint8(ord("0"))  # Wraps around for anything below "0"
+    is_digit = digits <= 9
+    is_dot = chars == ord(".")
+    is_end = chars == 0
+    closes = is_dot | is_end  # A dot or the first NUL of the padding ends an octet
+    closes[1:] &= ~is_end[:-1]
+    opens = np.ones_like(is_dot)
+    opens[1:] = is_dot[:-1]
+    valid = np.all(is_digit | is_dot | is_end, axis=0)
+    valid &= is_dot.sum(axis=0) == 3
+    valid &= ~np.any(opens & closes, axis=0)  # Empty octet
+    valid &= ~np.any(opens[:-1] & (digits[:-1] == 0) & is_digit[1:], axis=0)  # Leading zero
+    valid &= ~np.any(is_digit[:-3] & is_digit[1:-2] & is_digit[2:-1] & is_digit[3:], axis=0)  # Over three digits
+    
+    # Octets go into 10-bit fields while read, so over-large ones are caught once at the end.
+    # Arithmetic on the close flags stands in for np.where, which is far slower on random masks.
+    digits *= is_digit
+    shifts = closes.view(np.uint8) * np.uint8(10)
+    keeps = ~closes
+    fields = np.zeros(count, dtype=np.uint64)
+    octet = np.zeros(count, dtype=np.uint16)
+    for position in range(16):
+        fields = (fields << shifts[position]) | (octet * closes[position])
+        octet = (octet * 10 + digits[position]) * keeps[position]
+    addresses = np.zeros(count, dtype=np.uint32)
+    for shift in (30, 20, 10, 0):
+        value = ((fields >> np.uint64(shift)) & np.uint64(1023)).astype(np.uint32)
+        valid &= value <= 255
+        addresses = (addresses << 8) | value
+    return np.where(valid, addresses, 0), valid
+
+def validate_routes_bulk(routes, use_numpy=None):
+    """Validate a whole routes dict and compute subnet information per route
+    
+    Returns a column table: a "names" list plus equal-length columns for the
+    form validation flags (ip_error, mask_error, gateway_error,
+    route_ip_error) and the computed network, broadcast, prefix_length and
+    num_hosts. With NumPy the columns are arrays, otherwise lists. Subnet
+    columns are zero where the IP or mask is invalid, and a missing switch
+    address counts as a gateway_error since a route cannot be saved without one.
+    """
+    np = load_numpy() if use_numpy is not False else None
+    if use_numpy is None:
+        use_numpy = np is not None
+    
+    entries = list(routes.items())
+    names = [name for name, details in entries]
+    ips = [details.get("ip", "") for name, details in entries]
+    masks = [details.get("mask", "") for name, details in entries]
+    gateways = [details.get("gateway", "") for name, details in entries]
+    
+    if not use_numpy:
+        return _validate_routes_python(names, ips, masks, gateways)
+    
+    if not names:
+        empty_bool = np.zeros(0, dtype=bool)
+        empty_int = np.zeros(0, dtype=np.int64)
+        return {"names": names, "ip_error": empty_bool, "mask_error": empty_bool,
+                "gateway_error": empty_bool, "route_ip_error": empty_bool,
+                "network": empty_int, "broadcast": empty_int,
+                "prefix_length": empty_int, "num_hosts": empty_int}
+    
+    ip_values, ip_valid = _parse_ipv4_array(ips)
+    mask_values, mask_valid = _parse_ipv4_array(masks)
+    gateway_values, gateway_valid = _parse_ipv4_array(gateways)
+    
+    # A mask is contiguous when its host bits plus one is a power of two
+    host_bits = ~mask_values
+    contiguous = (host_bits & (host_bits + np.uint32(1))) == 0
+    mask_valid &= contiguous
+    both_valid = ip_valid & mask_valid
+    
+    host_count = host_bits.astype(np.int64) + 1
+    prefix_length = 32 - np.log2(host_count.astype(np.float64)).astype(np.int64)
+    network = ip_values & mask_values
+    broadcast = network | host_bits
+    
+    return {
+        "names": names,
+        "ip_error": ~ip_valid,
+        "mask_error": ~mask_valid,
+        "gateway_error": ~gateway_valid,
+        "route_ip_error": both_valid & (ip_values != network),
+        "network": np.where(both_valid, network, 0).astype(np.int64),
+        "broadcast": np.where(both_valid, broadcast, 0).astype(np.int64),
+        "prefix_length": np.where(both_valid, prefix_length, 0),
+        "num_hosts": np.where(both_valid, host_count - 2, 0),
+    }
+
+def _validate_routes_python(names, ips, masks, gateways):
+    """Pure Python fallback for validate_routes_bulk"""
+    table = {key: [] for key in ("ip_error", "mask_error", "gateway_error", "route_ip_error",
+                                 "network", "broadcast", "prefix_length", "num_hosts")}
+    table["names"] = names
+    for ip_str, mask_str, gateway_str in zip(ips, masks, gateways):
+        ip = ip_to_int(ip_str) if isinstance(ip_str, str) else None
+        mask = ip_to_int(mask_str) if isinstance(mask_str, str) else None
+        prefix_length = mask_to_prefix(mask) if mask is not None else None
+        gateway = ip_to_int(gateway_str) if isinstance(gateway_str, str) else None
+        both_valid = ip is not None and prefix_length is not None
+        
+        table["ip_error"].append(ip is None)
+        table["mask_error"].append(prefix_length is None)
+        table["gateway_error"].append(gateway is None)
+        if both_valid:
+            network = ip & mask
+            table["route_ip_error"].append(ip != network)
+            table["network"].append(network)
+            table["broadcast"].append(network | (~mask & 0xFFFFFFFF))
+            table["prefix_length"].append(prefix_length)
+            table["num_hosts"].append(2 ** (32 - prefix_length) - 2)
+        else:
+            for key in ("network", "broadcast", "prefix_length", "num_hosts"):
+                table[key].append(0)
+            table["route_ip_error"].append(False)
+    return table
+
+def read_destinations(file, column=None, batch_size=FLOW_BATCH_SIZE):
+    """Yield the destination addresses of a CSV or flow-log export in lists of batch_size
+    
+    Fields are split on tabs or commas when the first line has them and on
+    whitespace otherwise, as in VPC flow logs. The first line is a header when
+    none of its fields is an address. The destination column is column (a
+    header name or a 0-based number), else the first header found in
+    DESTINATION_COLUMNS; a file with one field per line needs neither. Values
+    are passed on unparsed, so "-" and other junk count as invalid later.
+    Raises ValueError when the column cannot be found.
+    
+    The file is read DESTINATION_READ_SIZE characters at a time, and a file
+    with one field per line is split a whole chunk at a time.
+    """
+    first = file.readline()
+    while first and (not first.strip() or first.lstrip().startswith("#")):
+        first = file.readline()
+    if not first:
+        return
+    delimiter = "\t" if "\t" in first else "," if "," in first else None
+    fields = [field.strip(' \t"\r\n') for field in first.split(delimiter)]
+    is_header = not any(ip_to_int(field) is not None for field in fields)
+    headers = [field.lower() for field in fields]
+    if isinstance(column, int):
+        index = column
+    elif column is not None:
+        if not is_header or column.lower() not in headers:
+            raise ValueError(f"no column named {column}")
+        index = headers.index(column.lower())
+    elif len(fields) == 1:
+        index = 0
+    else:
+        index = next((headers.index(name) for name in DESTINATION_COLUMNS if is_header and name in headers), None)
+        if index is None:
+            raise ValueError("cannot tell which column holds the destination; name it or give its number")
+    
+    width = len(fields)
+    pending = [] if is_header else [fields[index] if index < width else ""]
+    while True:
+        text = file.read(DESTINATION_READ_SIZE)
+        if not text:
+            break
+        text += file.readline()  # Finish the last line
+        if width == 1 and index == 0:
+            if "#" in text:
+                text = "\n".join(line for line in text.splitlines() if not line.lstrip().startswith("#"))
+            values = text.split()
+        else:
+            lines = [line for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+            values = [fields[index] if index < len(fields) else ""
+                      for fields in (line.split(delimiter) for line in lines)]
+        pending.extend([value.strip(' \t"\r') for value in values])
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            del pending[:batch_size]
+    if pending:
+        yield pending
+
+class _PrefixRanges:
+    """Longest-prefix match over a fixed set of prefixes, as sorted range starts
+    
+    The prefixes are flattened into non-overlapping address ranges, each owned
+    by the most specific prefix covering it, with the stack sweep of
+    forwarding_segments, so resolving an address is a single binary search:
+    np.searchsorted over a whole batch with NumPy, bisect per address without.
+    prefixes yields (key, owner) in key order, a key being network << 6 |
+    prefix length so that keys sort by network and then length; addresses no
+    prefix covers get the owner none.
+    """
+    
+    def __init__(self, prefixes, none, np=None):
+        starts, owners = [], []
+        position = 0
+        stack = []  # (broadcast, owner) of the prefixes enclosing position
+        for key, owner in itertools.chain(prefixes, [(1 << 38, none)]):
+            network = key >> 6
+            while stack and stack[-1][0] < network:
+                broadcast, enclosing = stack.pop()
+                if position <= broadcast:
+                    starts.append(position)
+                    owners.append(enclosing)
+                    position = broadcast + 1
+            if position < network and position <= 0xFFFFFFFF:
+                starts.append(position)
+                owners.append(stack[-1][1] if stack else none)
+                position = network
+            stack.append((network | (0xFFFFFFFF >> (key & 63)), owner))
+        if np is not None:
+            self.starts = np.array(starts, dtype=np.uint32)
+            self.owners = np.array(owners, dtype=np.int64)
+        else:
+            self.starts = starts
+            self.owners = owners
+        self.np = np
+    
+    def lookup(self, addresses):
+        """The owner of each address, for a uint32 array with NumPy or a list of integers without"""
+        if self.np is not None:
+            return self.owners[self.np.searchsorted(self.starts, addresses, side="right") - 1]
+        starts, owners = self.starts, self.owners
+        return [owners[bisect.bisect_right(starts, address) - 1] for address in addresses]
+
+def _hop_label(gateways):
+    """The next hop of a prefix routed through a set of switch addresses"""
+    return next(iter(gateways)) if len(gateways) == 1 else ", ".join(sorted(gateways))
+
+def _route_prefix_keys(routes, np):
+    """Group the routes with a valid prefix by prefix, as _PrefixRanges keys
+    
+    Returns (keys, hops, names, owners): the distinct keys in order, the next
+    hop of each, and the route names with the index of each one's key (an
+    array with NumPy). With NumPy the prefixes of a routes dict come from
+    validate_routes_bulk and are grouped with np.unique; only prefixes whose
+    routes name different switch addresses are grouped in Python.
+    """
+    if np is not None and not isinstance(routes, CompactRouteTable):
+        table = validate_routes_bulk(routes, use_numpy=True)
+        valid = ~(table["ip_error"] | table["mask_error"])
+        keys = ((table["network"] << 6) | table["prefix_length"])[valid]
+        valid = valid.tolist()
+        names = [route_name for route_name, ok in zip(table["names"], valid) if ok]
+        gateways = [details.get("gateway", "") for details, ok in zip(routes.values(), valid) if ok]
+    else:
+        names, keys, gateways = [], [], []
+        if isinstance(routes, CompactRouteTable):
+            entries = ((route_name, prefix, gateway) for (route_name, prefix), (_, gateway)
+                       in zip(routes.prefixes(), routes.route_gateways()))
+        else:
+            entries = ((route_name, route_prefix(details), details.get("gateway", ""))
+                       for route_name, details in routes.items())
+        for route_name, prefix, gateway in entries:
+            if prefix is not None:
+                names.append(route_name)
+                keys.append(prefix[0] << 6 | prefix[1])
+                gateways.append(gateway)
+    
+    if np is None:
+        hop_sets = {}
+        for key, gateway in zip(keys, gateways):
+            hop_sets.setdefault(key, set()).add(gateway)
+        unique = sorted(hop_sets)
+        positions = {key: owner for owner, key in enumerate(unique)}
+        return unique, [_hop_label(hop_sets[key]) for key in unique], names, [positions[key] for key in keys]
+    
+    unique, first, owners = np.unique(np.asarray(keys, dtype=np.int64), return_index=True, return_inverse=True)
+    gateway_ids = {}
+    route_gateways = np.array([gateway_ids.setdefault(gateway, len(gateway_ids)) for gateway in gateways],
+                              dtype=np.int64)
+    labels = list(gateway_ids)
+    hop_gateways = route_gateways[first]
+    hops = [labels[gateway] for gateway in hop_gateways.tolist()]
+    mixed = np.unique(owners[route_gateways != hop_gateways[owners]])
+    hop_sets = {}
+    for route in np.nonzero(np.isin(owners, mixed))[0].tolist():
+        hop_sets.setdefault(int(owners[route]), set()).add(gateways[route])
+    for owner, gateway_set in hop_sets.items():
+        hops[owner] = _hop_label(gateway_set)
+    return unique.tolist(), hops, names, owners
+
+class FlowTrace:
+    """Resolves destination addresses against a route set to see where their traffic would go
+    
+    system_routes, the output of parse_route_print, is layered under the
+    routes: the most specific prefix still wins, and a prefix in both goes
+    through the routes. Next hops are then compared with the system table
+    alone, which is what forwards the traffic today. A prefix with several
+    switch addresses has them all, comma-separated, as its next hop. The
+    lookup tables are built once, from the routes as they are now; run may
+    then be called on another thread, any number of times.
+    """
+    
+    def __init__(self, routes, system_routes=None, use_numpy=None):
+        np = load_numpy() if use_numpy is not False else None
+        if use_numpy is None:
+            use_numpy = np is not None
+        self.np = np if use_numpy else None
+        
+        keys, hops, self.names, self.owners = _route_prefix_keys(routes, self.np)
+        system_hop_sets = {}
+        for record in (system_routes["active"] + system_routes["persistent"]) if system_routes is not None else ():
+            prefix = route_prefix(record)
+            if prefix is not None:
+                system_hop_sets.setdefault(prefix[0] << 6 | prefix[1], set()).add(record["gateway"])
+        system_keys = sorted(system_hop_sets)
+        system_hops = [_hop_label(system_hop_sets[key]) for key in system_keys]
+        
+        # Routes keep owners 0..len(keys) - 1; the system prefixes they do not replace follow
+        route_keys = set(keys)
+        extra = [(key, hop) for key, hop in zip(system_keys, system_hops) if key not in route_keys]
+        self.system_owners = range(len(keys), len(keys) + len(extra))
+        self.system_cidrs = [f"{int_to_ip(key >> 6)}/{key & 63}" for key, hop in extra]
+        self.unmatched_owner = len(keys) + len(extra)
+        routed = zip(keys, range(len(keys)))
+        system_only = zip([key for key, hop in extra], self.system_owners)
+        self.table = _PrefixRanges(heapq.merge(routed, system_only), self.unmatched_owner, self.np)
+        self.current = None
+        if system_routes is not None:
+            self.current = _PrefixRanges(zip(system_keys, range(len(system_keys))), len(system_keys), self.np)
+        
+        # Next hops are numbered, 0 being no route, so a batch compares them as integers
+        hop_ids = {None: 0}
+        self.new_hops = [hop_ids.setdefault(hop, len(hop_ids)) for hop in hops + [hop for key, hop in extra]] + [0]
+        self.old_hops = [hop_ids.setdefault(hop, len(hop_ids)) for hop in system_hops] + [0]
+        self.hop_labels = list(hop_ids)
+        if self.np is not None:
+            self.new_hops = self.np.array(self.new_hops, dtype=self.np.int64)
+            self.old_hops = self.np.array(self.old_hops, dtype=self.np.int64)
+    
+    def run(self, destinations, sample_size=10):
+        """Resolve destinations, an iterable of lists of address strings such as read_destinations yields
+        
+        Returns a report dict:
+          destinations, invalid - addresses read, and how many of them do not parse
+          matched, unmatched    - valid addresses with and without a route
+          route_hits            - name -> addresses carried, for every route with a valid
+                                  prefix; routes sharing a prefix each get its count
+          system_hits           - cidr -> addresses carried, for system routes that carry any
+          unmatched_sample      - up to sample_size distinct unmatched addresses, lowest
+                                  first within a batch
+          changed, changes      - addresses whose next hop changes, and a dict of old, new,
+                                  count and sample for each pair of next hops (None for no
+                                  route), most addresses first; empty without system_routes
+          seconds               - time taken, reading the destinations included
+        """
+        np, table, current = self.np, self.table, self.current
+        new_hops, old_hops, unmatched_owner = self.new_hops, self.old_hops, self.unmatched_owner
+        hop_count = len(self.hop_labels)
+        started = time.perf_counter()
+        total = invalid = 0
+        unmatched_sample = []
+        pair_counts = {}  # old hop id * hop_count + new hop id -> addresses
+        pair_samples = {}
+        if np is not None:
+            hits = np.zeros(unmatched_owner + 1, dtype=np.int64)
+        else:
+            hits = [0] * (unmatched_owner + 1)
+        
+        for batch in destinations:
+            total += len(batch)
+            if not batch:
+                continue
+            if np is not None:
+                addresses, valid = _parse_ipv4_array(batch)
+                addresses = np.sort(addresses[valid])  # Searching in order is far kinder to the cache
+                invalid += len(batch) - len(addresses)
+                found = table.lookup(addresses)
+                hits += np.bincount(found, minlength=len(hits))
+                if len(unmatched_sample) < sample_size:
+                    missed = np.unique(addresses[found == unmatched_owner])[:sample_size]
+                    _add_samples(unmatched_sample, missed.tolist(), sample_size)
+                if current is None:
+                    continue
+                new = new_hops[found]
+                old = old_hops[current.lookup(addresses)]
+                moved = np.nonzero(new != old)[0]
+                codes = old[moved] * hop_count + new[moved]
+                order = np.argsort(codes, kind="stable")
+                pairs, firsts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+                for code, first, count in zip(pairs.tolist(), firsts.tolist(), counts.tolist()):
+                    pair_counts[code] = pair_counts.get(code, 0) + count
+                    sample = pair_samples.setdefault(code, [])
+                    if len(sample) < sample_size:
+                        pair_addresses = np.unique(addresses[moved[order[first:first + count]]])[:sample_size]
+                        _add_samples(sample, pair_addresses.tolist(), sample_size)
+                continue
+            
+            addresses = sorted(address for address in map(_ip_or_none, batch) if address is not None)
+            invalid += len(batch) - len(addresses)
+            found = table.lookup(addresses)
+            old_found = current.lookup(addresses) if current is not None else None
+            for position, (address, owner) in enumerate(zip(addresses, found)):
+                hits[owner] += 1
+                if owner == unmatched_owner and len(unmatched_sample) < sample_size:
+                    _add_samples(unmatched_sample, (address,), sample_size)
+                if current is not None:
+                    old, new = old_hops[old_found[position]], new_hops[owner]
+                    if old != new:
+                        code = old * hop_count + new
+                        pair_counts[code] = pair_counts.get(code, 0) + 1
+                        sample = pair_samples.setdefault(code, [])
+                        if len(sample) < sample_size:
+                            _add_samples(sample, (address,), sample_size)
+        
+        if np is not None:
+            route_hits = dict(zip(self.names, hits[self.owners].tolist()))
+            hits = hits.tolist()
+        else:
+            route_hits = {route_name: hits[owner] for route_name, owner in zip(self.names, self.owners)}
+        system_hits = {cidr: hits[owner] for cidr, owner in zip(self.system_cidrs, self.system_owners) if hits[owner]}
+        changes = [{"old": self.hop_labels[code // hop_count], "new": self.hop_labels[code % hop_count],
+                    "count": count, "sample": pair_samples[code]}
+                   for code, count in sorted(pair_counts.items(), key=lambda item: (-item[1], item[0]))]
+        return {
+            "destinations": total,
+            "invalid": invalid,
+            "matched": total - invalid - hits[unmatched_owner],
+            "unmatched": hits[unmatched_owner],
+            "route_hits": route_hits,
+            "system_hits": system_hits,
+            "unmatched_sample": unmatched_sample,
+            "changed": sum(pair_counts.values()),
+            "changes": changes,
+            "seconds": time.perf_counter() - started,
+        }
+
+def simulate_flows(routes, destinations, system_routes=None, use_numpy=None, sample_size=10):
+    """Build a FlowTrace and run it once; the report's seconds include building the tables"""
+    started = time.perf_counter()
+    report = FlowTrace(routes, system_routes, use_numpy).run(destinations, sample_size)
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+def _add_samples(sample, addresses, sample_size):
+    """Add addresses not in sample yet, as text, until it holds sample_size"""
+    for address in addresses:
+        if len(sample) >= sample_size:
+            break
+        text = int_to_ip(address)
+        if text not in sample:
+            sample.append(text)
+
+def _ip_or_none(value):
+    return ip_to_int(value) if isinstance(value, str) else None
@@ -0,0 +1,391 @@
+"""Apply route plans to many hosts at once through a small agent.
+
+Usage: python Routefleet.py agent --listen HOST:PORT [--backend NAME] [--latency SECONDS]
+       python Routefleet.py apply HOSTS_FILE ROUTES_FILE [--action add|delete] [--concurrency N] ...
+
+Each host runs an agent that owns its routing table backend. The GUI or the
+apply command connects to every host at once, up to a concurrency limit, so
+a rollout takes about as long as the slowest host rather than the sum of
+all of them. Messages are JSON objects, one per line:
+
+  agent -> controller  {"type": "hello", "nonce": ..., "host": ..., "backend": ...}
+  controller -> agent  {"op": "auth", "mac": HMAC-SHA256(token, nonce)}
+  agent -> controller  {"type": "ready"}, or {"type": "error", "message": ...} and it hangs up
+
+after which requests and answers are those of the elevated helper
+(Routehelper.py): {"id", "op": "route", "action", "ip", "mask", "gateway"}
+answered by output lines and one result per request. The shared token comes
+from ROUTES_FLEET_TOKEN or --token-file and never crosses the wire; the
+traffic itself is not encrypted, so agents belong on a management network
+or behind an SSH tunnel.
+
+The controller keeps up to FLEET_WINDOW requests in flight per host and sends
+more as results come back. A host that stays silent for the timeout, or
+drops the connection, is retried; operations it already answered are not
+sent again. With
+--backend fake and --latency, agents on loopback stand in for real hosts.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import sys
+import time
+
+from Routebackend import BACKENDS, check_operation, create_backend
+
+FLEET_PORT = 47800
+FLEET_TOKEN_ENV = "ROUTES_FLEET_TOKEN"
+
+# Defaults for a rollout: hosts handled at once, seconds a host may stay
+# silent, and further attempts after a failed one (waiting RETRY_DELAY
+# seconds times the attempt number in between)
+FLEET_CONCURRENCY = 16
+FLEET_TIMEOUT = 30
+FLEET_RETRIES = 2
+RETRY_DELAY = 1.0
+
+# Requests sent to a host ahead of their results; more are sent once half of them are answered
+FLEET_WINDOW = 64
+
+class FleetError(Exception):
+    """A host answered with something other than the protocol expects"""
+
+class FleetAuthError(FleetError):
+    """A host refused the token; retrying will not help"""
+
+def token_mac(token, nonce):
+    return hmac.new(token.encode("utf-8"), nonce.encode("utf-8"), "sha256").hexdigest()
+
+def parse_host(text, default_port=FLEET_PORT):
+    """Turn "host" or "host:port" into (host, port)"""
+    host, separator, port = text.strip().rpartition(":")
+    if not separator:
+        host, port = port, ""
+    if not host:
+        raise ValueError(f"invalid host: {text!r}")
+    if not port:
+        return host, default_port
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid port in {text!r}")
+    return host, int(port)
+
+def read_hosts(lines):
+    """Parse host lines, skipping blanks and # comments"""
+    hosts = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            hosts.append(parse_host(line))
+    return hosts
+
+def read_token(token_file=None):
+    """The shared fleet token, from a file or the environment"""
+    if token_file:
+        with open(token_file, "r") as file:
+            token = file.read().strip()
+    else:
+        token = os.environ.get(FLEET_TOKEN_ENV, "")
+    if not token:
+        raise ValueError(f"no fleet token: set {FLEET_TOKEN_ENV} or give a token file")
+    return token
+
+def _send(writer, message):
+    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+
+async def _drain(writer, timeout):
+    """writer.drain(), giving up after timeout when the peer stops reading"""
+    # drain() can only wait while the buffer is above its low-water mark; below it, skipping
+    # wait_for saves a task per message
+    if writer.transport.get_write_buffer_size() <= writer.transport.get_write_buffer_limits()[0]:
+        await writer.drain()
+    else:
+        await asyncio.wait_for(writer.drain(), timeout)
+
+async def _receive(reader, timeout):
+    line = await asyncio.wait_for(reader.readline(), timeout)
+    if not line:
+        raise ConnectionError("connection closed")
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise FleetError("malformed message")
+
+async def serve_agent(reader, writer, token, backend, latency=0.0):
+    """Answer one controller connection: authenticate it, then run its route requests in order"""
+    nonce = secrets.token_hex(16)
+    try:
+        _send(writer, {"type": "hello", "nonce": nonce, "host": socket.gethostname(), "backend": backend.name})
+        await _drain(writer, FLEET_TIMEOUT)
+        auth = await _receive(reader, FLEET_TIMEOUT)
+        if not hmac.compare_digest(str(auth.get("mac", "")), token_mac(token, nonce)):
+            _send(writer, {"type": "error", "message": "authentication failed"})
+            await _drain(writer, FLEET_TIMEOUT)
+            return
+        _send(writer, {"type": "ready"})
+        await _drain(writer, FLEET_TIMEOUT)
+        
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                request_id = request["id"]
+            except (ValueError, TypeError, KeyError):
+                _send(writer, {"type": "error", "message": "malformed request"})
+                continue
+            if request.get("op") == "shutdown":
+                break
+            output = []
+            try:
+                if request.get("op") != "route":
+                    raise ValueError(f"unsupported request: {request.get('op')}")
+                operation = check_operation(request)
+                if latency:
+                    await asyncio.sleep(latency)
+                # Backends block on subprocesses and sockets, so they run off the event loop
+                exit_code = await asyncio.to_thread(backend.apply, operation["action"], operation, output.append)
+                error = None
+            except (OSError, ValueError) as e:
+                exit_code, error = None, str(e)
+            for output_line in output:
+                _send(writer, {"id": request_id, "type": "output", "line": output_line})
+            result = {"id": request_id, "type": "result", "exit_code": exit_code}
+            if error:
+                result["error"] = error
+            _send(writer, result)
+            await _drain(writer, FLEET_TIMEOUT)
+    except (OSError, FleetError, asyncio.TimeoutError):
+        pass  # The controller went away; it retries what was not answered
+    finally:
+        writer.close()
+
+async def start_agent(host, port, token, backend, latency=0.0):
+    """Start an agent server; returns the asyncio server"""
+    return await asyncio.start_server(lambda reader, writer: serve_agent(reader, writer, token, backend, latency),
+                                      host, port)
+
+async def _push_attempt(address, token, operations, pending, results, on_event, timeout):
+    """One connection to a host: send the operations at the pending indexes and collect their results"""
+    host, port = address
+    label = f"{host}:{port}"
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        hello = await _receive(reader, timeout)
+        if hello.get("type") != "hello" or "nonce" not in hello:
+            raise FleetError("not a route agent")
+        _send(writer, {"op": "auth", "mac": token_mac(token, str(hello["nonce"]))})
+        await _drain(writer, timeout)
+        ready = await _receive(reader, timeout)
+        if ready.get("type") != "ready":
+            raise FleetAuthError(ready.get("message", "authentication failed"))
+        on_event({"type": "host", "host": label, "state": "connected",
+                  "message": f"{hello.get('host', '?')} ({hello.get('backend', '?')} backend)"})
+        
+        # Keep up to a window of requests queued at the agent, which answers in order, topping it up half
+        # a window per write. Sending the whole plan first fills the socket buffers both ways once the agent
+        # blocks writing answers nobody reads.
+        remaining = set(pending)
+        sent = 0
+        while remaining:
+            answered = len(pending) - len(remaining)
+            if sent < len(pending) and sent - answered <= FLEET_WINDOW // 2:
+                for index in pending[sent:answered + FLEET_WINDOW]:
+                    operation = operations[index]
+                    _send(writer, {"id": index, "op": "route", "action": operation["action"], "ip": operation["ip"],
+                                   "mask": operation["mask"], "gateway": operation["gateway"]})
+                    sent += 1
+                await _drain(writer, timeout)
+            message = await _receive(reader, timeout)
+            index = message.get("id")
+            if index not in remaining:
+                continue
+            if message.get("type") == "output":
+                on_event({"type": "output", "host": label, "index": index, "line": message.get("line", "")})
+            elif message.get("type") == "result":
+                remaining.discard(index)
+                results[index] = {"exit_code": message.get("exit_code"), "error": message.get("error")}
+                on_event({"type": "result", "host": label, "index": index, "exit_code": message.get("exit_code"),
+                          "error": message.get("error")})
+        _send(writer, {"id": 0, "op": "shutdown"})
+        await _drain(writer, timeout)
+    finally:
+        writer.close()
+
+async def push_to_host(address, token, operations, on_event, timeout=FLEET_TIMEOUT, retries=FLEET_RETRIES):
+    """Apply operations on one host, retrying unanswered ones; returns the host's report
+    
+    The report is {"host", "state" ("done" or "failed"), "attempts", "ok",
+    "failed", "not_run", "seconds", "error", "results"}, where results holds
+    {"exit_code", "error"} per operation, None for those never answered.
+    """
+    host, port = address
+    label = f"{host}:{port}"
+    started = time.perf_counter()
+    results = [None] * len(operations)
+    error = None
+    attempt = 0
+    while True:
+        attempt += 1
+        pending = [index for index, result in enumerate(results) if result is None]
+        on_event({"type": "host", "host": label, "state": "connecting", "attempt": attempt})
+        try:
+            await _push_attempt(address, token, operations, pending, results, on_event, timeout)
+            error = None
+            break
+        except asyncio.TimeoutError:
+            error = f"no answer within {timeout} s"
+        except (OSError, FleetError) as e:
+            error = str(e) or type(e).__name__
+            if isinstance(e, FleetAuthError):
+                break
+        if attempt > retries:
+            break
+        on_event({"type": "host", "host": label, "state": "retrying", "attempt": attempt, "message": error})
+        await asyncio.sleep(RETRY_DELAY * attempt)
+    
+    report = {
+        "host": label,
+        "state": "failed" if error else "done",
+        "attempts": attempt,
+        "ok": sum(1 for result in results if result is not None and result["exit_code"] == 0),
+        "failed": sum(1 for result in results if result is not None and result["exit_code"] != 0),
+        "not_run": sum(1 for result in results if result is None),
+        "seconds": time.perf_counter() - started,
+        "error": error,
+        "results": results,
+    }
+    on_event({"type": "host", "host": label, "state": report["state"], "attempt": attempt, "message": error,
+              "report": report})
+    return report
+
+async def push_to_fleet(addresses, token, operations, on_event, concurrency=FLEET_CONCURRENCY,
+                        timeout=FLEET_TIMEOUT, retries=FLEET_RETRIES):
+    """Apply the same operations on every host, at most concurrency at a time; returns the reports in order
+    
+    Operations are plan_reconcile style dicts, checked once up front. on_event
+    is called on the event loop thread with {"type": "host", "host", "state",
+    ...} as a host connects, retries, finishes or fails, and with "output"
+    and "result" events ({"host", "index", ...}) as the operations run.
+    
+    An operation that fails the check is sent to no host; it is reported once
+    with a {"type": "skipped", "index", "error"} event, and stands in every
+    report's results as {"exit_code": None, "error"}, counted in "skipped".
+    Indexes in events and results are always positions in operations.
+    """
+    runnable, indexes, skipped = [], [], {}
+    for index, operation in enumerate(operations):
+        try:
+            runnable.append(check_operation(operation))
+        except ValueError as e:
+            skipped[index] = str(e)
+            on_event({"type": "skipped", "index": index, "error": str(e)})
+            continue
+        indexes.append(index)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    def host_event(event):
+        if "index" in event:
+            event["index"] = indexes[event["index"]]
+        if "report" in event:
+            report = event["report"]
+            results = dict(zip(indexes, report["results"]))
+            report["results"] = [results[index] if index in results else {"exit_code": None, "error": skipped[index]}
+                                 for index in range(len(operations))]
+            report["skipped"] = len(skipped)
+        on_event(event)
+    
+    async def limited(address):
+        async with semaphore:
+            return await push_to_host(address, token, runnable, host_event, timeout, retries)
+    
+    return await asyncio.gather(*(limited(address) for address in addresses))
+
+def run_fleet(addresses, token, operations, on_event, **options):
+    """Run push_to_fleet on a new event loop, e.g. from a worker thread"""
+    return asyncio.run(push_to_fleet(addresses, token, operations, on_event, **options))
+
+async def _run_agent(args, token):
+    backend = create_backend(args.backend)
+    host, port = parse_host(args.listen)
+    server = await start_agent(host, port, token, backend, args.latency)
+    addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Route agent listening on {addresses} ({backend.name} backend)", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def command_agent(args):
+    asyncio.run(_run_agent(args, read_token(args.token_file)))
+    return 0
+
+def command_apply(args):
+    """Apply a routes file's routes on every host in a hosts file, streaming progress to stderr"""
+    from Routecore import read_routes_file
+    
+    token = read_token(args.token_file)
+    with open(args.hosts_file, "r") as file:
+        addresses = read_hosts(file)
+    routes = read_routes_file(args.routes_file)["routes"]
+    operations = []
+    for name in args.names or list(routes):
+        details = routes[name]
+        operations.append({"action": args.action, "name": name, "ip": details.get("ip", ""),
+                           "mask": details.get("mask", ""), "gateway": details.get("gateway", "")})
+    
+    def on_event(event):
+        if event["type"] == "skipped":
+            print(f"SKIPPED: {operations[event['index']]['name']}: {event['error']}", file=sys.stderr)
+        elif event["type"] == "host":
+            message = f": {event['message']}" if event.get("message") else ""
+            print(f"[{event['host']}] {event['state']}{message}", file=sys.stderr)
+        elif event["type"] == "result" and event["exit_code"] != 0:
+            print(f"[{event['host']}] {args.action} {operations[event['index']]['ip']}: "
+                  f"{event['error'] or event['exit_code']}", file=sys.stderr)
+    
+    started = time.perf_counter()
+    reports = run_fleet(addresses, token, operations, on_event, concurrency=args.concurrency,
+                        timeout=args.timeout, retries=args.retries)
+    for report in reports:
+        print(f"{report['host']}: {report['state']}, {report['ok']} ok, {report['failed']} failed, "
+              f"{report['not_run']} not run, {report['skipped']} skipped, {report['attempts']} attempts, "
+              f"{report['seconds']:.1f} s")
+    print(f"{len(operations)} operations on {len(reports)} hosts in {time.perf_counter() - started:.1f} s",
+          file=sys.stderr)
+    return 0 if all(report["state"] == "done" and not report["failed"] for report in reports) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="Routefleet.py", description="Apply route plans to many hosts at once.")
+    parser.add_argument("--token-file", help=f"file holding the shared token (default: ${FLEET_TOKEN_ENV})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    agent = commands.add_parser("agent", help="run the agent that applies routes on this host")
+    agent.add_argument("--listen", default=f"0.0.0.0:{FLEET_PORT}",
+                       help=f"address to listen on (default: 0.0.0.0:{FLEET_PORT})")
+    agent.add_argument("--backend", choices=sorted(BACKENDS), help="routing table backend (default: the platform's)")
+    agent.add_argument("--latency", type=float, default=0.0,
+                       help="extra seconds per operation, to simulate a slow host")
+    agent.set_defaults(handler=command_agent)
+    
+    apply = commands.add_parser("apply", help="apply a routes file on every host in a hosts file")
+    apply.add_argument("hosts_file", help="one host or host:port per line")
+    apply.add_argument("routes_file")
+    apply.add_argument("--action", choices=("add", "delete"), default="add")
+    apply.add_argument("--names", nargs="+", help="routes to apply (default: all)")
+    apply.add_argument("--concurrency", type=int, default=FLEET_CONCURRENCY, help="hosts handled at once")
+    apply.add_argument("--timeout", type=float, default=FLEET_TIMEOUT, help="seconds a host may stay silent")
+    apply.add_argument("--retries", type=int, default=FLEET_RETRIES, help="further attempts for a failed host")
+    apply.set_defaults(handler=command_apply)
+    
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,528 @@
 import json
+import sqlite3
 import subprocess
 import tkinter as tk
 from tkinter import ttk, messagebox, font, filedialog, scrolledtext
 import os
 import uuid
-import ipaddress
 import socket
 import threading
 import datetime
+import queue
+import time
+import collections
+import bisect
+import gc
+import logging
+import logging.handlers
+
+from Routecore import (
+    MERGED_ROUTES_FILE, NAME_CONFLICT_POLICIES, PREFIX_CONFLICT_POLICIES, VALIDATION_MESSAGES, CompactRouteTable,
+    FlowTrace, RouteFileLoad, RouteHistory, RouteIndex, RouteJournal, SavedRouteWatch, SqliteRouteIndex,
+    SqliteRouteStore, aggregate_routes, analyse_routes, compute_network_info, int_to_ip, is_sqlite_path, is_valid_ip,
+    is_valid_mask, load_site_files, merge_site_routes, plan_reconcile, plan_repoint, read_destinations, route_cidr,
+    site_route_files, validate_routes_bulk,
+)
+from Routebackend import RouteTableMonitor, create_backend, result_status
+from Routefleet import FLEET_CONCURRENCY, FLEET_RETRIES, FLEET_TIMEOUT, FLEET_TOKEN_ENV, read_hosts, run_fleet
+from Routehelper import LocalRouteRunner, RouteHelperClient, helper_launcher
+from Routemetrics import metrics, timed
+
+# Console: flush queued output every few milliseconds, bounded per flush
+CONSOLE_FLUSH_INTERVAL_MS = 15
+CONSOLE_FLUSH_BUDGET = 0.01
+CONSOLE_FLUSH_MAX_LINES = 2000
+CONSOLE_MAX_LINES = 10000
+
+# Live form validation runs once typing pauses for this long
+VALIDATION_DEBOUNCE_MS = 150
+
+# Background loads are polled this often and merged into the route browser at this interval
+ROUTE_LOAD_POLL_MS = 20
+ROUTE_LOAD_SHOW_INTERVAL = 0.25
+
+# The routing table monitor checks this often by default, and keeps this many
+# change lines and shows this many missing saved routes
+MONITOR_DEFAULT_INTERVAL = 5
+MONITOR_MAX_LINES = 2000
+MONITOR_MAX_MISSING = 500
+
+# The merge report lists at most this many conflicts
+MERGE_MAX_CONFLICTS = 2000
+
+# A destination trace report lists this many of the busiest routes, idle routes and next hop changes
+TRACE_REPORT_TOP = 20
+
+# Analysis and validation reports list this many findings of each kind
+FINDINGS_REPORT_TOP = 20
+
+# The performance view refreshes this often while open
+PERFORMANCE_REFRESH_MS = 1000
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+class ConsoleLog:
+    """Thread-safe, bounded log pipeline feeding the console widget
+    
+    Any thread may log, write raw lines or queue a callback. Everything goes
+    through one queue that the Tk thread drains every few milliseconds, so
+    many messages become a single widget insert and output keeps its order.
+    The most recent lines are kept in a ring buffer, which is also what the
+    widget is re-rendered from when the level filter changes. Messages can be
+    mirrored to a rotating log file.
+    """
+    
+    def __init__(self, root, widget, max_lines=CONSOLE_MAX_LINES, level="INFO"):
+        self.root = root
+        self.widget = widget
+        self.level = LOG_LEVELS[level]
+        self.lines = collections.deque(maxlen=max_lines)  # (level, text); raw lines have level None
+        self.queue = queue.Queue()
+        self.file_logger = None
+        self._clear = object()
+        self.root.after(CONSOLE_FLUSH_INTERVAL_MS, self.drain)
+    
+    def log(self, message, level="INFO"):
+        """Queue a timestamped message"""
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        self.queue.put((LOG_LEVELS[level], f"[{timestamp}] {message}"))
+        if self.file_logger is not None:
+            self.file_logger.log(LOG_LEVELS[level], message)
+    
+    def write(self, lines):
+        """Queue raw output lines, shown whatever the level filter"""
+        for line in lines:
+            self.queue.put((None, line))
+    
+    def clear(self):
+        """Queue clearing the console, after anything already queued"""
+        self.queue.put(self._clear)
+    
+    def call(self, callback, *args):
+        """Run callback on the Tk thread once the lines queued before it are shown"""
+        self.queue.put((callback, args))
+    
+    def set_level(self, level):
+        """Change the level filter and re-render the console from the ring buffer"""
+        self.level = LOG_LEVELS[level]
+        self.widget.delete(1.0, tk.END)
+        self.widget.insert(tk.END, "".join(f"{text}\n" for line_level, text in self.lines
+                                           if self._visible(line_level)))
+        self.widget.see(tk.END)
+    
+    def mirror_to_file(self, file_path, max_bytes=1000000, backup_count=3):
+        """Mirror log messages to a rotating log file, or stop mirroring if file_path is None"""
+        if self.file_logger is not None:
+            for handler in list(self.file_logger.handlers):
+                self.file_logger.removeHandler(handler)
+                handler.close()
+            self.file_logger = None
+        if file_path:
+            handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=max_bytes,
+                                                           backupCount=backup_count)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self.file_logger = logging.getLogger(f"{__name__}.console.{id(self)}")
+            self.file_logger.setLevel(logging.DEBUG)
+            self.file_logger.propagate = False
+            self.file_logger.addHandler(handler)
+    
+    def _visible(self, line_level):
+        return line_level is None or line_level >= self.level
+    
+    def drain(self):
+        """Move a time-bounded batch of queued entries into the widget"""
+        deadline = time.perf_counter() + CONSOLE_FLUSH_BUDGET
+        chunk = []
+        processed = 0
+        while processed < CONSOLE_FLUSH_MAX_LINES:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            processed += 1
+            if entry is self._clear:
+                self._flush(chunk)
+                chunk = []
+                self.lines.clear()
+                self.widget.delete(1.0, tk.END)
+            elif callable(entry[0]):
+                self._flush(chunk)
+                chunk = []
+                try:
+                    entry[0](*entry[1])
+                except Exception as e:
+                    self.log(f"Error in console callback: {str(e)}", "ERROR")
+            else:
+                self.lines.append(entry)
+                if self._visible(entry[0]):
+                    chunk.append(entry[1])
+            if processed % 100 == 0 and time.perf_counter() > deadline:
+                break
+        self._flush(chunk)
+        self.root.after(CONSOLE_FLUSH_INTERVAL_MS, self.drain)
+    
+    @timed("console_flush")
+    def _flush(self, chunk):
+        if not chunk:
+            return
+        self.widget.insert(tk.END, "\n".join(chunk) + "\n")
+        
+        # Keep the widget within the ring buffer's bound
+        line_count = int(self.widget.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self.lines.maxlen
+        if excess > 0:
+            self.widget.delete("1.0", f"{excess + 1}.0")
+        self.widget.see(tk.END)
+
+class ListRouteSource:
+    """Route browser rows for an in-memory routes dict
+    
+    Keeps the route names sorted plus a small prefix index. Filtering scans
+    it and narrows the previous result when the query is extended; "Contains
+    IP" asks the longest-prefix-match index and "Switch Address" its switch
+    address index. Adding or removing a route patches the sorted lists in place.
+    """
+    
+    def __init__(self, routes, get_route_index):
+        self.routes = routes
+        self.get_route_index = get_route_index
+        self.names = sorted(routes)  # All route names, sorted
+        self.view = self.names       # Names matching the filter, sorted
+        self.cidrs = {}              # Route name -> "network/prefix" text
+        for name, details in routes.items():
+            self.cidrs[name] = route_cidr(details)
+        self.filter_state = (None, None)
+    
+    def __len__(self):
+        return len(self.view)
+    
+    def total(self):
+        return len(self.names)
+    
+    def rows(self, start, stop):
+        """Return (name, cidr, gateway) for view positions start..stop"""
+        return [(name, self.cidrs[name], self.routes[name].get("gateway", ""))
+                for name in self.view[start:stop]]
+    
+    def index(self, name):
+        """Return the position of name in the view, or None"""
+        index = bisect.bisect_left(self.view, name)
+        if index < len(self.view) and self.view[index] == name:
+            return index
+        return None
+    
+    def add(self, name):
+        """Add a route, or refresh it if it already exists"""
+        if name not in self.cidrs:
+            bisect.insort(self.names, name)
+        self.cidrs[name] = route_cidr(self.routes[name])
+        
+        if self.view is not self.names:
+            present = self.index(name) is not None
+            if self.matches(name) and not present:
+                bisect.insort(self.view, name)
+            elif present and not self.matches(name):
+                self.view.pop(self.index(name))
+    
+    def extend(self, names, prefixes=None):
+        """Add a batch of new routes, e.g. while a routes file is loading
+        
+        prefixes may give the route_prefix of each name when already known.
+        """
+        added = []
+        for position, name in enumerate(names):
+            if name in self.cidrs:
+                self.add(name)  # Already added some other way, e.g. saved from the form
+                continue
+            added.append(name)
+            if prefixes is None:
+                self.cidrs[name] = route_cidr(self.routes[name])
+            else:
+                prefix = prefixes[position]
+                self.cidrs[name] = f"{int_to_ip(prefix[0])}/{prefix[1]}" if prefix else ""
+        # Appending and re-sorting merges the two sorted runs in linear time
+        self.names.extend(added)
+        self.names.sort()
+        if self.view is not self.names:
+            mode, text = self.filter_state
+            if mode == "Contains IP":
+                self.view = sorted(self.get_route_index().covering(text))
+            else:
+                self.view.extend(name for name in added if self.matches(name))
+                self.view.sort()
+    
+    def remove(self, name):
+        """Remove a route from the list"""
+        if name not in self.cidrs:
+            return
+        del self.cidrs[name]
+        self.names.pop(bisect.bisect_left(self.names, name))
+        if self.view is not self.names and self.index(name) is not None:
+            self.view.pop(self.index(name))
+    
+    def matches(self, name):
+        """Check a route against the current filter"""
+        mode, text = self.filter_state
+        if not text:
+            return True
+        if mode == "Name":
+            return text.lower() in name.lower()
+        if mode == "Prefix":
+            return self.cidrs.get(name, "").startswith(text)
+        if mode == "Switch Address":
+            return self.routes[name].get("gateway", "").startswith(text)
+        return name in self.get_route_index().covering(text)
+    
+    def set_filter(self, mode, text):
+        """Recompute the view for the filter text, narrowing the last result when possible"""
+        previous_mode, previous_text = self.filter_state
+        self.filter_state = (mode, text)
+        
+        if not text:
+            self.view = self.names
+        elif mode == "Contains IP":
+            self.view = sorted(self.get_route_index().covering(text))
+        elif mode == "Switch Address":
+            self.view = sorted(self.get_route_index().gateways.matching(text))
+        else:
+            narrowing = (mode == previous_mode and previous_text and
+                         (text.lower().find(previous_text.lower()) >= 0 if mode == "Name"
+                          else text.startswith(previous_text)))
+            candidates = self.view if narrowing else self.names
+            if mode == "Name":
+                needle = text.lower()
+                self.view = [name for name in candidates if needle in name.lower()]
+            else:
+                cidrs = self.cidrs
+                self.view = [name for name in candidates if cidrs[name].startswith(text)]
+
+class SqliteRouteSource:
+    """Route browser rows for a SqliteRouteStore, paged and filtered with SQL
+    
+    Nothing is cached but the row count for the current filter, which is
+    recounted after an edit.
+    """
+    
+    def __init__(self, store):
+        self.store = store
+        self.where = ""
+        self.params = ()
+        self.count = None
+    
+    def __len__(self):
+        if self.count is None:
+            self.count = self.store.count(self.where, self.params)
+        return self.count
+    
+    def total(self):
+        return len(self.store)
+    
+    def rows(self, start, stop):
+        return self.store.page(self.where, self.params, start, stop - start)
+    
+    def index(self, name):
+        return self.store.rank(name, self.where, self.params)
+    
+    def add(self, name):
+        self.count = None  # The store already holds the change
+    
+    def extend(self, names, prefixes=None):
+        self.count = None
+    
+    def remove(self, name):
+        self.count = None
+    
+    def set_filter(self, mode, text):
+        self.count = None
+        if not text:
+            self.where, self.params = "", ()
+        elif mode == "Contains IP":
+            names = self.store.covering(text)
+            self.where = f"name IN ({', '.join('?' * len(names))})" if names else "0"
+            self.params = tuple(names)
+        else:
+            column = {"Name": "name", "Prefix": "cidr", "Switch Address": "gateway"}[mode]
+            pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = f"%{pattern}%" if mode == "Name" else f"{pattern}%"
+            self.where, self.params = f"{column} LIKE ? ESCAPE '\\'", (pattern,)
+
+class RouteBrowser(ttk.Frame):
+    """Virtualized, filterable list of routes
+    
+    Only the handful of visible Treeview rows exist; scrolling rewrites their
+    values from the current view. The view comes from a source: a
+    ListRouteSource for a routes dict, or a SqliteRouteSource that queries a
+    SqliteRouteStore page by page.
+    """
+    FILTER_MODES = ("Name", "Prefix", "Switch Address", "Contains IP")
+    
+    def __init__(self, parent, get_route_index, on_select, rows=8):
+        super().__init__(parent)
+        self.get_route_index = get_route_index
+        self.on_select = on_select
+        self.rows = rows
+        
+        self.source = ListRouteSource({}, get_route_index)
+        self.top = 0
+        self.row_names = [None] * rows  # Route shown in each Treeview row
+        self.selected = None
+        self._rendering = False
+        
+        # Filter row
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.mode_var = tk.StringVar(value="Name")
+        mode_dropdown = ttk.Combobox(filter_frame, textvariable=self.mode_var, values=self.FILTER_MODES,
+                                     state="readonly", width=15)
+        mode_dropdown.pack(side=tk.LEFT, padx=(5, 5))
+        mode_dropdown.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+        self.filter_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.filter_var.trace_add("write", lambda name, index, mode: self.apply_filter())
+        self.count_label = ttk.Label(filter_frame, text="0 routes")
+        self.count_label.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Fixed set of rows plus a scrollbar driven by the view
+        list_frame = ttk.Frame(self)
+        list_frame.pack(fill=tk.X)
+        self.tree = ttk.Treeview(list_frame, columns=("name", "prefix", "gateway"), show="headings",
+                                 height=rows, selectmode="browse")
+        self.tree.heading("name", text="Route Name")
+        self.tree.heading("prefix", text="Prefix")
+        self.tree.heading("gateway", text="Switch Address")
+        self.tree.column("name", width=180)
+        self.tree.column("prefix", width=130)
+        self.tree.column("gateway", width=110)
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for row in range(rows):
+            self.tree.insert("", tk.END, iid=f"row{row}", values=("", "", ""))
+        
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1))
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda event: self.move_selection(-rows))
+        self.tree.bind("<Next>", lambda event: self.move_selection(rows))
+    
+    def set_routes(self, routes):
+        """Replace the whole list, e.g. after loading a file"""
+        if isinstance(routes, SqliteRouteStore):
+            self.source = SqliteRouteSource(routes)
+        else:
+            self.source = ListRouteSource(routes, self.get_route_index)
+        self.selected = None
+        self.apply_filter()
+    
+    def add(self, name):
+        """Add a route, or refresh it if it already exists"""
+        self.source.add(name)
+        self.render()
+    
+    def extend(self, names, prefixes=None):
+        """Add a batch of new routes"""
+        self.source.extend(names, prefixes)
+        self.render()
+    
+    def remove(self, name):
+        """Remove a route from the list"""
+        self.source.remove(name)
+        if self.selected == name:
+            self.selected = None
+        self.render()
+    
+    def apply_filter(self):
+        """Filter the view by the current mode and text"""
+        self.source.set_filter(self.mode_var.get(), self.filter_var.get().strip())
+        self.top = 0
+        if self.selected is not None:
+            self.see(self.selected)
+        self.render()
+    
+    @timed("browser_render")
+    def render(self):
+        """Write the visible slice of the view into the fixed rows"""
+        total = len(self.source)
+        self.top = max(0, min(self.top, total - self.rows))
+        rows = self.source.rows(self.top, self.top + self.rows)
+        self._rendering = True
+        try:
+            selected_row = ()
+            for row in range(self.rows):
+                if row < len(rows):
+                    values = tuple(rows[row])
+                    name = values[0]
+                    if name == self.selected:
+                        selected_row = f"row{row}"
+                else:
+                    name = None
+                    values = ("", "", "")
+                self.row_names[row] = name
+                self.tree.item(f"row{row}", values=values)
+            self.tree.selection_set(selected_row)
+        finally:
+            self._rendering = False
+        
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total} of {self.source.total()} routes")
+    
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+        return "break"
+    
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.source))
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.render()
+    
+    def see(self, name):
+        """Scroll so that name is visible"""
+        index = self.source.index(name)
+        if index is None:
+            return
+        if index < self.top or index >= self.top + self.rows:
+            self.top = index - self.rows // 2
+    
+    def select(self, name):
+        """Select a route, scroll it into view and notify the application"""
+        self.selected = name
+        self.see(name)
+        self.render()
+        self.on_select(name)
+    
+    def first(self):
+        """Return the first route in the view, or None"""
+        rows = self.source.rows(0, 1)
+        return rows[0][0] if rows else None
+    
+    def move_selection(self, step):
+        if not len(self.source):
+            return "break"
+        index = self.source.index(self.selected) if self.selected is not None else None
+        index = 0 if index is None else max(0, min(len(self.source) - 1, index + step))
+        self.select(self.source.rows(index, index + 1)[0][0])
+        return "break"
+    
+    def on_tree_select(self, event):
+        if self._rendering:
+            return
+        selection = self.tree.selection()
+        if not selection:
+            return
+        name = self.row_names[int(selection[0][len("row"):])]
+        if name is not None and name != self.selected:
+            self.select(name)
 
 class RouteManagerApp:
     def __init__(self, root):
@@ -50,10 +565,13 @@ class RouteManagerApp:
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
         self.file_menu.add_command(label="New Routes File", command=self.new_routes_file)
         self.file_menu.add_command(label="Open...", command=self.load_routes_dialog)
+        self.file_menu.add_command(label="Open Multiple Files...", command=lambda: self.merge_routes_dialog(False))
+        self.file_menu.add_command(label="Open Folder...", command=lambda: self.merge_routes_dialog(True))
         self.file_menu.add_command(label="Save", command=lambda: self.save_routes_to_file(self.routes, self.routes_file))
         self.file_menu.add_command(label="Save As...", command=self.save_routes_dialog)
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Exit", command=self.root.quit)
+        self.file_menu.add_command(label="Exit", command=self.exit_app)
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
         
         # Edit menu
         self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
@@ -61,22 +579,38 @@ class RouteManagerApp:
         self.edit_menu.add_command(label="Add New Route", command=self.clear_form)
         self.edit_menu.add_command(label="Save Current Route", command=self.save_route)
         self.edit_menu.add_command(label="Delete Current Route", command=self.delete_route)
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo_route_change)
+        self.edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo_route_change)
+        self.edit_menu.add_command(label="History...", command=self.show_route_history)
+        self.root.bind("<Control-z>", lambda event: self.undo_route_change())
+        self.root.bind("<Control-y>", lambda event: self.redo_route_change())
         
         # Route menu
         self.route_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Route", menu=self.route_menu)
-        self.route_menu.add_command(label="Add to Windows Routes", command=lambda: self.windows_route_action("add"))
-        self.route_menu.add_command(label="Delete from Windows Routes", command=lambda: self.windows_route_action("delete"))
-        self.route_menu.add_command(label="Show Windows Routing Table", command=self.show_routing_table_options)
+        self.route_menu.add_command(label="Add to System Routes", command=lambda: self.windows_route_action("add"))
+        self.route_menu.add_command(label="Delete from System Routes", command=lambda: self.windows_route_action("delete"))
+        self.route_menu.add_command(label="Apply Selected/All Routes...", command=self.show_bulk_apply_dialog)
+        self.route_menu.add_command(label="Apply to Fleet...", command=self.show_fleet_apply_dialog)
+        self.route_menu.add_command(label="Reconcile with System Routing Table...", command=self.reconcile_with_windows_routes)
+        self.route_menu.add_command(label="Show System Routing Table", command=self.show_routing_table_options)
+        self.route_menu.add_command(label="Monitor System Routing Table...", command=self.show_route_monitor)
         self.route_menu.add_separator()
         self.route_menu.add_command(label="Validate Current Route", command=self.validate_route)
+        self.route_menu.add_command(label="Validate All Routes", command=self.validate_all_routes)
         self.route_menu.add_command(label="Calculate Subnet Information", command=self.recalculate_subnet_info)
+        self.route_menu.add_command(label="Analyse Routes File", command=self.analyse_routes_file)
+        self.route_menu.add_command(label="Aggregate Routes...", command=self.aggregate_routes_dialog)
+        self.route_menu.add_command(label="Re-point Switch Address...", command=self.show_repoint_dialog)
+        self.route_menu.add_command(label="Trace Destinations...", command=self.trace_destinations_dialog)
         
         # Help menu
         self.help_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Help", menu=self.help_menu)
         self.help_menu.add_command(label="About", command=self.show_about)
         self.help_menu.add_command(label="Usage Guide", command=self.show_usage_guide)
+        self.help_menu.add_command(label="Performance...", command=self.show_performance_view)
         
         # Current file path display at the top
         self.file_frame = ttk.Frame(self.root)
@@ -107,12 +641,22 @@ class RouteManagerApp:
         self.selection_frame = ttk.Frame(self.form_frame)
         self.selection_frame.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Label(self.selection_frame, text="Select Route:").pack(side=tk.LEFT)
         self.route_var = tk.StringVar()
-        self.route_dropdown = ttk.Combobox(self.selection_frame, textvariable=self.route_var, 
-                                         state="readonly", width=30)
-        self.route_dropdown.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
-        self.route_dropdown.bind("<<ComboboxSelected>>", self.display_route_details)
+        self.route_browser = RouteBrowser(self.selection_frame,
+                                          get_route_index=lambda: self.route_index,
+                                          on_select=self.on_route_selected)
+        self.route_browser.pack(fill=tk.X, expand=True)
+        
+        # Find the route serving a destination IP
+        self.find_frame = ttk.Frame(self.form_frame)
+        self.find_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(self.find_frame, text="Find Route for IP:").pack(side=tk.LEFT)
+        self.find_ip_var = tk.StringVar()
+        self.find_ip_entry = ttk.Entry(self.find_frame, textvariable=self.find_ip_var, width=20)
+        self.find_ip_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 5))
+        self.find_ip_entry.bind("<Return>", lambda event: self.find_route_for_ip())
+        ttk.Button(self.find_frame, text="Find", command=self.find_route_for_ip).pack(side=tk.LEFT)
         
         # Route details frame
         self.details_frame = ttk.LabelFrame(self.form_frame, text="Route Details", padding=10)
@@ -133,21 +677,21 @@ class RouteManagerApp:
         self.ip_var = tk.StringVar()
         self.ip_entry = ttk.Entry(self.form_grid, textvariable=self.ip_var)
         self.ip_entry.grid(row=1, column=1, sticky="ew", pady=5, padx=(5, 0))
-        self.ip_var.trace_add("write", lambda name, index, mode: self.validate_and_update_subnet_info())
+        self.ip_var.trace_add("write", lambda name, index, mode: self.schedule_validation())
         
         # Subnet mask
         ttk.Label(self.form_grid, text="Subnet Mask:").grid(row=2, column=0, sticky="w", pady=5)
         self.mask_var = tk.StringVar()
         self.mask_entry = ttk.Entry(self.form_grid, textvariable=self.mask_var)
         self.mask_entry.grid(row=2, column=1, sticky="ew", pady=5, padx=(5, 0))
-        self.mask_var.trace_add("write", lambda name, index, mode: self.validate_and_update_subnet_info())
+        self.mask_var.trace_add("write", lambda name, index, mode: self.schedule_validation())
         
         # Switch address (formerly Gateway)
         ttk.Label(self.form_grid, text="Switch Address:").grid(row=3, column=0, sticky="w", pady=5)
         self.gateway_var = tk.StringVar()
         self.gateway_entry = ttk.Entry(self.form_grid, textvariable=self.gateway_var)
         self.gateway_entry.grid(row=3, column=1, sticky="ew", pady=5, padx=(5, 0))
-        self.gateway_var.trace_add("write", lambda name, index, mode: self.validate_gateway())
+        self.gateway_var.trace_add("write", lambda name, index, mode: self.schedule_validation())
         
         # Configure form grid columns to expand
         self.form_grid.columnconfigure(1, weight=1)
@@ -161,6 +705,7 @@ class RouteManagerApp:
                                   font=self.info_font, bg="#f0f0f0", bd=1, relief=tk.SOLID)
         self.network_info.pack(fill=tk.BOTH, expand=True)
         self.network_info.config(state=tk.DISABLED)
+        self.network_info_text = ""
         
         # Console output frame (takes rest of the screen)
         self.console_frame = ttk.LabelFrame(self.main_frame, text="Console Output", padding=10)
@@ -170,6 +715,24 @@ class RouteManagerApp:
         self.console = scrolledtext.ScrolledText(self.console_frame, height=20, 
                                               bg="#282c34", fg="#abb2bf", font=self.console_font)
         self.console.pack(fill=tk.BOTH, expand=True)
+        self.console_log = ConsoleLog(self.root, self.console)
+        
+        # Console level filter and file mirroring
+        self.console_options = ttk.Frame(self.console_frame)
+        self.console_options.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(self.console_options, text="Log Level:").pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value="INFO")
+        self.log_level_dropdown = ttk.Combobox(self.console_options, textvariable=self.log_level_var,
+                                               values=list(LOG_LEVELS), state="readonly", width=10)
+        self.log_level_dropdown.pack(side=tk.LEFT, padx=(5, 10))
+        self.log_level_dropdown.bind("<<ComboboxSelected>>",
+                                     lambda event: self.console_log.set_level(self.log_level_var.get()))
+        
+        self.mirror_log_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.console_options, text="Mirror to Log File", variable=self.mirror_log_var,
+                        command=self.toggle_log_mirror).pack(side=tk.LEFT)
+        ttk.Button(self.console_options, text="Clear", command=self.console_log.clear).pack(side=tk.RIGHT)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -177,28 +740,64 @@ class RouteManagerApp:
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Load initial routes
-        self.routes_file = "routes.json"
-        self.routes = self.load_routes_from_file(self.routes_file)
-        self.update_route_dropdown()
+        # Progress of a background routes file load, shown only while loading
+        self.route_load = None
+        self.load_frame = ttk.Frame(self.root)
+        self.load_progress = ttk.Progressbar(self.load_frame, mode="determinate", maximum=100)
+        self.load_progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+        ttk.Button(self.load_frame, text="Cancel Loading", command=self.cancel_route_load).pack(side=tk.RIGHT)
         
-        # Update file path display
-        self.update_file_path_display()
+        # Routing table backend, and the runner for its commands: an elevated
+        # helper started on the first command, or a worker in this process
+        try:
+            self.route_backend = create_backend()
+        except ValueError as e:
+            self.log(f"{str(e)}; using an in-memory routing table instead", "ERROR")
+            self.route_backend = create_backend("fake")
+        self.route_runner = None
         
-        # Update status bar with file information
-        self.status_var.set(f"Routes loaded from {os.path.abspath(self.routes_file)}")
+        # Rollout to remote hosts' agents, while one is running
+        self.fleet_apply = None
         
-        # Initial log message
-        self.log("Routing Table Manager started")
+        # Destination trace, while one is running
+        self.flow_trace = None
+        
+        # Live routing table monitor, while its window is open
+        self.route_monitor = None
+        self.monitor_window = None
+        self.monitor_routes = None
+        self.saved_route_watch = None
+        
+        # Per-site files merged into one view: the merge running, and each route's source file
+        self.route_merge = None
+        self.route_sources = None
+        
+        # Edits that can be undone, and the history window while it is open
+        self.route_history = RouteHistory()
+        self.history_window = None
+        
+        # Timings view, while its window is open
+        self.performance_window = None
+        self.performance_job = None
         
         # For tracking validation errors
         self.ip_error = False
         self.mask_error = False
         self.gateway_error = False
         self.route_ip_error = False
+        self.validation_job = None
+        
+        # Load initial routes; large files keep loading in the background
+        self.routes = {"routes": {}}
+        self.open_routes_file("routes.json")
+        
+        # Initial log message
+        self.log("Routing Table Manager started")
     
     def new_routes_file(self):
         """Create a new routes file"""
+        self.cancel_route_load()
+        
         # Ask user if they want to save current changes
         if len(self.routes.get("routes", {})) > 0:
             save = messagebox.askyesnocancel("Save Changes", 
@@ -207,13 +806,21 @@ class RouteManagerApp:
                 return
             if save:
                 self.save_routes_to_file(self.routes, self.routes_file)
+        self.compact_journal()
+        self.close_route_store()
         
         # Create new routes structure
+        self.route_merge = None
+        self.route_sources = None
         self.routes = {"routes": {}}
+        self.reset_route_history()
         self.routes_file = "routes.json"  # Reset to default filename
+        self.journal = RouteJournal(self.routes_file)
+        self.journal_in_sync = False  # Written in full on the first save
+        self.rebuild_route_index()
         
         # Update UI
-        self.update_route_dropdown()
+        self.update_route_browser()
         self.clear_form()
         self.update_file_path_display()
         
@@ -259,6 +866,34 @@ class RouteManagerApp:
         else:
             messagebox.showinfo("Validation Results", "All fields are valid.")
     
+    def validate_all_routes(self):
+        """Validate every route in the file on a worker and report problems in the console"""
+        
+        def flag_routes(routes):
+            table = validate_routes_bulk(routes)
+            return {flag: [name for name, error in zip(table["names"], table[flag]) if error]
+                    for flag in VALIDATION_MESSAGES}
+        
+        self.status_var.set("Validating routes...")
+        self.run_on_routes(flag_routes, self.finish_route_validation, "validating routes")
+    
+    def finish_route_validation(self, count, flagged):
+        """Log the first routes with each problem and a summary"""
+        if flagged is None:
+            self.status_var.set("Route validation failed - check console for details")
+            return
+        for flag, message in VALIDATION_MESSAGES.items():
+            level = "WARNING" if flag == "route_ip_error" else "ERROR"
+            for name in flagged[flag][:FINDINGS_REPORT_TOP]:
+                self.log(f"{level}: {name}: {message}", level)
+            if len(flagged[flag]) > FINDINGS_REPORT_TOP:
+                self.log(f"{level}: ... and {len(flagged[flag]) - FINDINGS_REPORT_TOP} more routes: {message}", level)
+        
+        errors = len(flagged["ip_error"]) + len(flagged["mask_error"]) + len(flagged["gateway_error"])
+        summary = f"Validated {count} routes: {errors} errors, {len(flagged['route_ip_error'])} warnings"
+        self.log(summary)
+        self.status_var.set(summary)
+    
     def recalculate_subnet_info(self):
         """Manually recalculate and display subnet information"""
         ip = self.ip_var.get().strip()
@@ -275,13 +910,328 @@ class RouteManagerApp:
         
         self.log("Subnet information recalculated")
     
+    def analyse_routes_file(self):
+        """Report duplicate, conflicting and overlapping routes in the console"""
+        self.status_var.set("Analysing routes...")
+        self.run_on_routes(analyse_routes, self.finish_routes_analysis, "analysing routes")
+    
+    def finish_routes_analysis(self, count, result):
+        """Write the analysis report, listing the first findings of each kind"""
+        if result is None:
+            self.status_var.set("Routes file analysis failed - check console for details")
+            return
+        
+        lines = [f"=== ROUTES FILE ANALYSIS ({count} routes) ===", ""]
+        
+        def findings(title, entries, describe):
+            lines.append(f"{title}: {len(entries)}")
+            lines.extend(f"   {describe(entry)}" for entry in entries[:FINDINGS_REPORT_TOP])
+            if len(entries) > FINDINGS_REPORT_TOP:
+                lines.append(f"   ... and {len(entries) - FINDINGS_REPORT_TOP} more")
+            lines.append("")
+        
+        def nested(entry):
+            cidr, names, outer_cidr, outer_names = entry
+            return f"{cidr} ({', '.join(names)}) inside {outer_cidr} ({', '.join(outer_names)})"
+        
+        findings("Conflicting switch addresses for the same prefix", result["conflicts"],
+                 lambda entry: f"{entry[0]}: " + ", ".join(f"{name} -> {gateway}" for name, gateway in entry[1]))
+        findings("Duplicate prefixes", result["duplicates"], lambda entry: f"{entry[0]}: {', '.join(entry[1])}")
+        findings("Routes shadowing part of a less specific route", result["shadowing"], nested)
+        findings("Redundant routes covered by a route with the same switch address", result["redundant"], nested)
+        findings("Invalid routes", result["invalid"], str)
+        
+        self.console_log.clear()
+        self.console_log.write(lines)
+        
+        issues = sum(len(entries) for entries in result.values())
+        self.log(f"Routes file analysed: {issues} issues found")
+        self.status_var.set(f"Routes file analysed: {issues} issues found")
+    
+    def aggregate_routes_dialog(self):
+        """Aggregate the loaded routes on a worker, then offer to export or apply the result"""
+        self.status_var.set("Aggregating routes...")
+        self.run_on_routes(aggregate_routes, self.show_aggregated_routes, "aggregating routes")
+    
+    def show_aggregated_routes(self, count, result):
+        """Offer to export or apply verified aggregated routes"""
+        if result is None:
+            self.status_var.set("Route aggregation failed - check console for details")
+            return
+        aggregated, report = result
+        self.status_var.set(f"Aggregated {report['before']} routes into {report['after']} routes")
+        self.log(f"Aggregated {report['before']} routes into {report['after']} routes")
+        if not report["verified"]:
+            # Should never happen; refuse to hand out a route set that forwards differently
+            self.log("ERROR: Aggregated routes would change next hops, result discarded", "ERROR")
+            messagebox.showerror("Error", "Route aggregation could not be verified and was discarded.")
+            return
+        self.log("Verified: every destination keeps its next hop")
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Aggregate Routes")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text=f"Routes before aggregation: {report['before']}").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        ttk.Label(dialog, text=f"Routes after aggregation: {report['after']}").pack(anchor=tk.W, padx=10)
+        ttk.Label(dialog, text="Every destination keeps its next hop.").pack(anchor=tk.W, padx=10, pady=(0, 10))
+        
+        def export():
+            file_path = filedialog.asksaveasfilename(
+                title="Export Aggregated Routes",
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+                initialdir=os.path.dirname(os.path.abspath(self.routes_file)),
+                parent=dialog
+            )
+            if file_path:
+                self.save_routes_to_file({"routes": aggregated}, file_path)
+                dialog.destroy()
+        
+        def apply():
+            dialog.destroy()
+            self.bulk_route_action("add", list(aggregated.keys()), aggregated)
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text="Export as Routes File...", command=export).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Add to System Routes", command=apply).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=(5, 0))
+    
+    def show_repoint_dialog(self):
+        """List the switch addresses with their route counts and move the routes of one to a new address"""
+        if self.route_load is not None:
+            messagebox.showinfo("Still Loading", "Routes are still loading. Try again once loading has finished.")
+            return
+        counts = self.route_index.gateways.counts()
+        if not counts:
+            messagebox.showinfo("Re-point Switch Address", "There are no routes.")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Re-point Switch Address")
+        dialog.transient(self.root)
+        dialog.geometry("460x480")
+        
+        ttk.Label(dialog, text=f"{len(counts)} switch addresses:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        tree = ttk.Treeview(list_frame, columns=("routes",), selectmode=tk.BROWSE)
+        tree.heading("#0", text="Switch Address")
+        tree.column("#0", width=220)
+        tree.heading("routes", text="Routes")
+        tree.column("routes", width=100, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.config(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for position, (gateway, count) in enumerate(counts):
+            tree.insert("", tk.END, iid=str(position), text=gateway or "(none)", values=(count,))
+        
+        # Start on the current route's switch address
+        current = self.routes["routes"].get(self.route_var.get()) if self.route_var.get() else None
+        for position, (gateway, count) in enumerate(counts):
+            if current is not None and gateway == current.get("gateway"):
+                tree.selection_set(str(position))
+                tree.see(str(position))
+                break
+        
+        new_frame = ttk.Frame(dialog)
+        new_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(new_frame, text="New switch address:").pack(side=tk.LEFT)
+        new_gateway_var = tk.StringVar()
+        ttk.Entry(new_frame, textvariable=new_gateway_var, width=20).pack(side=tk.LEFT, padx=(5, 0))
+        apply_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dialog, text="Also update the system routing table", variable=apply_var
+                        ).pack(anchor=tk.W, padx=10, pady=5)
+        
+        def selected_gateway():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showerror("Error", "No switch address selected", parent=dialog)
+                return None
+            return counts[int(selection[0])][0]
+        
+        def repoint():
+            gateway = selected_gateway()
+            if gateway is None:
+                return
+            new_gateway = new_gateway_var.get().strip()
+            if not self.is_valid_ip(new_gateway):
+                messagebox.showerror("Error", "Please enter a valid new switch address.", parent=dialog)
+                return
+            if new_gateway == gateway:
+                messagebox.showerror("Error", "The new switch address is the current one.", parent=dialog)
+                return
+            dialog.destroy()
+            self.repoint_gateway(gateway, new_gateway, apply_var.get())
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        ttk.Button(button_frame, text="Re-point", command=repoint).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT)
+    
+    def repoint_gateway(self, gateway, new_gateway, apply_to_system=False):
+        """Move every route through gateway to new_gateway in one edit, and optionally in the system table"""
+        route_names = self.route_index.gateways.routes_for(gateway)
+        if not route_names:
+            return
+        changes, operations = plan_repoint(self.routes["routes"], route_names, new_gateway)
+        description = f"Re-pointed {len(changes)} routes from {gateway} to {new_gateway}"
+        self.record_route_change(description, changes)
+        self.apply_route_changes([(route_name, after) for route_name, before, after in changes])
+        self.log(description)
+        self.status_var.set(description)
+        
+        if apply_to_system and operations:
+            self.log(f"Re-pointing {len(operations) // 2} routes in the system routing table "
+                     f"({self.route_backend.name}): delete and add each")
+            self.run_bulk_operations(None, [(operation["name"], operation) for operation in operations])
+    
+    def trace_destinations_dialog(self):
+        """Pick a destination list and trace where its traffic would go through the loaded routes"""
+        if self.route_load is not None:
+            messagebox.showinfo("Still Loading", "Routes are still loading. Try again once loading has finished.")
+            return
+        if self.flow_trace is not None:
+            messagebox.showinfo("Trace Destinations", "A trace is still running.")
+            return
+        file_path = filedialog.askopenfilename(
+            title="Trace Destinations",
+            filetypes=[("CSV and flow logs", "*.csv *.log *.txt"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        with_system = messagebox.askyesnocancel(
+            "Trace Destinations",
+            "Layer the system routing table under the routes, and compare next hops with it?"
+        )
+        if with_system is not None:
+            self.start_flow_trace(file_path, with_system)
+    
+    def start_flow_trace(self, file_path, with_system=False):
+        """Trace a destination file, reading the system routing table first on a worker if asked"""
+        self.flow_trace = object()
+        self.log(f"Tracing the destinations in {file_path}" +
+                 (f" over the system routing table ({self.route_backend.name})" if with_system else ""))
+        self.status_var.set("Tracing destinations...")
+        if not with_system:
+            self.run_flow_trace(file_path, None)
+            return
+        
+        def read_table():
+            try:
+                records = self.route_backend.list_routes()
+            except Exception as e:
+                self.log(f"Error retrieving routing table: {str(e)}", "ERROR")
+                self.console_log.call(self.finish_flow_trace, file_path, None)
+                return
+            self.console_log.call(self.run_flow_trace, file_path, {"active": records, "persistent": []})
+        
+        threading.Thread(target=read_table, daemon=True).start()
+    
+    def run_flow_trace(self, file_path, system_routes):
+        """Build the lookup tables and resolve the destination file on a worker"""
+        
+        def trace_routes(routes):
+            started = time.perf_counter()
+            trace = FlowTrace(routes, system_routes)
+            with open(file_path, "r", errors="replace") as file:
+                report = trace.run(read_destinations(file))
+            report["seconds"] = time.perf_counter() - started  # Including the build, as simulate_flows does
+            return report
+        
+        def finish(count, report):
+            # Called even when the trace failed, so the running trace is cleared and later ones are not refused
+            self.finish_flow_trace(file_path, report, system_routes is not None)
+        
+        self.run_on_routes(trace_routes, finish, f"tracing {file_path}")
+    
+    def run_on_routes(self, work, finish, description):
+        """Run work(routes) on a worker over the routes as they are now, then finish(route count, result)
+        
+        Only a copy is taken on the Tk thread; a SQLite store is reopened on the
+        worker, since its connection belongs to this thread. If work fails the
+        error is logged and finish gets None.
+        """
+        routes = self.routes.get("routes", {})
+        count = len(routes)
+        if isinstance(routes, SqliteRouteStore):
+            snapshot = routes.file_path
+        else:
+            snapshot = routes.copy() if isinstance(routes, CompactRouteTable) else dict(routes)
+        
+        def run():
+            result = None
+            try:
+                if isinstance(snapshot, str):
+                    store = SqliteRouteStore(snapshot)
+                    try:
+                        result = work(store)
+                    finally:
+                        store.close()
+                else:
+                    result = work(snapshot)
+            except Exception as e:
+                self.log(f"Error {description}: {str(e)}", "ERROR")
+            finally:
+                self.console_log.call(finish, count, result)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def finish_flow_trace(self, file_path, report, compared=False):
+        """Write a trace report to the console: route hits, unmatched destinations and next hop changes"""
+        self.flow_trace = None
+        if report is None:
+            self.status_var.set("Destination trace failed - check console for details")
+            return
+        metrics.record("flow_trace", report["seconds"])
+        routes = self.routes["routes"]
+        lines = [f"=== DESTINATION TRACE ({os.path.basename(file_path)}) ===", "",
+                 f"Destinations: {report['destinations']} read, {report['matched']} matched, "
+                 f"{report['unmatched']} unmatched, {report['invalid']} invalid", ""]
+        
+        hits = sorted(report["route_hits"].items(), key=lambda item: -item[1])
+        lines.append(f"Busiest routes (of {len(hits)}):")
+        for route_name, count in hits[:TRACE_REPORT_TOP]:
+            if count:
+                details = routes.get(route_name) or {}
+                lines.append(f"   {count:10}  {route_name} ({route_cidr(details)} -> {details.get('gateway', '')})")
+        idle = [route_name for route_name, count in hits if not count]
+        lines.append("")
+        lines.append(f"Routes that carried nothing: {len(idle)}")
+        lines.extend(f"   {route_name}" for route_name in idle[:TRACE_REPORT_TOP])
+        if len(idle) > TRACE_REPORT_TOP:
+            lines.append(f"   ... and {len(idle) - TRACE_REPORT_TOP} more")
+        if report["system_hits"]:
+            lines.append("")
+            lines.append("System routes carrying traffic:")
+            for cidr, count in sorted(report["system_hits"].items(), key=lambda item: -item[1])[:TRACE_REPORT_TOP]:
+                lines.append(f"   {count:10}  {cidr}")
+        if report["unmatched_sample"]:
+            lines.append("")
+            lines.append(f"Unmatched destinations, e.g.: {', '.join(report['unmatched_sample'])}")
+        if compared:
+            lines.append("")
+            lines.append(f"Next hop changes against the system routing table: {report['changed']} destinations")
+            for change in report["changes"][:TRACE_REPORT_TOP]:
+                lines.append(f"   {change['count']:10}  {change['old'] or '(no route)'} -> "
+                             f"{change['new'] or '(no route)'}  e.g. {', '.join(change['sample'][:3])}")
+        
+        self.console_log.clear()
+        self.console_log.write(lines + [""])
+        summary = (f"Traced {report['destinations']} destinations in {report['seconds']:.1f} s: "
+                   f"{report['unmatched']} unmatched" + (f", {report['changed']} change next hop" if compared else ""))
+        self.log(summary)
+        self.status_var.set(summary)
+    
     def show_about(self):
         """Show the about dialog"""
         messagebox.showinfo("About Routing Table Manager", 
                          "Routing Table Manager\n\n"
                          "A tool for managing network routes.\n\n"
                          "This application allows you to create, save, and manage \n"
-                         "network routes, and add them to the Windows routing table.")
+                         "network routes, and add them to the system routing table.")
     
     def show_usage_guide(self):
         """Show usage guide in the console"""
@@ -289,35 +1239,90 @@ class RouteManagerApp:
 === ROUTING TABLE MANAGER USAGE GUIDE ===
 
 1. ROUTES
-   - Select routes from the dropdown at the top left
+   - Select routes from the list at the top left
+   - Filter the list by name, prefix, switch address or an IP the route contains
+   - Find Route for IP: Select the most specific saved route covering an IP
    - View and edit route details in the form fields
    - Network information is displayed in the right panel
 
 2. FILE MENU
    - New Routes File: Create a new empty routes file
-   - Open: Load routes from a JSON file
+   - Open: Load routes from a JSON file or a SQLite route store (.db)
    - Save: Save routes to the current file
-   - Save As: Save routes to a new file
+   - Save As: Save routes to a new file; choose .db to import them into a
+     SQLite route store, or .json to export a store
+   - Route stores are read page by page, so even very large ones open at once
+   - Large JSON files load in the background: routes can be browsed as they
+     arrive, and Cancel Loading next to the progress bar stops the load
+   - Open Multiple Files / Open Folder: Load many per-site routes files at
+     once, in parallel, into one merged view. Choose what happens when a route
+     name is in several files (rename it name@site, or keep the first or last
+     file's) and when a prefix has different switch addresses (keep all, or
+     the first or last file's). Each route's source file shows in the status
+     bar; per-file load times, validation counts and conflicts are listed in
+     a report. Save writes the view to merged_routes.json next to the files
 
 3. EDIT MENU
    - Add New Route: Clear the form to add a new route
    - Save Current Route: Save the current form data as a route
    - Delete Current Route: Remove the selected route
+   - Undo / Redo (Ctrl+Z / Ctrl+Y): Step back or forward through route saves
+     and deletes; the routes file is updated as for any edit
+   - History: List the edits made since the file was opened, with their
+     times, and go back (or forward) to the state after any of them
 
 4. ROUTE MENU
-   - Add to Windows Routes: Add the current route to the Windows routing table
-   - Delete from Windows Routes: Remove the route from the Windows routing table
-   - Show Windows Routing Table: Display the current system routing table
+   - Add to System Routes: Add the current route to the system routing table
+   - Delete from System Routes: Remove the route from the system routing table
+   - Apply Selected/All Routes: Add or delete many routes with a single elevation
+   - Apply to Fleet: Add or delete routes on many hosts at once, each running
+     "python Routefleet.py agent" with the same ROUTES_FLEET_TOKEN. Hosts are
+     handled in parallel, up to the concurrency limit; a host that stops
+     answering for the timeout is retried. Per-host progress streams into
+     the console, with a summary per host at the end
+   - Route commands go to the system's routing backend: route.exe on Windows,
+     netlink on Linux, or set ROUTES_BACKEND=fake for an in-memory table.
+     When it needs elevation, one helper is started (with one UAC or pkexec
+     prompt) on the first command and kept until exit; results stream into
+     the console
+   - Reconcile with System Routing Table: Apply only the adds, changes and
+     deletes needed to make the system table match the routes file
+   - Show System Routing Table: Display the current system routing table
+   - Monitor System Routing Table: Watch the table and list only what changes,
+     with the saved routes that are missing from it (those that disappeared
+     while watching are highlighted)
    - Validate Current Route: Check if the route details are valid
+   - Validate All Routes: Check every route in the file at once
    - Calculate Subnet Information: Update the network information display
+   - Analyse Routes File: Report duplicate, conflicting and overlapping routes
+   - Aggregate Routes: Merge adjacent routes into supernets, then export or apply them
+   - Re-point Switch Address: List the switch addresses with their route
+     counts, and move every route of one of them to a new address in a
+     single edit (one undo step). Optionally the system table is updated
+     too, by deleting each route and adding it back through the new address
+   - Trace Destinations: Resolve every destination in a CSV or flow-log
+     export (a dst/dstaddr/destination column, or one address per line)
+     against the routes. The console lists the busiest routes, the routes
+     that carried nothing and destinations without a route. Optionally the
+     system routing table is layered underneath, and the destinations whose
+     next hop would change are counted per old and new switch address
 
 5. CONSOLE
    - View log messages and command outputs
-   - See the full Windows routing table when requested
+   - See the full system routing table when requested
+   - Log Level: Hide messages below the chosen level
+   - Mirror to Log File: Also write messages to a rotating log file
+
+6. HELP MENU
+   - Performance: Time file loads and saves, form updates, console and list
+     redraws, routing table reads and route commands, with latency
+     percentiles. Instrumentation is off until enabled there (or with
+     ROUTES_METRICS=1). Capture a cProfile profile of the window's thread,
+     and export the numbers as JSON or a Prometheus text file (.prom)
         """
         
-        self.console.delete(1.0, tk.END)
-        self.console.insert(tk.END, usage_text)
+        self.console_log.clear()
+        self.console_log.write(usage_text.splitlines())
         self.log("Usage guide displayed in console")
     
     def update_file_path_display(self):
@@ -333,97 +1338,549 @@ class RouteManagerApp:
         y = (screen_height - height) // 2
         self.root.geometry(f"{width}x{height}+{x}+{y}")
     
-    def log(self, message):
-        """Log a message to the console widget with timestamp"""
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.console.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.console.see(tk.END)
+    def log(self, message, level="INFO"):
+        """Log a message to the console widget with timestamp; safe from any thread"""
+        self.console_log.log(message, level)
+    
+    def toggle_log_mirror(self):
+        """Start or stop mirroring console messages to a rotating log file"""
+        if not self.mirror_log_var.get():
+            self.console_log.mirror_to_file(None)
+            self.log("Stopped mirroring console to log file")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Mirror Console to Log File",
+            defaultextension=".log",
+            filetypes=[("Log files", "*.log"), ("All files", "*.*")],
+            initialdir=os.path.dirname(os.path.abspath(self.routes_file))
+        )
+        if not file_path:
+            self.mirror_log_var.set(False)
+            return
+        try:
+            self.console_log.mirror_to_file(file_path)
+            self.log(f"Mirroring console to {file_path}")
+        except Exception as e:
+            self.mirror_log_var.set(False)
+            self.log(f"Error opening log file {file_path}: {str(e)}", "ERROR")
     
+    @timed("routes_load")
     def load_routes_from_file(self, file_path):
-        """Load routes from JSON file"""
+        """Load routes from JSON file and replay its change journal, or open a SQLite route store"""
+        self.close_route_store()
+        if is_sqlite_path(file_path):
+            # Rows are read on demand and every edit is committed as it is made
+            self.journal = None
+            self.journal_in_sync = False
+            try:
+                store = SqliteRouteStore(file_path)
+                self.log(f"Opened route store {file_path}")
+                return {"routes": store}
+            except sqlite3.Error as e:
+                self.log(f"Error opening route store {file_path}: {str(e)}", "ERROR")
+                messagebox.showerror("Error", f"Failed to open route store {file_path}:\n{str(e)}")
+                return {"routes": {}}
+        
+        self.journal = RouteJournal(file_path)
+        self.journal_in_sync = False
         try:
             with open(file_path, "r") as file:
                 routes = json.load(file)
-                self.log(f"Routes loaded from {file_path}")
-                return routes
+            replayed = self.journal.replay(routes)
+            self.journal_in_sync = True
+            self.log(f"Routes loaded from {file_path}")
+            if replayed:
+                self.log(f"Replayed {replayed} journaled changes")
+            return routes
         except FileNotFoundError:
             # If file doesn't exist, create a new routes structure
             self.log(f"File {file_path} not found. Creating new routes file.")
             routes = {"routes": {}}
-            with open(file_path, "w") as file:
-                json.dump(routes, file, indent=4)
-            return routes
-        except json.JSONDecodeError:
-            self.log(f"Error reading {file_path}. Creating new routes file.")
-            routes = {"routes": {}}
-            with open(file_path, "w") as file:
-                json.dump(routes, file, indent=4)
+            self.journal.replay(routes)
+            self.journal.compact(routes)
+            self.journal_in_sync = True
             return routes
+        except json.JSONDecodeError as e:
+            # Leave the file alone so it can be recovered by hand
+            self.journal = None
+            self.log(f"Error reading {file_path}: {str(e)}. File left unchanged.", "ERROR")
+            messagebox.showerror("Error", f"Failed to read routes from {file_path}:\n{str(e)}")
+            return {"routes": {}}
         except Exception as e:
-            self.log(f"Unexpected error loading file: {str(e)}")
+            self.log(f"Unexpected error loading file: {str(e)}", "ERROR")
             messagebox.showerror("Error", f"Failed to load routes: {str(e)}")
             return {"routes": {}}
     
+    def close_route_store(self):
+        """Close the SQLite route store in use, if any"""
+        routes = getattr(self, "routes", {}).get("routes")
+        if isinstance(routes, SqliteRouteStore):
+            routes.close()
+    
+    def open_routes_file(self, file_path):
+        """Switch to a routes file; existing JSON files are read by a worker while the UI stays usable"""
+        self.cancel_route_load()
+        self.route_merge = None
+        self.route_sources = None
+        self.routes_file = file_path
+        self.reset_route_history()
+        if is_sqlite_path(file_path) or not os.path.exists(file_path):
+            self.routes = self.load_routes_from_file(file_path)
+            self.rebuild_route_index()
+            self.update_route_browser()
+            self.update_file_path_display()
+            self.status_var.set(f"Routes loaded from {os.path.abspath(file_path)}")
+            return
+        
+        self.close_route_store()
+        self.routes = {"routes": CompactRouteTable()}  # Packed, so million-route files fit in memory
+        self.journal = RouteJournal(file_path)
+        self.journal_in_sync = True  # Edits made while loading are journaled and replayed at the end
+        self.rebuild_route_index()
+        self.update_route_browser()
+        self.update_file_path_display()
+        
+        self.route_load = RouteFileLoad(file_path)
+        self.route_load.start()
+        self.load_progress["value"] = 0
+        self.load_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, after=self.status_bar)
+        self.status_var.set(f"Loading routes from {os.path.abspath(file_path)}...")
+        self.root.after(ROUTE_LOAD_POLL_MS, self.poll_route_load, self.route_load)
+    
+    def poll_route_load(self, load):
+        """Take the next batch of a background load into the routes, index and browser"""
+        if load is not self.route_load:
+            return  # Cancelled or replaced by another load
+        try:
+            kind, payload = load.queue.get_nowait()
+        except queue.Empty:
+            self.root.after(ROUTE_LOAD_POLL_MS, self.poll_route_load, load)
+            return
+        
+        if kind == "error":
+            self.route_load = None
+            self.load_frame.pack_forget()
+            gc.unfreeze()
+            self.discard_partial_routes()
+            self.log(f"Error reading {load.file_path}: {str(payload)}. File left unchanged.", "ERROR")
+            self.status_var.set(f"Failed to load routes from {os.path.abspath(load.file_path)}")
+            messagebox.showerror("Error", f"Failed to read routes from {load.file_path}:\n{str(payload)}")
+            return
+        
+        self.add_loaded_routes(load, payload, show=kind == "done")
+        if kind == "done":
+            self.finish_route_load(load)
+            return
+        self.load_progress["value"] = load.progress() * 100
+        self.status_var.set(f"Loading routes from {os.path.abspath(load.file_path)}... "
+                            f"{len(self.routes['routes'])} routes")
+        # Come back almost at once, but only after Tk has handled pending events
+        self.root.after(1, self.poll_route_load, load)
+    
+    def add_loaded_routes(self, load, batch, show=False):
+        """Add a batch of routes read from the routes file"""
+        routes = self.routes["routes"]
+        first_batch = not routes
+        refreshed = []
+        for route_name, details, prefix in batch:
+            if route_name in routes and route_name not in load.pending:
+                refreshed.append(route_name)  # Repeated in the file or edited while loading
+            else:
+                load.pending[route_name] = prefix
+            routes[route_name] = details
+            self.route_index.add(route_name, details, prefix)
+        
+        # Merging into the browser's sorted list costs O(n), so it is done a few times a second
+        if show or first_batch or time.perf_counter() - load.shown_at >= ROUTE_LOAD_SHOW_INTERVAL:
+            self.route_browser.extend(list(load.pending), list(load.pending.values()))
+            load.pending = {}
+            load.shown_at = time.perf_counter()
+            # Loaded routes live on; keep full collections from rescanning them during the load
+            gc.freeze()
+        for route_name in refreshed:
+            self.route_browser.add(route_name)
+        if first_batch and self.route_browser.selected is None:
+            first = self.route_browser.first()
+            if first is not None:
+                self.route_browser.select(first)
+    
+    def finish_route_load(self, load):
+        """Replay the journal over a completed load and hide the progress bar"""
+        self.route_load = None
+        self.load_frame.pack_forget()
+        gc.unfreeze()
+        
+        routes = self.routes["routes"]
+        for route_name, route in self.journal.read():
+            if route is not None:
+                routes[route_name] = route
+                self.route_index.add(route_name, route)
+                self.route_browser.add(route_name)
+            elif route_name in routes:
+                del routes[route_name]
+                self.route_index.remove(route_name)
+                self.route_browser.remove(route_name)
+        self.reset_route_history()  # Edits made while loading were taken against a partial table
+        
+        elapsed = time.perf_counter() - load.started
+        metrics.record("routes_load_background", elapsed)
+        metrics.count("routes_loaded", len(routes))
+        self.log(f"Routes loaded from {load.file_path}: {len(routes)} routes in {elapsed:.1f} s")
+        if self.journal.entries:
+            self.log(f"Replayed {self.journal.entries} journaled changes")
+        self.status_var.set(f"Routes loaded from {os.path.abspath(load.file_path)}")
+        self.refresh_route_monitor()
+    
+    def cancel_route_load(self):
+        """Stop a background load, dropping the routes read so far"""
+        load = self.route_load
+        if load is None:
+            return
+        load.cancel()
+        self.route_load = None
+        self.load_frame.pack_forget()
+        gc.unfreeze()
+        self.discard_partial_routes()
+        self.log(f"Loading {load.file_path} cancelled after {load.routes_read} routes", "WARNING")
+        self.status_var.set("Loading cancelled")
+    
+    def discard_partial_routes(self):
+        """Drop partly loaded routes; the routes file is not written until the user saves explicitly"""
+        self.routes = {"routes": {}}
+        self.journal = None
+        self.journal_in_sync = False
+        self.reset_route_history()
+        self.rebuild_route_index()
+        self.update_route_browser()
+    
+    def persist_change(self, route_name):
+        """Persist one route edit by appending it to the journal, compacting when due"""
+        self.persist_changes([route_name])
+    
+    @timed("route_persist")
+    def persist_changes(self, route_names):
+        """Persist edits of several routes with one journal append, compacting when due"""
+        if self.saved_route_watch is not None and self.monitor_routes is self.routes["routes"]:
+            for route_name in route_names:
+                self.saved_route_watch.set_route(route_name, self.routes["routes"].get(route_name))
+            self.show_missing_routes()
+        if isinstance(self.routes["routes"], SqliteRouteStore):
+            return  # Already committed by the store
+        if self.journal is None and self.route_sources is not None:
+            self.log("Change kept in the merged view only. Save it to write the merged routes file.", "WARNING")
+            return
+        if self.journal is None:
+            # The routes file was not read in full; never write over it implicitly
+            self.log(f"Change not saved: {self.routes_file} was not loaded. Use Save As to keep your routes.",
+                     "WARNING")
+            return
+        if not self.journal_in_sync:
+            self.save_routes_to_file(self.routes, self.routes_file)
+            return
+        try:
+            # While a load is running the file must not be rewritten; the journal is replayed after it
+            changes = [(route_name, self.routes["routes"].get(route_name)) for route_name in route_names]
+            if self.journal.record_batch(changes) and self.route_load is None:
+                self.save_routes_to_file(self.routes, self.routes_file)
+        except Exception as e:
+            self.log(f"Error saving routes to {self.routes_file}: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"Failed to save routes: {str(e)}")
+    
+    def compact_journal(self):
+        """Fold journaled changes into the routes file, e.g. before switching files"""
+        if self.journal is not None and self.journal_in_sync and self.journal.entries:
+            self.save_routes_to_file(self.routes, self.routes_file)
+    
+    def exit_app(self):
+        """Write out any journaled changes and exit"""
+        self.cancel_route_load()
+        self.close_route_monitor()
+        self.close_performance_view()
+        self.close_route_history()
+        self.compact_journal()
+        self.close_route_store()
+        if self.route_runner is not None:
+            self.route_runner.close()
+        self.root.quit()
+    
+    @timed("routes_save")
     def save_routes_to_file(self, routes, file_path):
-        """Save routes to JSON file"""
+        """Save routes to a JSON file, or a SQLite route store for .db paths"""
+        if self.route_load is not None and routes is self.routes:
+            messagebox.showinfo("Still Loading", "Routes are still loading. Save once loading has finished.")
+            return
+        same_file = os.path.abspath(file_path) == os.path.abspath(self.routes_file)
+        if same_file and self.journal is None and not isinstance(self.routes["routes"], SqliteRouteStore) and \
+                os.path.exists(file_path):
+            if not messagebox.askyesno("Overwrite File",
+                                       f"{file_path} could not be loaded. Overwrite it with the current routes?"):
+                return
         try:
-            with open(file_path, "w") as file:
-                json.dump(routes, file, indent=4)
+            if is_sqlite_path(file_path):
+                # The open store already holds every edit; anything else is imported in one go
+                if not same_file:
+                    SqliteRouteStore.create(file_path, routes["routes"])
+                elif routes["routes"] is not self.routes["routes"] or \
+                        not isinstance(routes["routes"], SqliteRouteStore):
+                    self.close_route_store()
+                    SqliteRouteStore.create(file_path, routes["routes"])
+                    self.routes = {"routes": SqliteRouteStore(file_path)}
+                    self.rebuild_route_index()
+                    self.update_route_browser()
+            # A full save replaces the file atomically and empties its journal
+            elif same_file:
+                if self.journal is None:
+                    self.journal = RouteJournal(file_path)
+                self.journal.compact(routes)
+                self.journal_in_sync = routes is self.routes
+            else:
+                RouteJournal(file_path).compact(routes)
             self.log(f"Routes saved to {file_path}")
             self.update_file_path_display()
             self.status_var.set(f"Routes saved to {os.path.abspath(file_path)}")
         except Exception as e:
-            self.log(f"Error saving routes to {file_path}: {str(e)}")
+            self.log(f"Error saving routes to {file_path}: {str(e)}", "ERROR")
             messagebox.showerror("Error", f"Failed to save routes: {str(e)}")
             
     def load_routes_dialog(self):
         """Open file dialog to load routes from user-selected file"""
         file_path = filedialog.askopenfilename(
             title="Load Routes",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("SQLite route stores", "*.db *.sqlite *.sqlite3"),
+                       ("All files", "*.*")],
             initialdir=os.path.dirname(os.path.abspath(self.routes_file))
         )
         
         if file_path:
             try:
-                self.routes = self.load_routes_from_file(file_path)
-                self.routes_file = file_path
-                self.update_route_dropdown()
-                self.update_file_path_display()
-                self.status_var.set(f"Routes loaded from {os.path.abspath(file_path)}")
+                self.cancel_route_load()
+                self.compact_journal()
+                self.open_routes_file(file_path)
             except Exception as e:
-                self.log(f"Error loading routes from {file_path}: {str(e)}")
+                self.log(f"Error loading routes from {file_path}: {str(e)}", "ERROR")
                 messagebox.showerror("Error", f"Failed to load routes: {str(e)}")
     
+    def merge_routes_dialog(self, folder):
+        """Pick per-site routes files, or a folder of them, and the conflict policies to merge them with"""
+        initial_dir = os.path.dirname(os.path.abspath(self.routes_file))
+        if folder:
+            directory = filedialog.askdirectory(title="Open Folder of Routes Files", initialdir=initial_dir)
+            if not directory:
+                return
+            file_paths = site_route_files(directory)
+        else:
+            file_paths = list(filedialog.askopenfilenames(
+                title="Open Routes Files",
+                filetypes=[("Routes files", "*.json *.db *.sqlite *.sqlite3"), ("All files", "*.*")],
+                initialdir=initial_dir
+            ))
+        if not file_paths:
+            if folder:
+                messagebox.showinfo("Open Folder", "The folder has no routes files.")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Merge Routes Files")
+        dialog.transient(self.root)
+        ttk.Label(dialog, text=f"{len(file_paths)} routes files from {os.path.dirname(os.path.abspath(file_paths[0]))}"
+                  ).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        
+        options = ttk.Frame(dialog)
+        options.pack(fill=tk.X, padx=10)
+        ttk.Label(options, text="Same route name in several files:").grid(row=0, column=0, sticky="w", pady=2)
+        name_policy_var = tk.StringVar(value=NAME_CONFLICT_POLICIES[0])
+        ttk.Combobox(options, textvariable=name_policy_var, values=NAME_CONFLICT_POLICIES, state="readonly",
+                     width=10).grid(row=0, column=1, sticky="w", padx=(5, 0))
+        ttk.Label(options, text="Same prefix, different switch address:").grid(row=1, column=0, sticky="w", pady=2)
+        prefix_policy_var = tk.StringVar(value=PREFIX_CONFLICT_POLICIES[0])
+        ttk.Combobox(options, textvariable=prefix_policy_var, values=PREFIX_CONFLICT_POLICIES, state="readonly",
+                     width=10).grid(row=1, column=1, sticky="w", padx=(5, 0))
+        processes_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options, text="Load in separate processes (faster for large files)",
+                        variable=processes_var).grid(row=2, column=0, columnspan=2, sticky="w", pady=(5, 0))
+        
+        def merge():
+            dialog.destroy()
+            self.start_route_merge(file_paths, name_policy_var.get(), prefix_policy_var.get(), processes_var.get())
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Merge", command=merge).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT)
+    
+    def start_route_merge(self, file_paths, name_policy, prefix_policy, use_processes=True):
+        """Load and merge routes files on a worker; the current routes stay until the merge is done"""
+        self.cancel_route_load()
+        merge_id = object()
+        self.route_merge = merge_id
+        self.log(f"Merging {len(file_paths)} routes files (names: {name_policy}, prefixes: {prefix_policy})")
+        self.status_var.set(f"Loading {len(file_paths)} routes files...")
+        loaded = []
+        
+        def on_report(report):
+            loaded.append(report)
+            self.console_log.call(self.report_site_file, merge_id, report, len(loaded), len(file_paths))
+        
+        def run():
+            try:
+                reports = load_site_files(file_paths, on_report, use_processes=use_processes)
+                merge = merge_site_routes(reports, name_policy, prefix_policy)
+            except Exception as e:
+                self.log(f"Error merging routes files: {str(e)}", "ERROR")
+                return
+            self.console_log.call(self.finish_route_merge, merge_id, file_paths, reports, merge)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def report_site_file(self, merge_id, report, done, total):
+        """Log one file of a merge as it finishes"""
+        if merge_id is not self.route_merge:
+            return
+        name = os.path.basename(report["file_path"])
+        if report["error"]:
+            self.log(f"{name}: failed after {report['seconds'] * 1000:.0f} ms: {report['error']}", "ERROR")
+        else:
+            self.log(f"{name}: {report['count']} routes, {report['errors']} errors, {report['warnings']} warnings "
+                     f"in {report['seconds'] * 1000:.0f} ms")
+        self.status_var.set(f"Loaded {done} of {total} routes files...")
+    
+    def finish_route_merge(self, merge_id, file_paths, reports, merge):
+        """Show the merged routes in place of the current file"""
+        if merge_id is not self.route_merge:
+            return  # Another file was opened meanwhile
+        self.route_merge = None
+        self.cancel_route_load()
+        self.compact_journal()
+        self.close_route_store()
+        
+        # The view is not any one file; it is written to MERGED_ROUTES_FILE only when saved
+        self.routes = {"routes": merge["routes"]}
+        self.route_sources = merge["sources"]
+        self.reset_route_history()
+        self.routes_file = os.path.join(os.path.dirname(os.path.abspath(file_paths[0])), MERGED_ROUTES_FILE)
+        self.journal = None
+        self.journal_in_sync = False
+        self.rebuild_route_index()
+        self.update_route_browser()
+        self.update_file_path_display()
+        
+        failed = sum(1 for report in reports if report["error"])
+        summary = (f"Merged {len(merge['routes'])} routes from {len(reports) - failed} of {len(reports)} files, "
+                   f"{len(merge['conflicts'])} conflicts")
+        self.log(summary, "WARNING" if failed else "INFO")
+        self.status_var.set(summary)
+        self.refresh_route_monitor()
+        self.show_merge_report(reports, merge["conflicts"])
+    
+    def show_merge_report(self, reports, conflicts):
+        """List each merged file's load time and validation counts, slowest first, and the conflicts"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Merged Routes Files")
+        dialog.geometry("820x520")
+        
+        files_frame = ttk.LabelFrame(dialog, text="Files (slowest first)", padding=5)
+        files_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        columns = ("time", "routes", "errors", "warnings", "status")
+        tree = ttk.Treeview(files_frame, columns=columns, height=8)
+        tree.heading("#0", text="File")
+        tree.column("#0", width=220)
+        for column, heading, width in zip(columns, ("Time (ms)", "Routes", "Errors", "Warnings", "Status"),
+                                          (80, 80, 70, 70, 280)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.W if column == "status" else tk.E)
+        for report in sorted(reports, key=lambda report: -report["seconds"]):
+            tree.insert("", tk.END, text=os.path.basename(report["file_path"]), values=(
+                f"{report['seconds'] * 1000:.0f}", report["count"], report["errors"], report["warnings"],
+                f"Failed: {report['error']}" if report["error"] else "OK"))
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        conflicts_frame = ttk.LabelFrame(dialog, text=f"Conflicts: {len(conflicts)}", padding=5)
+        conflicts_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        text = scrolledtext.ScrolledText(conflicts_frame, height=10, font=self.console_font)
+        text.pack(fill=tk.BOTH, expand=True)
+        lines = [f"{conflict['kind']}: {conflict['route']} in "
+                 f"{', '.join(os.path.basename(file_path) for file_path in conflict['files'])}: "
+                 f"{conflict['resolution']}" for conflict in conflicts[:MERGE_MAX_CONFLICTS]]
+        if len(conflicts) > MERGE_MAX_CONFLICTS:
+            lines.append(f"... and {len(conflicts) - MERGE_MAX_CONFLICTS} more")
+        text.insert(tk.END, "\n".join(lines))
+        text.config(state=tk.DISABLED)
+        ttk.Button(dialog, text="Close", command=dialog.destroy).pack(anchor=tk.E, padx=10, pady=10)
+    
     def save_routes_dialog(self):
         """Open file dialog to save routes to user-selected file"""
+        if self.route_load is not None:
+            messagebox.showinfo("Still Loading", "Routes are still loading. Save once loading has finished.")
+            return
         file_path = filedialog.asksaveasfilename(
             title="Save Routes",
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("SQLite route stores", "*.db *.sqlite *.sqlite3"),
+                       ("All files", "*.*")],
             initialdir=os.path.dirname(os.path.abspath(self.routes_file)),
             initialfile=os.path.basename(self.routes_file)
         )
         
         if file_path:
             try:
+                self.compact_journal()
                 self.save_routes_to_file(self.routes, file_path)
                 self.routes_file = file_path
+                if is_sqlite_path(file_path) or isinstance(self.routes["routes"], SqliteRouteStore):
+                    # Switching to or from a route store: carry on from the file just written
+                    self.routes = self.load_routes_from_file(file_path)
+                    self.rebuild_route_index()
+                    self.update_route_browser()
+                else:
+                    self.journal = RouteJournal(file_path)
+                    self.journal_in_sync = True
                 self.update_file_path_display()
             except Exception as e:
-                self.log(f"Error saving routes to {file_path}: {str(e)}")
+                self.log(f"Error saving routes to {file_path}: {str(e)}", "ERROR")
                 messagebox.showerror("Error", f"Failed to save routes: {str(e)}")
     
-    def update_route_dropdown(self):
-        """Update the route dropdown with current routes"""
-        route_names = list(self.routes["routes"].keys())
-        self.route_dropdown['values'] = route_names
-        if route_names:
-            self.route_dropdown.current(0)
-            self.display_route_details(None)
+    def rebuild_route_index(self):
+        """Rebuild the longest-prefix-match index from the loaded routes"""
+        routes = self.routes.get("routes", {})
+        if isinstance(routes, SqliteRouteStore):
+            self.route_index = SqliteRouteIndex(routes)  # Queried in place, nothing to build
         else:
+            self.route_index = RouteIndex(routes)
+    
+    def find_route_for_ip(self):
+        """Find and select the saved route that serves the entered destination IP"""
+        ip = self.find_ip_var.get().strip()
+        if not self.is_valid_ip(ip):
+            messagebox.showerror("Error", "Please enter a valid destination IP address.")
+            return
+        
+        match = self.route_index.lookup(ip)
+        if match is None:
+            self.log(f"No saved route covers {ip}")
+            self.status_var.set(f"No saved route covers {ip}")
+            return
+        
+        cidr, route_names = match
+        self.log(f"{ip} is served by {cidr}: {', '.join(route_names)}")
+        self.status_var.set(f"{ip} is served by {cidr} ({route_names[0]})")
+        self.route_browser.select(route_names[0])
+    
+    def update_route_browser(self):
+        """Reload the route browser with all current routes"""
+        self.route_browser.set_routes(self.routes["routes"])
+        first = self.route_browser.first()
+        if first is not None:
+            self.route_browser.select(first)
+        else:
+            self.route_var.set("")
             self.clear_form()
     
+    def on_route_selected(self, route_name):
+        """Show a route picked in the route browser"""
+        self.route_var.set(route_name)
+        self.display_route_details(None)
+    
     def display_route_details(self, event):
         """Display details of the selected route"""
         route_name = self.route_var.get()
@@ -437,10 +1894,12 @@ class RouteManagerApp:
         self.gateway_var.set(details.get("gateway", ""))
         
         self.log(f"Displaying details for route: {route_name}")
+        if self.route_sources is not None:
+            source = self.route_sources.get(route_name)
+            self.status_var.set(f"Route {route_name} from {source}" if source else f"Route {route_name} added here")
         
-        # Validate and update subnet information
-        self.validate_and_update_subnet_info()
-        self.validate_gateway()
+        # Validate and update subnet information once for all four fields
+        self.flush_validation()
     
     def clear_form(self):
         """Clear the form for a new route"""
@@ -451,9 +1910,8 @@ class RouteManagerApp:
         self.log("Form cleared for new route entry")
         
         # Clear network info
-        self.network_info.config(state=tk.NORMAL)
-        self.network_info.delete(1.0, tk.END)
-        self.network_info.config(state=tk.DISABLED)
+        self.cancel_validation()
+        self.set_network_info("")
         
         # Reset validation errors
         self.ip_error = False
@@ -463,106 +1921,86 @@ class RouteManagerApp:
     
     def is_valid_ip(self, ip_str):
         """Check if the IP address is valid"""
-        try:
-            ipaddress.IPv4Address(ip_str)
-            return True
-        except ValueError:
-            return False
+        return is_valid_ip(ip_str)
     
     def is_valid_mask(self, mask_str):
         """Check if the subnet mask is valid"""
-        try:
-            # Check if it's a valid IP address first
-            ip = ipaddress.IPv4Address(mask_str)
-            
-            # Convert to integer, then binary string, removing '0b' prefix
-            binary = bin(int(ip))[2:].zfill(32)
-            
-            # Check if it's a contiguous sequence of 1's followed by 0's
-            if '01' in binary:
-                return False
-            
-            return True
-        except ValueError:
-            return False
+        return is_valid_mask(mask_str)
     
     def get_network_info(self, ip_str, mask_str):
         """Calculate network information based on IP and mask"""
-        try:
-            # Create network objects
-            ip = ipaddress.IPv4Address(ip_str)
-            mask = ipaddress.IPv4Address(mask_str)
-            
-            # Calculate prefix length from subnet mask
-            mask_binary = bin(int(mask))[2:].zfill(32)
-            prefix_length = mask_binary.count('1')
-            
-            # Create network with prefix
-            network = ipaddress.IPv4Network(f"{ip}/{prefix_length}", strict=False)
-            
-            # Calculate values
-            network_address = network.network_address
-            broadcast_address = network.broadcast_address
-            first_host = network.network_address + 1
-            last_host = network.broadcast_address - 1
-            num_hosts = network.num_addresses - 2  # Subtract network and broadcast addresses
-            
+        info = compute_network_info(ip_str, mask_str)
+        if info is not None:
             # Check if the route IP is at the beginning of subnet range
-            route_ip_correct = (ip == network_address)
-            self.route_ip_error = not route_ip_correct
-            
-            return {
-                "network_address": str(network_address),
-                "broadcast": str(broadcast_address),
-                "first_host": str(first_host),
-                "last_host": str(last_host),
-                "num_hosts": num_hosts,
-                "prefix_length": prefix_length,
-                "cidr": f"{network_address}/{prefix_length}",
-                "route_ip_correct": route_ip_correct
-            }
-        except Exception as e:
-            return None
+            self.route_ip_error = not info["route_ip_correct"]
+        return info
+    
+    def schedule_validation(self):
+        """Validate the form once typing pauses instead of on every keystroke"""
+        if self.validation_job is not None:
+            self.root.after_cancel(self.validation_job)
+        self.validation_job = self.root.after(VALIDATION_DEBOUNCE_MS, self.run_validation)
+    
+    def cancel_validation(self):
+        """Drop a scheduled validation"""
+        if self.validation_job is not None:
+            self.root.after_cancel(self.validation_job)
+            self.validation_job = None
+    
+    def flush_validation(self):
+        """Run a scheduled validation now so the error flags match the form"""
+        if self.validation_job is not None:
+            self.cancel_validation()
+            self.run_validation()
+    
+    def run_validation(self):
+        """Validate all form fields and refresh the network information panel"""
+        self.validation_job = None
+        self.validate_and_update_subnet_info()
+        self.validate_gateway()
+    
+    def set_network_info(self, text):
+        """Show text in the network information panel if it differs from what is shown"""
+        if text == self.network_info_text:
+            return
+        self.network_info_text = text
+        self.network_info.config(state=tk.NORMAL)
+        self.network_info.delete(1.0, tk.END)
+        self.network_info.insert(tk.END, text)
+        self.network_info.config(state=tk.DISABLED)
     
+    @timed("subnet_info_update")
     def validate_and_update_subnet_info(self):
         """Validate IP and mask, then update subnet information"""
         ip = self.ip_var.get().strip()
         mask = self.mask_var.get().strip()
         
-        # Enable updating the text widget
-        self.network_info.config(state=tk.NORMAL)
-        self.network_info.delete(1.0, tk.END)
-        
         # Check if both IP and mask are provided
         if not ip or not mask:
-            self.network_info.insert(tk.END, "Enter IP address and subnet mask to see network information.")
-            self.network_info.config(state=tk.DISABLED)
+            self.set_network_info("Enter IP address and subnet mask to see network information.")
             return
         
         # Validate IP address
         if not self.is_valid_ip(ip):
-            self.network_info.insert(tk.END, "ERROR: Invalid IP address format.\n")
-            self.network_info.insert(tk.END, "IP address must be in format: xxx.xxx.xxx.xxx\n")
-            self.network_info.insert(tk.END, "with each value between 0-255.")
+            self.set_network_info("ERROR: Invalid IP address format.\n"
+                                  "IP address must be in format: xxx.xxx.xxx.xxx\n"
+                                  "with each value between 0-255.")
             self.ip_error = True
-            self.network_info.config(state=tk.DISABLED)
             return
         self.ip_error = False
         
         # Validate subnet mask
         if not self.is_valid_ip(mask):
-            self.network_info.insert(tk.END, "ERROR: Invalid subnet mask format.\n")
-            self.network_info.insert(tk.END, "Subnet mask must be in format: xxx.xxx.xxx.xxx\n")
-            self.network_info.insert(tk.END, "with each value between 0-255.")
+            self.set_network_info("ERROR: Invalid subnet mask format.\n"
+                                  "Subnet mask must be in format: xxx.xxx.xxx.xxx\n"
+                                  "with each value between 0-255.")
             self.mask_error = True
-            self.network_info.config(state=tk.DISABLED)
             return
         elif not self.is_valid_mask(mask):
-            self.network_info.insert(tk.END, "ERROR: Invalid subnet mask pattern.\n")
-            self.network_info.insert(tk.END, "Subnet mask must be a valid mask like:\n")
-            self.network_info.insert(tk.END, "255.255.255.0, 255.255.0.0, etc.")
+            self.set_network_info("ERROR: Invalid subnet mask pattern.\n"
+                                  "Subnet mask must be a valid mask like:\n"
+                                  "255.255.255.0, 255.255.0.0, etc.")
             self.mask_error = True
-            self.network_info.config(state=tk.DISABLED)
             return
         self.mask_error = False
         
@@ -570,27 +2008,25 @@ class RouteManagerApp:
         info = self.get_network_info(ip, mask)
         if info:
             # Use a more compact display format
-            self.network_info.insert(tk.END, f"Network Address: {info['network_address']}\n")
-            self.network_info.insert(tk.END, f"Subnet Mask: {mask}\n")
-            self.network_info.insert(tk.END, f"CIDR: {info['cidr']}\n")
-            self.network_info.insert(tk.END, f"Broadcast: {info['broadcast']}\n")
-            self.network_info.insert(tk.END, f"First Host: {info['first_host']}\n")
-            self.network_info.insert(tk.END, f"Last Host: {info['last_host']}\n")
-            self.network_info.insert(tk.END, f"Usable Hosts: {info['num_hosts']}\n\n")
+            text = (f"Network Address: {info['network_address']}\n"
+                    f"Subnet Mask: {mask}\n"
+                    f"CIDR: {info['cidr']}\n"
+                    f"Broadcast: {info['broadcast']}\n"
+                    f"First Host: {info['first_host']}\n"
+                    f"Last Host: {info['last_host']}\n"
+                    f"Usable Hosts: {info['num_hosts']}\n\n")
             
             # Check if routing IP is at beginning of subnet range
             if not info['route_ip_correct']:
-                self.network_info.insert(tk.END, "WARNING: Routing IP is not the network address!\n")
-                self.network_info.insert(tk.END, f"For proper routing, IP should be: {info['network_address']}")
+                text += ("WARNING: Routing IP is not the network address!\n"
+                         f"For proper routing, IP should be: {info['network_address']}")
                 self.route_ip_error = True
             else:
-                self.network_info.insert(tk.END, "✓ Routing IP is correctly set to network address")
+                text += "✓ Routing IP is correctly set to network address"
                 self.route_ip_error = False
+            self.set_network_info(text)
         else:
-            self.network_info.insert(tk.END, "Error calculating network information.")
-            
-        # Disable editing the text widget
-        self.network_info.config(state=tk.DISABLED)
+            self.set_network_info("Error calculating network information.")
     
     def validate_gateway(self):
         """Validate the switch address (formerly gateway)"""
@@ -604,27 +2040,15 @@ class RouteManagerApp:
         # Check if switch address is valid IP
         if not self.is_valid_ip(switch_addr):
             self.gateway_error = True
-            self.log("ERROR: Invalid switch address IP format")
+            self.log("ERROR: Invalid switch address IP format", "ERROR")
             return
         
         # Switch address is valid and doesn't need to be in the same subnet
         self.gateway_error = False
-        
-        # Remove any previous warnings about switch address
-        self.network_info.config(state=tk.NORMAL)
-        content = self.network_info.get("1.0", tk.END)
-        
-        # Remove any warning lines about switch addresses
-        lines = content.split('\n')
-        filtered_lines = [line for line in lines if "WARNING: Switch address" not in line]
-        
-        # Clear and rewrite content
-        self.network_info.delete("1.0", tk.END)
-        self.network_info.insert(tk.END, '\n'.join(filtered_lines))
-        self.network_info.config(state=tk.DISABLED)
     
     def save_route(self):
         """Save the current route details with validation"""
+        self.flush_validation()
         route_name = self.name_var.get().strip()
         ip = self.ip_var.get().strip()
         mask = self.mask_var.get().strip()
@@ -665,12 +2089,16 @@ class RouteManagerApp:
                 return
         
         # Save the route
+        before = self.routes["routes"].get(route_name)
         self.routes["routes"][route_name] = {"ip": ip, "mask": mask, "gateway": switch_addr}
-        self.save_routes_to_file(self.routes, self.routes_file)
+        self.record_route_change(f"Saved route {route_name}",
+                                 [(route_name, before, self.routes["routes"][route_name])])
+        self.route_index.add(route_name, self.routes["routes"][route_name])
+        self.persist_change(route_name)
         
         # Update UI
-        self.update_route_dropdown()
-        self.route_var.set(route_name)
+        self.route_browser.add(route_name)
+        self.route_browser.select(route_name)
         
         self.log(f"Route {route_name} saved successfully")
         self.status_var.set(f"Route {route_name} saved to {os.path.abspath(self.routes_file)}")
@@ -688,11 +2116,15 @@ class RouteManagerApp:
         
         # Delete the route
         if route_name in self.routes["routes"]:
+            self.record_route_change(f"Deleted route {route_name}",
+                                     [(route_name, self.routes["routes"][route_name], None)])
             del self.routes["routes"][route_name]
-            self.save_routes_to_file(self.routes, self.routes_file)
+            self.route_index.remove(route_name)
+            self.persist_change(route_name)
             
             # Update UI
-            self.update_route_dropdown()
+            self.route_browser.remove(route_name)
+            self.route_var.set("")
             self.clear_form()
             
             self.log(f"Route {route_name} deleted")
@@ -700,6 +2132,144 @@ class RouteManagerApp:
         else:
             messagebox.showerror("Error", f"Route {route_name} not found")
     
+    def reset_route_history(self):
+        """Start a new edit history, e.g. for another routes file"""
+        self.route_history = RouteHistory()
+        self.refresh_route_history_view()
+    
+    def record_route_change(self, description, changes):
+        """Add an edit of (route name, details before, details after) changes to the undo history"""
+        self.route_history.record(description, changes)
+        self.refresh_route_history_view()
+    
+    def apply_route_changes(self, changes):
+        """Set or delete (route name, details or None) in the routes, index and browser, and persist them"""
+        routes = self.routes["routes"]
+        if isinstance(routes, SqliteRouteStore):
+            routes.apply_changes(changes)  # In one transaction; the store indexes its own rows
+            for route_name, details in changes:
+                if details is not None:
+                    self.route_browser.add(route_name)
+                else:
+                    self.route_browser.remove(route_name)
+        else:
+            for route_name, details in changes:
+                if details is not None:
+                    routes[route_name] = details
+                    self.route_index.add(route_name, details)
+                    self.route_browser.add(route_name)
+                elif route_name in routes:
+                    del routes[route_name]
+                    self.route_index.remove(route_name)
+                    self.route_browser.remove(route_name)
+        self.persist_changes([route_name for route_name, details in changes])
+        
+        # Show the current route as it is now
+        current = self.route_var.get()
+        if current in routes:
+            self.display_route_details(None)
+        elif any(route_name == current for route_name, details in changes):
+            self.route_var.set("")
+            self.clear_form()
+    
+    def move_in_history(self, index):
+        """Take the routes to the state after history entry index"""
+        history = self.route_history
+        if index == history.position - 1:
+            message = f"Undo: {history.entries[history.position]['description']}"
+        elif index == history.position + 1:
+            message = f"Redo: {history.entries[index]['description']}"
+        elif index != history.position:
+            message = f"Back to: {history.entries[index]['description']}"
+        else:
+            return
+        changes = history.move_to(index)
+        self.apply_route_changes(changes)
+        self.refresh_route_history_view()
+        self.log(f"{message} ({len(changes)} routes changed)")
+        self.status_var.set(message)
+    
+    def undo_route_change(self):
+        """Undo the last route edit"""
+        if not self.route_history.can_undo:
+            self.status_var.set("Nothing to undo")
+            return
+        self.move_in_history(self.route_history.position - 1)
+    
+    def redo_route_change(self):
+        """Redo the last undone route edit"""
+        if not self.route_history.can_redo:
+            self.status_var.set("Nothing to redo")
+            return
+        self.move_in_history(self.route_history.position + 1)
+    
+    def show_route_history(self):
+        """Open the list of route edits, from which any earlier state can be restored"""
+        if self.history_window is not None:
+            self.history_window.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Edit History")
+        dialog.geometry("620x420")
+        dialog.protocol("WM_DELETE_WINDOW", self.close_route_history)
+        self.history_window = dialog
+        
+        ttk.Label(dialog, text="Select an entry and go to it to restore the routes as they were after it:"
+                  ).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.history_tree = ttk.Treeview(list_frame, columns=("time", "routes"), selectmode=tk.BROWSE)
+        self.history_tree.heading("#0", text="Change")
+        self.history_tree.column("#0", width=380)
+        self.history_tree.heading("time", text="Time")
+        self.history_tree.column("time", width=80)
+        self.history_tree.heading("routes", text="Routes")
+        self.history_tree.column("routes", width=70, anchor=tk.E)
+        self.history_tree.tag_configure("current", font=self.button_font, background="#cce4f7")
+        self.history_tree.tag_configure("undone", foreground="#808080")
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
+        self.history_tree.config(yscrollcommand=scrollbar.set)
+        self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def go_to_selected():
+            selection = self.history_tree.selection()
+            if selection:
+                self.move_in_history(int(selection[0]))
+        
+        self.history_tree.bind("<Double-1>", lambda event: go_to_selected())
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Undo", command=self.undo_route_change).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Redo", command=self.redo_route_change).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(button_frame, text="Go to Selected", command=go_to_selected).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(button_frame, text="Close", command=self.close_route_history).pack(side=tk.RIGHT)
+        self.refresh_route_history_view()
+    
+    def refresh_route_history_view(self):
+        """List the history entries, newest first, marking the current one and those undone"""
+        if self.history_window is None:
+            return
+        history = self.route_history
+        self.history_tree.delete(*self.history_tree.get_children())
+        for index in range(len(history.entries) - 1, -1, -1):
+            entry = history.entries[index]
+            if index == history.position:
+                tags = ("current",)
+            elif index > history.position:
+                tags = ("undone",)
+            else:
+                tags = ()
+            self.history_tree.insert("", tk.END, iid=str(index), text=entry["description"], tags=tags, values=(
+                datetime.datetime.fromtimestamp(entry["time"]).strftime("%H:%M:%S"), len(entry["changes"])))
+        self.history_tree.see(str(history.position))
+    
+    def close_route_history(self):
+        if self.history_window is not None:
+            self.history_window.destroy()
+            self.history_window = None
+    
     def show_routing_table_options(self):
         """Show options for displaying the routing table"""
         # Create a custom dialog instead of using messagebox.askquestion with buttons
@@ -714,42 +2284,45 @@ class RouteManagerApp:
             self.print_windows_routing_table_to_window()
     
     def print_windows_routing_table_to_console(self):
-        """Show the current Windows routing table in the console widget"""
-        self.log("Retrieving Windows routing table...")
+        """Show the current system routing table in the console widget"""
+        backend = self.route_backend
+        self.log(f"Retrieving system routing table ({backend.name})...")
+        
+        # The backend's lines are produced on the worker thread as they arrive
+        self.stream_to_console(metrics.timed_lines("route_print", backend.table_lines()),
+                               header=f"=== SYSTEM ROUTING TABLE ({backend.name}) ===", clear=True,
+                               on_done=lambda: self.log("Routing table displayed in console"))
+    
+    def stream_to_console(self, lines, header=None, clear=False, on_done=None):
+        """Stream lines from an iterable into the console without blocking the UI
         
-        try:
-            # Run the route print command and capture output
-            process = subprocess.Popen(["route", "print"], 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE,
-                                     universal_newlines=True,
-                                     shell=True)
-            
-            # Use a separate thread to read output without blocking the UI
-            def read_output():
-                stdout, stderr = process.communicate()
-                
-                if stderr:
-                    self.log(f"Error retrieving routing table: {stderr}")
-                    return
-                
-                # Clear and update console with routing table
-                self.console.delete(1.0, tk.END)
-                self.console.insert(tk.END, "=== WINDOWS ROUTING TABLE ===\n\n")
-                self.console.insert(tk.END, stdout)
-                self.console.see(tk.END)
-                
-                self.log("Routing table displayed in console")
-            
-            # Start the thread
-            threading.Thread(target=read_output, daemon=True).start()
-            
-        except Exception as e:
-            self.log(f"Error showing routing table: {str(e)}")
-            messagebox.showerror("Error", f"Failed to show routing table: {str(e)}")
+        The iterable is consumed on a worker thread and fed to the console log,
+        whose Tk-thread drain shows the first lines immediately and keeps the
+        window responsive however long the output is.
+        """
+        if clear:
+            self.console_log.clear()
+        if header:
+            self.console_log.write([header, ""])
+        
+        def produce():
+            try:
+                for line in lines:
+                    self.console_log.write([line])
+            except Exception as e:
+                self.log(f"Error reading command output: {str(e)}", "ERROR")
+            if on_done:
+                self.console_log.call(on_done)
+        
+        threading.Thread(target=produce, daemon=True).start()
     
     def print_windows_routing_table_to_window(self):
-        """Show the current Windows routing table in a separate window"""
+        """Show the current system routing table in a separate window"""
+        if self.route_backend.name != "route.exe":
+            self.log("A separate routing table window needs the route.exe backend; showing it in the console")
+            self.print_windows_routing_table_to_console()
+            return
+        
         # Create batch file to run route print
         batch_id = str(uuid.uuid4())[:8]
         batch_path = os.path.join(os.environ["TEMP"], f"route_print_{batch_id}.bat")
@@ -769,13 +2342,14 @@ class RouteManagerApp:
         # Run the batch file
         try:
             subprocess.Popen(batch_path, shell=True)
-            self.log(f"Showing Windows routing table in a separate window")
+            self.log(f"Showing system routing table in a separate window")
         except Exception as e:
-            self.log(f"Error showing routing table: {str(e)}")
+            self.log(f"Error showing routing table: {str(e)}", "ERROR")
             messagebox.showerror("Error", f"Failed to show routing table: {str(e)}")
     
     def windows_route_action(self, action):
-        """Add or delete the current route from Windows routing table"""
+        """Add or delete the current route from system routing table"""
+        self.flush_validation()
         route_name = self.route_var.get()
         if not route_name:
             messagebox.showerror("Error", "No route selected")
@@ -786,10 +2360,10 @@ class RouteManagerApp:
             messagebox.showerror("Error", f"Route {route_name} details not found")
             return
         
-        # Check for validation errors before adding to Windows
+        # Check for validation errors before adding to the system table
         if action == "add" and (self.ip_error or self.mask_error or self.gateway_error):
             messagebox.showerror("Validation Error", 
-                              "Cannot add route to Windows due to validation errors.\n"
+                              "Cannot add route to the system routing table due to validation errors.\n"
                               "Please fix the errors first.")
             return
         
@@ -802,53 +2376,660 @@ class RouteManagerApp:
                 return
         
         # Create the command
-        if action == "add":
-            command = f"route add {details['ip']} mask {details['mask']} {details['gateway']}"
-            action_text = "Adding"
-        else:  # delete
-            command = f"route delete {details['ip']} mask {details['mask']}"
-            action_text = "Deleting"
+        command = self.route_backend.describe(action, details)
+        action_text = "Adding" if action == "add" else "Deleting"
+        
+        self.log(f"{action_text} route in the system routing table: {command}")
+        
+        def report(index, exit_code, error):
+            status = result_status(exit_code)
+            self.log(f"{command}: {error or status}", "INFO" if exit_code == 0 else "ERROR")
+            self.status_var.set(f"{action_text} route {route_name}: {status}")
         
-        # Always use elevated command for route operations
-        self.log(f"{action_text} route in Windows: {command}")
-        self.create_and_run_batch(command)
+        self.run_route_operations([dict(details, action=action)], on_result=report)
         
         # Update status
         self.status_var.set(f"Command sent to {action.lower()} route - check console for results")
     
-    def create_and_run_batch(self, command):
-        """Create and run a batch file with the given command using elevated privileges"""
-        # Create a temporary batch file with a unique name
-        batch_id = str(uuid.uuid4())[:8]
-        batch_path = os.path.join(os.environ["TEMP"], f"route_command_{batch_id}.bat")
+    def run_route_operations(self, operations, on_result=None, on_done=None):
+        """Send route operations to the routing backend, streaming their output into the console
+        
+        Backends that need elevation get a helper, started with a single UAC
+        (or pkexec) prompt the first time this is called and kept for the
+        rest of the session; others run on a worker thread in this process.
+        on_result is called with (index, exit_code, error) and on_done
+        without arguments, both on the Tk thread.
+        """
+        if self.route_runner is None:
+            if self.route_backend.needs_elevation():
+                self.route_runner = RouteHelperClient(helper_launcher(self.route_backend.name))
+            else:
+                self.route_runner = LocalRouteRunner(self.route_backend)
+        
+        submitted = time.perf_counter()
+        
+        def on_event(event):
+            if event["type"] == "output":
+                self.console_log.write([event["line"]])
+            elif event["type"] == "status":
+                self.log(event["message"], "ERROR" if event.get("error") else "INFO")
+            elif event["type"] == "result":
+                metrics.count("route_operations")
+                if event["exit_code"] != 0:
+                    metrics.count("route_operation_failures")
+                if on_result:
+                    self.console_log.call(on_result, event["index"], event["exit_code"], event["error"])
+            elif event["type"] == "done":
+                # From submission, so time spent waiting for the helper or earlier jobs is included
+                metrics.record("route_job", time.perf_counter() - submitted)
+                if on_done:
+                    self.console_log.call(on_done)
+        
+        self.route_runner.submit(operations, on_event)
+    
+    def show_bulk_apply_dialog(self):
+        """Show a dialog for applying several routes with a single elevation"""
+        route_names = list(self.routes["routes"].keys())
+        if not route_names:
+            messagebox.showinfo("Apply Routes", "There are no routes to apply.")
+            return
         
-        with open(batch_path, "w") as batch_file:
-            batch_file.write(f"@echo off\n")
-            batch_file.write(f"echo =======================================\n")
-            batch_file.write(f"echo Routing Table Manager - Admin Command\n")
-            batch_file.write(f"echo =======================================\n")
-            batch_file.write(f"echo.\n")
-            batch_file.write(f"echo Executing: {command}\n")
-            batch_file.write(f"echo.\n")
-            batch_file.write(f"{command}\n")
-            batch_file.write(f"echo.\n")
-            batch_file.write(f"echo Current Routing Table:\n")
-            batch_file.write(f"route print\n")
-            batch_file.write(f"echo.\n")
-            batch_file.write(f"echo Press any key to close this window...\n")
-            batch_file.write("pause > nul\n")
-            batch_file.write(f"del \"%~f0\"\n")  # Self-delete the batch file
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Apply Routes to System Table")
+        dialog.transient(self.root)
+        dialog.geometry("420x480")
+        
+        ttk.Label(dialog, text="Routes to apply:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        route_list = tk.Listbox(list_frame, selectmode=tk.EXTENDED, font=self.info_font)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=route_list.yview)
+        route_list.config(yscrollcommand=scrollbar.set)
+        route_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        route_list.insert(tk.END, *route_names)
+        
+        # Preselect the route currently shown in the form
+        current = self.route_var.get()
+        if current in self.routes["routes"]:
+            index = route_names.index(current)
+            route_list.selection_set(index)
+            route_list.see(index)
+        
+        action_var = tk.StringVar(value="add")
+        action_frame = ttk.Frame(dialog)
+        action_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Radiobutton(action_frame, text="Add", variable=action_var, value="add").pack(side=tk.LEFT)
+        ttk.Radiobutton(action_frame, text="Delete", variable=action_var, value="delete").pack(side=tk.LEFT, padx=(10, 0))
+        
+        def apply(selected_only):
+            if selected_only:
+                names = [route_names[i] for i in route_list.curselection()]
+                if not names:
+                    messagebox.showerror("Error", "No routes selected", parent=dialog)
+                    return
+            else:
+                names = route_names
+            dialog.destroy()
+            self.bulk_route_action(action_var.get(), names)
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        ttk.Button(button_frame, text="Apply Selected", command=lambda: apply(True)).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Apply All", command=lambda: apply(False)).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT)
+    
+    def show_fleet_apply_dialog(self):
+        """Show a dialog for applying routes on many hosts through their route agents"""
+        if self.fleet_apply is not None:
+            messagebox.showinfo("Apply to Fleet", "A fleet rollout is still running.")
+            return
+        route_names = list(self.routes["routes"].keys())
+        if not route_names:
+            messagebox.showinfo("Apply to Fleet", "There are no routes to apply.")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Apply Routes to Fleet")
+        dialog.transient(self.root)
+        dialog.geometry("460x560")
+        
+        ttk.Label(dialog, text="Hosts (host or host:port, one per line):").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        hosts_text = tk.Text(dialog, height=8, font=self.info_font)
+        hosts_text.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        options = ttk.Frame(dialog)
+        options.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(options, text="Token:").grid(row=0, column=0, sticky="w", pady=2)
+        token_var = tk.StringVar(value=os.environ.get(FLEET_TOKEN_ENV, ""))
+        ttk.Entry(options, textvariable=token_var, show="*", width=30).grid(row=0, column=1, sticky="w", padx=(5, 0))
+        settings = []
+        fields = (("Hosts at once:", FLEET_CONCURRENCY), ("Timeout (seconds):", FLEET_TIMEOUT), ("Retries:", FLEET_RETRIES))
+        for row, (label, value) in enumerate(fields, 1):
+            ttk.Label(options, text=label).grid(row=row, column=0, sticky="w", pady=2)
+            var = tk.StringVar(value=str(value))
+            ttk.Entry(options, textvariable=var, width=8).grid(row=row, column=1, sticky="w", padx=(5, 0))
+            settings.append(var)
+        
+        action_var = tk.StringVar(value="add")
+        action_frame = ttk.Frame(dialog)
+        action_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Radiobutton(action_frame, text="Add", variable=action_var, value="add").pack(side=tk.LEFT)
+        ttk.Radiobutton(action_frame, text="Delete", variable=action_var, value="delete").pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Apply the route shown in the form, or all routes
+        current = self.route_var.get()
+        scope_var = tk.StringVar(value="current" if current in self.routes["routes"] else "all")
+        scope_frame = ttk.Frame(dialog)
+        scope_frame.pack(fill=tk.X, padx=10)
+        ttk.Radiobutton(scope_frame, text=f"Current route ({current or 'none'})", variable=scope_var, value="current",
+                        state=tk.NORMAL if current in self.routes["routes"] else tk.DISABLED).pack(side=tk.LEFT)
+        ttk.Radiobutton(scope_frame, text=f"All {len(route_names)} routes", variable=scope_var,
+                        value="all").pack(side=tk.LEFT, padx=(10, 0))
+        
+        def apply():
+            try:
+                addresses = read_hosts(hosts_text.get("1.0", tk.END).splitlines())
+                concurrency, retries = int(settings[0].get()), int(settings[2].get())
+                timeout = float(settings[1].get())
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            if not addresses:
+                messagebox.showerror("Error", "No hosts given", parent=dialog)
+                return
+            if concurrency < 1 or retries < 0 or timeout <= 0:
+                messagebox.showerror("Error", "Hosts at once and the timeout must be positive", parent=dialog)
+                return
+            if not token_var.get():
+                messagebox.showerror("Error", "The fleet token is required", parent=dialog)
+                return
+            dialog.destroy()
+            names = [current] if scope_var.get() == "current" else route_names
+            self.start_fleet_apply(action_var.get(), names, addresses, token_var.get(),
+                                   concurrency=concurrency, timeout=timeout, retries=retries)
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Apply", command=apply).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT)
+    
+    def start_fleet_apply(self, action, route_names, addresses, token, **options):
+        """Apply routes on every host on a worker thread, streaming per-host progress into the console"""
+        routes = self.routes["routes"]
+        entries = []
+        for route_name in route_names:
+            details = routes.get(route_name, {})
+            valid = self.is_valid_ip(details.get("ip", "")) and self.is_valid_mask(details.get("mask", ""))
+            if action == "add":
+                valid = valid and self.is_valid_ip(details.get("gateway", ""))
+            if valid:
+                entries.append((route_name, details))
+            else:
+                self.log(f"Skipping route {route_name}: invalid route details", "WARNING")
+        if not entries:
+            messagebox.showerror("Error", "None of the selected routes are valid.")
+            return
+        
+        operations = [{"action": action, "ip": details["ip"], "mask": details["mask"],
+                       "gateway": details.get("gateway", "")} for route_name, details in entries]
+        self.fleet_apply = object()
+        self.log(f"{'Adding' if action == 'add' else 'Deleting'} {len(entries)} routes on {len(addresses)} hosts")
+        self.status_var.set(f"Applying {len(entries)} routes on {len(addresses)} hosts...")
+        
+        # Called on the worker's event loop; the console is fed through its thread-safe queue
+        def on_event(event):
+            if event["type"] == "output":
+                self.console_log.write([f"[{event['host']}] {event['line']}"])
+            elif event["type"] == "result":
+                metrics.count("fleet_operations")
+                if event["exit_code"] != 0:
+                    metrics.count("fleet_operation_failures")
+                    self.log(f"[{event['host']}] route {action} {entries[event['index']][0]}: "
+                             f"{event['error'] or result_status(event['exit_code'])}", "ERROR")
+            elif event["type"] == "skipped":
+                self.log(f"Skipping route {entries[event['index']][0]}: {event['error']}", "WARNING")
+            elif event["state"] in ("retrying", "failed"):
+                self.log(f"[{event['host']}] {event['state']}: {event['message']}", "WARNING")
+            elif event["state"] == "connected":
+                self.log(f"[{event['host']}] connected: {event['message']}")
+        
+        def run():
+            started = time.perf_counter()
+            try:
+                reports = run_fleet(addresses, token, operations, on_event, **options)
+            except Exception as e:
+                self.log(f"Error applying routes to the fleet: {str(e)}", "ERROR")
+                reports = []
+            self.console_log.call(self.finish_fleet_apply, action, len(operations), reports,
+                                  time.perf_counter() - started)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def finish_fleet_apply(self, action, count, reports, seconds):
+        """Log each host's outcome, slowest first, and the rollout's total time"""
+        self.fleet_apply = None
+        metrics.record("fleet_apply", seconds)
+        for report in sorted(reports, key=lambda report: -report["seconds"]):
+            summary = (f"{report['host']}: {report['ok']} ok, {report['failed']} failed, {report['not_run']} not run "
+                       f"in {report['seconds']:.1f} s, {report['attempts']} attempts")
+            if report["error"]:
+                self.log(f"{summary} - {report['error']}", "ERROR")
+            else:
+                self.log(summary, "WARNING" if report["failed"] else "INFO")
+        done = sum(1 for report in reports if report["state"] == "done" and not report["failed"])
+        slowest = max((report["seconds"] for report in reports), default=0.0)
+        summary = (f"Fleet {action} of {count} routes finished: {done} of {len(reports)} hosts succeeded "
+                   f"in {seconds:.1f} s (slowest host {slowest:.1f} s)")
+        self.log(summary)
+        self.status_var.set(summary)
+    
+    def bulk_route_action(self, action, route_names, routes=None):
+        """Add or delete several routes from the system routing table in one job"""
+        if routes is None:
+            routes = self.routes["routes"]
+        
+        entries = []
+        for route_name in route_names:
+            details = routes.get(route_name, {})
+            valid = (self.is_valid_ip(details.get("ip", "")) and
+                     self.is_valid_mask(details.get("mask", "")))
+            if action == "add":
+                valid = valid and self.is_valid_ip(details.get("gateway", ""))
+            if valid:
+                entries.append((route_name, details))
+            else:
+                self.log(f"Skipping route {route_name}: invalid route details", "WARNING")
+        
+        if not entries:
+            messagebox.showerror("Error", "None of the selected routes are valid.")
+            return
+        
+        action_text = "Adding" if action == "add" else "Deleting"
+        self.log(f"{action_text} {len(entries)} routes in the system routing table ({self.route_backend.name})")
+        self.run_bulk_operations(action, entries)
+        self.status_var.set(f"Bulk {action.lower()} of {len(entries)} routes sent - check console for results")
+    
+    def run_bulk_operations(self, action, entries):
+        """Run a list of route commands through the helper and report per-route results in the console
+        
+        When action is None each entry's details carry their own "action", as in
+        the operations returned by plan_reconcile.
+        """
+        statuses = ["not run"] * len(entries)
+        
+        def record(index, exit_code, error):
+            statuses[index] = result_status(exit_code)
+            if error:
+                self.log(f"{entries[index][0]}: {error}", "ERROR")
+        
+        def report():
+            self.report_bulk_results(action, [(route_name, status) for (route_name, details), status
+                                              in zip(entries, statuses)])
+        
+        operations = [dict(details, action=action or details["action"]) for route_name, details in entries]
+        self.run_route_operations(operations, on_result=record, on_done=report)
+    
+    def report_bulk_results(self, action, results):
+        """Log the outcome of each route in a bulk apply"""
+        for route_name, status in results:
+            if action:
+                self.log(f"route {action} {route_name}: {status}")
+            else:
+                self.log(f"{route_name}: {status}")
+        succeeded = sum(1 for route_name, status in results if status == "ok")
+        summary = f"Bulk {action or 'reconcile'} finished: {succeeded} of {len(results)} commands succeeded"
+        self.log(summary)
+        self.status_var.set(summary)
+    
+    def reconcile_with_windows_routes(self):
+        """Compare the routes file with the system routing table and apply only the differences"""
+        self.log("Retrieving system routing table for reconcile...")
         
-        # Run the batch file with elevated privileges using PowerShell
-        powershell_command = f'powershell -Command "Start-Process -FilePath \'{batch_path}\' -Verb RunAs"'
+        def read_table():
+            try:
+                records = self.route_backend.list_routes()
+            except Exception as e:
+                self.log(f"Error retrieving routing table: {str(e)}", "ERROR")
+                return
+            self.console_log.call(self.show_reconcile_plan, {"active": records, "persistent": []})
+        
+        threading.Thread(target=read_table, daemon=True).start()
+    
+    def show_reconcile_plan(self, system_routes):
+        """Log the reconcile plan and offer to apply it with a single elevation"""
+        installed = len(system_routes["active"]) + len(system_routes["persistent"])
+        self.log(f"Read {installed} IPv4 routes from the system routing table ({self.route_backend.name})")
+        
+        prune = messagebox.askyesno("Reconcile",
+                                    "Also delete installed routes that use one of this file's "
+                                    "switch addresses but are no longer in the file?")
+        skipped = []
+        plan = plan_reconcile(self.routes.get("routes", {}), system_routes, prune=prune, skipped=skipped)
+        for route_name in skipped:
+            self.log(f"Skipping route {route_name}: invalid route details", "WARNING")
+        if not plan:
+            self.log("system routing table already matches the routes file")
+            self.status_var.set("system routing table already matches the routes file")
+            return
+        
+        entries = [(self.route_backend.describe(operation["action"], operation), operation) for operation in plan]
+        counts = {action: sum(1 for operation in plan if operation["action"] == action)
+                  for action in ("add", "change", "delete")}
+        self.log(f"Reconcile plan: {counts['add']} adds, {counts['change']} changes, {counts['delete']} deletes")
+        for command, operation in entries:
+            self.log(f"   {command}" + (f"  ({operation['name']})" if operation["name"] else ""))
         
+        if messagebox.askyesno("Reconcile", f"Apply {len(plan)} route commands to the system routing table?"):
+            self.run_bulk_operations(None, entries)
+    
+    def show_route_monitor(self):
+        """Open the routing table monitor, which shows system table changes as they happen"""
+        if self.monitor_window is not None:
+            self.monitor_window.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Routing Table Monitor")
+        dialog.geometry("760x560")
+        dialog.protocol("WM_DELETE_WINDOW", self.close_route_monitor)
+        self.monitor_window = dialog
+        
+        controls = ttk.Frame(dialog)
+        controls.pack(fill=tk.X, padx=10, pady=(10, 5))
+        ttk.Label(controls, text="Check every").pack(side=tk.LEFT)
+        self.monitor_interval_var = tk.IntVar(value=MONITOR_DEFAULT_INTERVAL)
+        ttk.Spinbox(controls, from_=1, to=3600, width=5,
+                    textvariable=self.monitor_interval_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(controls, text="seconds").pack(side=tk.LEFT)
+        self.monitor_interval_var.trace_add("write", lambda name, index, mode: self.set_monitor_interval())
+        self.monitor_button = ttk.Button(controls, text="Start", command=self.toggle_route_monitor)
+        self.monitor_button.pack(side=tk.LEFT, padx=(10, 0))
+        self.monitor_status_var = tk.StringVar(value=f"Stopped ({self.route_backend.name} backend)")
+        ttk.Label(controls, textvariable=self.monitor_status_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        changes_frame = ttk.LabelFrame(dialog, text="Changes", padding=5)
+        changes_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.monitor_changes = scrolledtext.ScrolledText(changes_frame, height=14, font=self.console_font)
+        self.monitor_changes.pack(fill=tk.BOTH, expand=True)
+        self.monitor_changes.tag_configure("added", foreground="#2e7d32")
+        self.monitor_changes.tag_configure("removed", foreground="#c62828")
+        self.monitor_changes.tag_configure("changed", foreground="#ef6c00")
+        self.monitor_changes.tag_configure("saved", foreground="#c62828", background="#ffebee")
+        
+        self.monitor_missing_frame = ttk.LabelFrame(dialog, text="Saved routes missing from the system table",
+                                                    padding=5)
+        self.monitor_missing_frame.pack(fill=tk.BOTH, padx=10, pady=(5, 10))
+        self.monitor_missing = scrolledtext.ScrolledText(self.monitor_missing_frame, height=8, font=self.console_font)
+        self.monitor_missing.pack(fill=tk.BOTH, expand=True)
+        self.monitor_missing.tag_configure("disappeared", foreground="#c62828", background="#ffebee")
+        self.monitor_missing.tag_configure("never", foreground="#757575")
+        
+        self.start_route_monitor()
+    
+    def toggle_route_monitor(self):
+        """Start or stop watching the system routing table"""
+        if self.route_monitor is None:
+            self.start_route_monitor()
+        else:
+            self.stop_route_monitor()
+    
+    def monitor_interval(self):
+        """The interval from the monitor window, or None if it is not a positive number"""
         try:
-            subprocess.Popen(powershell_command, shell=True)
-            self.log(f"Created batch file and launched with elevated privileges")
-            self.log(f"Check the admin command window for results")
-        except Exception as e:
-            self.log(f"Error launching elevated batch file: {str(e)}")
-            messagebox.showerror("Error", f"Failed to execute with admin rights: {str(e)}")
+            interval = self.monitor_interval_var.get()
+        except tk.TclError:
+            return None
+        return interval if interval > 0 else None
+    
+    def set_monitor_interval(self):
+        """Apply a new interval to the running monitor from its next check on"""
+        interval = self.monitor_interval()
+        if interval is not None and self.route_monitor is not None:
+            self.route_monitor.interval = interval
+    
+    def start_route_monitor(self):
+        """Start a monitor on the routing backend; changes arrive on the Tk thread"""
+        interval = self.monitor_interval()
+        if interval is None:
+            messagebox.showerror("Error", "The interval must be a whole number of seconds", parent=self.monitor_window)
+            return
+        
+        # Each monitor's events are passed on with it, so late events from a stopped one are ignored
+        monitor = RouteTableMonitor(self.route_backend, interval,
+                                    lambda event: self.console_log.call(self.update_route_monitor, monitor, event))
+        self.route_monitor = monitor
+        self.monitor_routes = None
+        self.monitor_disappeared = set()
+        self.monitor_button.config(text="Stop")
+        self.monitor_status_var.set(f"Reading the system routing table ({self.route_backend.name})...")
+        monitor.start()
+        self.log(f"Monitoring the system routing table every {interval} s")
+    
+    def stop_route_monitor(self):
+        """Stop watching; the window keeps what it has shown"""
+        if self.route_monitor is None:
+            return
+        self.route_monitor.stop()
+        self.route_monitor = None
+        self.saved_route_watch = None
+        self.monitor_button.config(text="Start")
+        self.monitor_status_var.set("Stopped")
+        self.log("Stopped monitoring the system routing table")
+    
+    def close_route_monitor(self):
+        """Stop the monitor and close its window"""
+        if self.monitor_window is None:
+            return
+        self.stop_route_monitor()
+        self.monitor_window.destroy()
+        self.monitor_window = None
+    
+    def update_route_monitor(self, monitor, event):
+        """Show one monitor event: the first snapshot, a change, or an error"""
+        if monitor is not self.route_monitor:
+            return
+        timestamp = datetime.datetime.fromtimestamp(event["time"]).strftime("%H:%M:%S")
+        if event["type"] == "error":
+            self.add_monitor_lines([(f"[{timestamp}] Error reading routing table: {event['message']}", "removed")])
+            return
+        
+        snapshot, diff = event["snapshot"], event["diff"]
+        how = "change notifications" if monitor.notifying else "polling"
+        if diff is None:
+            self.add_monitor_lines([(f"[{timestamp}] Watching {len(snapshot)} routes ({how})", None)])
+            self.monitor_status_var.set(f"Watching {len(snapshot)} routes since {timestamp}")
+            self.refresh_route_monitor()
+            return
+        
+        watch = self.saved_route_watch
+        lines = []
+        for kind, sign in (("removed", "-"), ("added", "+"), ("changed", "~")):
+            for record in diff[kind]:
+                text = (f"[{timestamp}] {sign} {route_cidr(record) or record['ip']} via {record['gateway']}"
+                        f" on {record['interface'] or '?'} metric {record['metric']}")
+                if kind == "changed":
+                    previous = record["previous"]
+                    text += f" (was {previous['interface'] or '?'} metric {previous['metric']})"
+                saved = watch.names.get((record["ip"], record["mask"], record["gateway"])) if watch else None
+                if saved:
+                    text += f"  [saved: {', '.join(sorted(saved))}]"
+                lines.append((text, "saved" if saved and kind == "removed" else kind))
+        self.add_monitor_lines(lines)
+        self.log(f"System routing table changed: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+                 f"{len(diff['changed'])} changed")
+        self.monitor_status_var.set(f"Watching {len(snapshot)} routes; last change at {timestamp}")
+        
+        if watch is not None:
+            before = set(watch.missing)
+            watch.apply_diff(diff)
+            gone = watch.missing - before
+            if gone:
+                self.log(f"{len(gone)} saved routes disappeared from the system routing table: "
+                         f"{', '.join(sorted(gone)[:10])}{' ...' if len(gone) > 10 else ''}", "WARNING")
+            self.monitor_disappeared = (self.monitor_disappeared | gone) & watch.missing
+            self.show_missing_routes()
+    
+    def refresh_route_monitor(self):
+        """Rebuild the saved route watch when the routes were replaced, e.g. by opening another file"""
+        monitor = self.route_monitor
+        if monitor is None or monitor.snapshot is None or self.route_load is not None:
+            return
+        if self.monitor_routes is self.routes["routes"]:
+            return
+        self.monitor_routes = self.routes["routes"]
+        self.saved_route_watch = SavedRouteWatch(self.monitor_routes)
+        self.saved_route_watch.set_snapshot(monitor.snapshot)
+        self.monitor_disappeared = set()
+        self.show_missing_routes()
+    
+    def add_monitor_lines(self, lines):
+        """Append (text, tag) lines to the monitor's change list, keeping it bounded"""
+        for text, tag in lines:
+            if tag:
+                self.monitor_changes.insert(tk.END, text + "\n", tag)
+            else:
+                self.monitor_changes.insert(tk.END, text + "\n")
+        line_count = int(self.monitor_changes.index("end-1c").split(".")[0]) - 1
+        if line_count > MONITOR_MAX_LINES:
+            self.monitor_changes.delete("1.0", f"{line_count - MONITOR_MAX_LINES + 1}.0")
+        self.monitor_changes.see(tk.END)
+    
+    def show_missing_routes(self):
+        """List saved routes missing from the system table, those that disappeared while watching first"""
+        watch = self.saved_route_watch
+        if watch is None or self.monitor_window is None:
+            return
+        routes = self.routes["routes"]
+        disappeared = sorted(self.monitor_disappeared & watch.missing)
+        never = sorted(watch.missing - self.monitor_disappeared)
+        self.monitor_missing_frame.config(text=f"Saved routes missing from the system table: {len(watch.missing)}"
+                                               f" ({len(disappeared)} disappeared while watching)")
+        self.monitor_missing.delete("1.0", tk.END)
+        shown = 0
+        for names, tag in ((disappeared, "disappeared"), (never, "never")):
+            for route_name in names[:MONITOR_MAX_MISSING - shown]:
+                details = routes.get(route_name, {})
+                self.monitor_missing.insert(tk.END, f"{route_name}: {route_cidr(details)} via "
+                                                    f"{details.get('gateway', '')}\n", tag)
+            shown += min(len(names), MONITOR_MAX_MISSING - shown)
+        if len(watch.missing) > shown:
+            self.monitor_missing.insert(tk.END, f"... and {len(watch.missing) - shown} more\n", "never")
+    
+    def show_performance_view(self):
+        """Open the performance view with the timings of the instrumented operations"""
+        if self.performance_window is not None:
+            self.performance_window.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Performance")
+        dialog.geometry("760x480")
+        dialog.protocol("WM_DELETE_WINDOW", self.close_performance_view)
+        self.performance_window = dialog
+        
+        controls = ttk.Frame(dialog)
+        controls.pack(fill=tk.X, padx=10, pady=(10, 5))
+        self.metrics_enabled_var = tk.BooleanVar(value=metrics.enabled)
+        ttk.Checkbutton(controls, text="Enable Instrumentation", variable=self.metrics_enabled_var,
+                        command=self.toggle_metrics).pack(side=tk.LEFT)
+        self.profile_button = ttk.Button(controls, text="Stop Profiling" if metrics.profiling else "Start Profiling",
+                                         command=self.toggle_profile)
+        self.profile_button.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(controls, text="Reset", command=self.reset_metrics).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(controls, text="Export...", command=self.export_metrics).pack(side=tk.RIGHT)
+        
+        timers_frame = ttk.LabelFrame(dialog, text="Timings", padding=5)
+        timers_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        columns = ("calls", "total", "mean", "p50", "p95", "max")
+        self.performance_timers = ttk.Treeview(timers_frame, columns=columns, height=10)
+        self.performance_timers.heading("#0", text="Operation")
+        self.performance_timers.column("#0", width=200)
+        for column, heading in zip(columns, ("Calls", "Total (s)", "Mean (ms)", "p50 (ms)", "p95 (ms)", "Max (ms)")):
+            self.performance_timers.heading(column, text=heading)
+            self.performance_timers.column(column, width=80, anchor=tk.E)
+        self.performance_timers.pack(fill=tk.BOTH, expand=True)
+        
+        counters_frame = ttk.LabelFrame(dialog, text="Counters", padding=5)
+        counters_frame.pack(fill=tk.BOTH, padx=10, pady=(5, 10))
+        self.performance_counters = ttk.Treeview(counters_frame, columns=("count",), height=4)
+        self.performance_counters.heading("#0", text="Event")
+        self.performance_counters.column("#0", width=200)
+        self.performance_counters.heading("count", text="Count")
+        self.performance_counters.column("count", width=100, anchor=tk.E)
+        self.performance_counters.pack(fill=tk.BOTH, expand=True)
+        
+        self.refresh_performance_view()
+    
+    def refresh_performance_view(self):
+        """Show the current timings, and come back while the window is open"""
+        self.performance_job = None
+        if self.performance_window is None:
+            return
+        snapshot = metrics.snapshot()
+        self.performance_timers.delete(*self.performance_timers.get_children())
+        for name, timer in snapshot["timers"].items():
+            self.performance_timers.insert("", tk.END, text=name, values=(
+                timer["count"], f"{timer['total_s']:.3f}", f"{timer['mean_s'] * 1000:.2f}",
+                f"{timer['p50_s'] * 1000:.2f}", f"{timer['p95_s'] * 1000:.2f}", f"{timer['max_s'] * 1000:.2f}"))
+        self.performance_counters.delete(*self.performance_counters.get_children())
+        for name, count in snapshot["counters"].items():
+            self.performance_counters.insert("", tk.END, text=name, values=(count,))
+        self.performance_job = self.root.after(PERFORMANCE_REFRESH_MS, self.refresh_performance_view)
+    
+    def close_performance_view(self):
+        """Close the performance view; instrumentation and profiling keep their state"""
+        if self.performance_window is None:
+            return
+        if self.performance_job is not None:
+            self.root.after_cancel(self.performance_job)
+            self.performance_job = None
+        self.performance_window.destroy()
+        self.performance_window = None
+    
+    def toggle_metrics(self):
+        """Turn the timing instrumentation on or off"""
+        metrics.enabled = self.metrics_enabled_var.get()
+        self.log(f"Performance instrumentation {'enabled' if metrics.enabled else 'disabled'}")
+    
+    def reset_metrics(self):
+        """Forget the timings collected so far"""
+        metrics.reset()
+        if self.performance_job is not None:
+            self.root.after_cancel(self.performance_job)
+        self.refresh_performance_view()
+    
+    def toggle_profile(self):
+        """Start a cProfile capture, or stop it and show its report in the console"""
+        if not metrics.profiling:
+            metrics.start_profile()
+            self.profile_button.config(text="Stop Profiling")
+            self.log("Profiling started; use the application, then stop profiling to see the report")
+            return
+        report = metrics.stop_profile()
+        self.profile_button.config(text="Start Profiling")
+        self.console_log.write(["=== PROFILE (top functions by cumulative time) ===", ""] + report.splitlines())
+        self.log("Profiling stopped; report shown in console")
+    
+    def export_metrics(self):
+        """Save the timings as a Prometheus text file (.prom) or JSON"""
+        file_path = filedialog.asksaveasfilename(
+            title="Export Performance Metrics",
+            defaultextension=".prom",
+            filetypes=[("Prometheus text files", "*.prom"), ("JSON files", "*.json"), ("All files", "*.*")],
+            initialdir=os.path.dirname(os.path.abspath(self.routes_file)),
+            parent=self.performance_window
+        )
+        if not file_path:
+            return
+        try:
+            metrics.export(file_path)
+            self.log(f"Performance metrics exported to {file_path}")
+        except OSError as e:
+            self.log(f"Error exporting performance metrics to {file_path}: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"Failed to export performance metrics: {str(e)}",
+                                 parent=self.performance_window)
 
 if __name__ == "__main__":
     root = tk.Tk()
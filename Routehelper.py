@@ -0,0 +1,348 @@
+"""Long-lived elevated helper that runs route commands for the GUI.
+
+Usage: python Routehelper.py --port PORT --token TOKEN [--backend NAME]
+
+The GUI listens on a loopback port and starts this helper once, elevated; the
+helper connects back and then runs route operations for as long as the GUI
+keeps the connection open, so an action costs one message instead of a
+PowerShell launch and a UAC prompt. Messages are JSON objects, one per line:
+
+  GUI -> helper  {"id": 1, "op": "route", "action": "add", "ip": ..., "mask": ..., "gateway": ...}
+                 {"id": 2, "op": "print"}
+  helper -> GUI  {"type": "hello", "token": ..., "pid": ..., "backend": ...}    (once, first)
+                 {"id": 1, "type": "output", "line": "..."}                      (any number)
+                 {"id": 1, "type": "result", "exit_code": 0}                     (one per request)
+
+Requests are run one after another in the order they arrive, on one of the
+Routebackend backends. The GUI keeps up to HELPER_WINDOW requests in flight
+and sends more as results come back. Only route add/change/delete/print is
+accepted, with each address checked first, so the elevated process never
+runs an arbitrary command line. With --backend fake an in-memory table
+stands in for the system one, which lets the protocol be exercised on any
+platform.
+
+Backends that need no elevation are run in the GUI's own process by
+LocalRouteRunner, which takes the same jobs and reports the same events.
+"""
+import argparse
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from Routebackend import BACKENDS, check_operation, create_backend
+from Routemetrics import metrics
+
+HELPER_HOST = "127.0.0.1"
+HELPER_CONNECT_TIMEOUT = 60  # Seconds allowed for the UAC prompt and helper start
+# Requests sent ahead of their results; more are sent as results come back. Sending a whole job
+# up front fills the socket buffers both ways, and then both sides block writing.
+HELPER_WINDOW = 64
+
+class HelperError(Exception):
+    """The helper could not be started or stopped answering"""
+
+def serve(connection, token, backend):
+    """Answer requests on a connected socket until the GUI closes it"""
+    # Every message is a small write answered by the other side; Nagle's algorithm would hold each one back
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    reader = connection.makefile("r", encoding="utf-8", newline="\n")
+    writer = connection.makefile("w", encoding="utf-8", newline="\n")
+    
+    def send(message):
+        writer.write(json.dumps(message) + "\n")
+        writer.flush()
+    
+    send({"type": "hello", "token": token, "pid": os.getpid(), "backend": backend.name})
+    for line in reader:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            request_id = request["id"]
+        except (ValueError, TypeError, KeyError):
+            send({"type": "error", "message": "malformed request"})
+            continue
+        if request.get("op") == "shutdown":
+            send({"id": request_id, "type": "result", "exit_code": 0})
+            break
+        
+        def emit(output):
+            send({"id": request_id, "type": "output", "line": output})
+        
+        try:
+            if request.get("op") == "print":
+                exit_code = backend.print_table(emit)
+            elif request.get("op") == "route":
+                operation = check_operation(request)
+                exit_code = backend.apply(operation["action"], operation, emit)
+            else:
+                raise ValueError(f"unsupported request: {request.get('op')}")
+        except (OSError, ValueError) as e:
+            send({"id": request_id, "type": "result", "exit_code": None, "error": str(e)})
+            continue
+        send({"id": request_id, "type": "result", "exit_code": exit_code})
+
+def helper_command(port, token, backend_name):
+    """The command line that starts the helper and connects it to port"""
+    return [sys.executable, os.path.abspath(__file__), "--port", str(port), "--token", token,
+            "--backend", backend_name]
+
+def helper_launcher(backend_name, elevate=True):
+    """Return a launch(port, token) function that starts the helper for a backend
+    
+    Elevation uses a UAC prompt through PowerShell on Windows and pkexec
+    elsewhere. The returned process exits with an error if elevation is
+    declined.
+    """
+    def launch(port, token):
+        command = helper_command(port, token, backend_name)
+        if not elevate:
+            return subprocess.Popen(command)
+        if os.name != "nt":
+            return subprocess.Popen(["pkexec"] + command)
+        
+        def quote(text):
+            return "'" + text.replace("'", "''") + "'"
+        
+        script = (f"Start-Process -FilePath {quote(command[0])} "
+                  f"-ArgumentList {quote(subprocess.list2cmdline(command[1:]))} -Verb RunAs -WindowStyle Hidden")
+        return subprocess.Popen(["powershell", "-NoProfile", "-NonInteractive", "-Command", script])
+    
+    return launch
+
+class RouteHelperClient:
+    """The GUI side of the helper: starts it on first use and queues operations for it
+    
+    Jobs run on one worker thread in the order they were submitted. Each
+    operation is a routes file style dict with an "action", or {"op": "print"}.
+    on_event is called on the worker thread with dicts of these types:
+      status - {"message"} progress while the helper is being started
+      output - {"index", "line"} a line printed by the operation at index
+      result - {"index", "exit_code", "error"} exit_code None means not run
+      done   - after the job's last result, including when the helper failed
+    """
+    
+    def __init__(self, launch, connect_timeout=HELPER_CONNECT_TIMEOUT):
+        self.launch = launch
+        self.connect_timeout = connect_timeout
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.connection = None
+        self.reader = None
+        self.backend = None
+        self.next_id = 0
+    
+    def submit(self, operations, on_event):
+        """Queue a list of operations for the helper"""
+        self.jobs.put((list(operations), on_event))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+    
+    def close(self):
+        """Ask the helper to exit once queued jobs are done"""
+        if self.thread is not None:
+            self.jobs.put(None)
+    
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            operations, on_event = job
+            results = [None] * len(operations)
+            try:
+                if self.connection is None:
+                    on_event({"type": "status", "message": "Starting elevated route helper..."})
+                    with metrics.timer("helper_start"):
+                        self._connect()
+                    on_event({"type": "status", "message": f"Route helper ready (backend: {self.backend})"})
+                with metrics.timer("helper_job"):
+                    self._run_job(operations, results, on_event)
+            except (OSError, ValueError, HelperError) as e:
+                self._disconnect()
+                on_event({"type": "status", "message": f"Route helper failed: {str(e)}", "error": True})
+                for index, result in enumerate(results):
+                    if result is None:
+                        on_event({"type": "result", "index": index, "exit_code": None, "error": None})
+            on_event({"type": "done"})
+        if self.connection is not None:
+            try:
+                self._send({"id": 0, "op": "shutdown"})
+            except OSError:
+                pass
+            self._disconnect()
+    
+    def _connect(self):
+        token = secrets.token_hex(16)
+        with socket.create_server((HELPER_HOST, 0)) as listener:
+            listener.settimeout(0.5)
+            launcher = self.launch(listener.getsockname()[1], token)
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    connection, _ = listener.accept()
+                except socket.timeout:
+                    # The launcher exits with an error when the UAC prompt is declined
+                    if launcher is not None and launcher.poll() not in (None, 0):
+                        raise HelperError("elevation was cancelled or the helper failed to start")
+                    if time.monotonic() > deadline:
+                        raise HelperError("timed out waiting for the helper to connect")
+                    continue
+                connection.settimeout(None)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                reader = connection.makefile("r", encoding="utf-8", newline="\n")
+                try:
+                    hello = json.loads(reader.readline() or "null")
+                except ValueError:
+                    hello = None
+                # Anything local can connect to the port; only the helper knows the token
+                if isinstance(hello, dict) and hmac.compare_digest(str(hello.get("token", "")), token):
+                    break
+                reader.close()
+                connection.close()
+        self.connection = connection
+        self.reader = reader
+        self.backend = hello.get("backend")
+    
+    def _disconnect(self):
+        if self.connection is not None:
+            self.reader.close()
+            self.connection.close()
+        self.connection = None
+        self.reader = None
+    
+    def _send(self, message):
+        self.connection.sendall((json.dumps(message) + "\n").encode("utf-8"))
+    
+    def _request(self, operation):
+        self.next_id += 1
+        if operation.get("op") == "print":
+            return {"id": self.next_id, "op": "print"}
+        return {"id": self.next_id, "op": "route", "action": operation["action"], "ip": operation.get("ip", ""),
+                "mask": operation.get("mask", ""), "gateway": operation.get("gateway", "")}
+    
+    def _run_job(self, operations, results, on_event):
+        # Keep a window of requests queued at the helper, so it runs them back to back
+        ids = {}
+        sent = 0
+        remaining = len(operations)
+        while remaining:
+            while sent < len(operations) and sent - (len(operations) - remaining) < HELPER_WINDOW:
+                request = self._request(operations[sent])
+                ids[request["id"]] = sent
+                self._send(request)
+                sent += 1
+            line = self.reader.readline()
+            if not line:
+                raise HelperError("the helper exited")
+            message = json.loads(line)
+            index = ids.get(message.get("id"))
+            if index is None:
+                continue
+            if message.get("type") == "output":
+                on_event({"type": "output", "index": index, "line": message.get("line", "")})
+            elif message.get("type") == "result":
+                results[index] = message
+                remaining -= 1
+                on_event({"type": "result", "index": index, "exit_code": message.get("exit_code"),
+                          "error": message.get("error")})
+
+class LocalRouteRunner:
+    """Runs jobs on a backend in this process, for backends that need no elevation
+    
+    Takes the same jobs and reports the same events as RouteHelperClient.
+    Consecutive route operations go to the backend as one batch.
+    """
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self.jobs = queue.Queue()
+        self.thread = None
+    
+    def submit(self, operations, on_event):
+        """Queue a list of operations for the backend"""
+        self.jobs.put((list(operations), on_event))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+    
+    def close(self):
+        """Stop the worker once queued jobs are done"""
+        if self.thread is not None:
+            self.jobs.put(None)
+    
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            operations, on_event = job
+            index = 0
+            while index < len(operations):
+                if operations[index].get("op") == "print":
+                    self._print(index, on_event)
+                    index += 1
+                    continue
+                end = index
+                while end < len(operations) and operations[end].get("op") != "print":
+                    end += 1
+                self._apply(operations[index:end], index, on_event)
+                index = end
+            on_event({"type": "done"})
+    
+    def _print(self, index, on_event):
+        try:
+            exit_code = self.backend.print_table(lambda line: on_event({"type": "output", "index": index,
+                                                                        "line": line}))
+            on_event({"type": "result", "index": index, "exit_code": exit_code, "error": None})
+        except OSError as e:
+            on_event({"type": "result", "index": index, "exit_code": None, "error": str(e)})
+    
+    def _apply(self, operations, offset, on_event):
+        runnable = []
+        for index, operation in enumerate(operations, offset):
+            try:
+                runnable.append((index, check_operation(operation)))
+            except ValueError as e:
+                on_event({"type": "result", "index": index, "exit_code": None, "error": str(e)})
+        
+        def emit(position, line):
+            on_event({"type": "output", "index": runnable[position][0], "line": line})
+        
+        try:
+            with metrics.timer("backend_batch"):
+                exit_codes = self.backend.apply_batch([operation for index, operation in runnable], emit)
+            errors = [None] * len(runnable)
+        except OSError as e:
+            exit_codes = [None] * len(runnable)
+            errors = [str(e)] * len(runnable)
+        for (index, operation), exit_code, error in zip(runnable, exit_codes, errors):
+            on_event({"type": "result", "index": index, "exit_code": exit_code, "error": error})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="Routehelper.py",
+                                     description="Run route commands for the Routing Table Manager.")
+    parser.add_argument("--port", type=int, required=True, help="loopback port the GUI listens on")
+    parser.add_argument("--token", required=True, help="token proving the helper to the GUI")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="routing table backend (default: the platform's)")
+    args = parser.parse_args(argv)
+    
+    backend = create_backend(args.backend)
+    with socket.create_connection((HELPER_HOST, args.port)) as connection:
+        try:
+            serve(connection, args.token, backend)
+        except ConnectionError:
+            # The GUI went away without a shutdown request; there is no one left to report to
+            pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Timing instrumentation for the slow paths of the Routing Table Manager.
+
+Code marks an operation with the timed decorator or a metrics.timer block
+and counts events with metrics.count. Every timer keeps a call count, the
+total and largest time and a latency histogram over LATENCY_BUCKETS. Metrics
+are off unless ROUTES_METRICS is set or the GUI's Performance view turns
+them on; while off, timed functions cost one flag check, timer() hands back
+a shared no-op context and count() returns at once.
+
+Snapshots export as JSON or as a Prometheus text file (histogram and counter
+families, suitable for the node_exporter textfile collector). A cProfile
+capture can be started and stopped on demand; it profiles the thread that
+started it, i.e. the Tk thread in the GUI.
+"""
+import bisect
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+
+# Upper bounds, in seconds, of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus metric family names
+PROMETHEUS_PREFIX = "routes"
+
+class _NullTimer:
+    """What timer() returns while metrics are disabled"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Histogram:
+    """Call count, total and maximum time and per-bucket counts of one timer"""
+    
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in, capped at the maximum"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+    
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "p50_s": self.quantile(0.5),
+            "p95_s": self.quantile(0.95),
+            "max_s": self.max,
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.buckets)},
+            "overflow": self.buckets[-1],
+        }
+
+class Metrics:
+    """Named timers and counters, safe to update from any thread"""
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+        self.started = time.time()
+        self.profiler = None
+        self.lock = threading.Lock()
+    
+    def timer(self, name):
+        """A context manager recording the time spent in its block under name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+    
+    def record(self, name, seconds):
+        """Record one timing measured elsewhere"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.timers.get(name)
+            if histogram is None:
+                histogram = self.timers[name] = Histogram()
+            histogram.observe(seconds)
+    
+    def count(self, name, amount=1):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def timed_lines(self, name, lines):
+        """Wrap an iterable so the time until it is exhausted is recorded under name
+        
+        Lines produced are counted as name + "_lines".
+        """
+        if not self.enabled:
+            return lines
+        
+        def wrapped():
+            start = time.perf_counter()
+            count = 0
+            try:
+                for line in lines:
+                    count += 1
+                    yield line
+            finally:
+                self.record(name, time.perf_counter() - start)
+                self.count(f"{name}_lines", count)
+        
+        return wrapped()
+    
+    def reset(self):
+        """Forget all timings and counts"""
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+            self.started = time.time()
+    
+    def snapshot(self):
+        """A JSON-ready copy of the current timers and counters"""
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "started": self.started,
+                "time": time.time(),
+                "timers": {name: histogram.as_dict() for name, histogram in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+    
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self.lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+        lines = [f"# HELP {PROMETHEUS_PREFIX}_operation_seconds Time spent in instrumented operations.",
+                 f"# TYPE {PROMETHEUS_PREFIX}_operation_seconds histogram"]
+        for name, histogram in timers:
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.buckets):
+                cumulative += count
+                lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_bucket{{operation="{name}",le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_bucket{{operation="{name}",le="+Inf"}} '
+                         f'{histogram.count}')
+            lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_sum{{operation="{name}"}} {histogram.total!r}')
+            lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_count{{operation="{name}"}} {histogram.count}')
+        lines += [f"# HELP {PROMETHEUS_PREFIX}_events_total Counted events.",
+                  f"# TYPE {PROMETHEUS_PREFIX}_events_total counter"]
+        for name, count in counters:
+            lines.append(f'{PROMETHEUS_PREFIX}_events_total{{event="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+    
+    def export(self, file_path):
+        """Write the metrics to file_path, as Prometheus text for .prom files and JSON otherwise
+        
+        The file is written next to its destination and renamed into place,
+        so a collector never reads it half written.
+        """
+        if file_path.lower().endswith(".prom"):
+            text = self.prometheus_text()
+        else:
+            text = json.dumps(self.snapshot(), indent=4)
+        directory = os.path.dirname(os.path.abspath(file_path))
+        temp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(temp_path, "w") as file:
+                file.write(text)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    @property
+    def profiling(self):
+        return self.profiler is not None
+    
+    def start_profile(self):
+        """Start a cProfile capture on the calling thread"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+    
+    def stop_profile(self, limit=30, file_path=None):
+        """Stop the capture and return its report, the top functions by cumulative time
+        
+        With file_path the raw profile is also saved, for pstats or snakeviz.
+        """
+        profiler = self.profiler
+        if profiler is None:
+            return ""
+        profiler.disable()
+        self.profiler = None
+        if file_path:
+            profiler.dump_stats(file_path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+metrics = Metrics(enabled=bool(os.environ.get("ROUTES_METRICS")))
+
+def timed(name):
+    """Decorator recording each call of a function under name while metrics are enabled"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
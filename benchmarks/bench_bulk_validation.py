@@ -0,0 +1,85 @@
+"""Compare bulk route validation against per-route validation with ipaddress objects.
+
+The per-route baseline is a copy of the form's original validation, one
+ipaddress object per field, kept here so the comparison does not depend on
+the GUI (or tkinter) and does not pick up later changes to the form.
+
+Usage: python benchmarks/bench_bulk_validation.py [route_count]
+"""
+import ipaddress
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_generators import generate_routes
+from Routecore import load_numpy, validate_routes_bulk
+
+def is_valid_ip(ip_str):
+    try:
+        ipaddress.IPv4Address(ip_str)
+        return True
+    except ValueError:
+        return False
+
+def is_valid_mask(mask_str):
+    try:
+        binary = bin(int(ipaddress.IPv4Address(mask_str)))[2:].zfill(32)
+        return '01' not in binary
+    except ValueError:
+        return False
+
+def get_network_info(ip_str, mask_str):
+    try:
+        ip = ipaddress.IPv4Address(ip_str)
+        prefix_length = bin(int(ipaddress.IPv4Address(mask_str)))[2:].zfill(32).count('1')
+        network = ipaddress.IPv4Network(f"{ip}/{prefix_length}", strict=False)
+        return {
+            "network_address": str(network.network_address),
+            "broadcast": str(network.broadcast_address),
+            "first_host": str(network.network_address + 1),
+            "last_host": str(network.broadcast_address - 1),
+            "num_hosts": network.num_addresses - 2,
+            "prefix_length": prefix_length,
+            "cidr": f"{network.network_address}/{prefix_length}",
+            "route_ip_correct": ip == network.network_address,
+        }
+    except Exception:
+        return None
+
+def validate_per_route(routes):
+    """Validate routes one at a time, as the form did before bulk validation"""
+    results = []
+    for name, details in routes.items():
+        ip_ok = is_valid_ip(details["ip"])
+        mask_ok = is_valid_ip(details["mask"]) and is_valid_mask(details["mask"])
+        gateway_ok = is_valid_ip(details["gateway"])
+        info = get_network_info(details["ip"], details["mask"]) if ip_ok and mask_ok else None
+        results.append((name, ip_ok, mask_ok, gateway_ok, info))
+    return results
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    routes = generate_routes(count)
+    print(f"Validating {count} routes")
+    
+    baseline = timed(validate_per_route, routes)
+    print(f"  per-route objects : {baseline:8.3f} s")
+    
+    python_bulk = timed(validate_routes_bulk, routes, use_numpy=False)
+    print(f"  bulk (pure Python): {python_bulk:8.3f} s  ({baseline / python_bulk:5.1f}x)")
+    
+    if load_numpy() is not None:
+        numpy_bulk = timed(validate_routes_bulk, routes, use_numpy=True)
+        print(f"  bulk (NumPy)      : {numpy_bulk:8.3f} s  ({baseline / numpy_bulk:5.1f}x)")
+    else:
+        print("  bulk (NumPy)      : skipped, NumPy is not installed")
+
+if __name__ == "__main__":
+    main()
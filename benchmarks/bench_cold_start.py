@@ -0,0 +1,52 @@
+"""Compare cold start of the command line tool with the GUI.
+
+Each case runs in a fresh interpreter, so imports are paid every time.
+
+Usage: python benchmarks/bench_cold_start.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("CLI: info --ip", [os.path.join(ROOT, "Routecli.py"), "info", "--ip", "10.1.2.0/24"]),
+    ("CLI: import Routecore", ["-c", "import Routecore"]),
+    ("GUI: import Routegui", ["-c", "import Routegui"]),
+    ("GUI: open main window", ["-c", "import tkinter, Routegui\n"
+                                     "root = tkinter.Tk()\n"
+                                     "Routegui.RouteManagerApp(root)\n"
+                                     "root.update()\n"
+                                     "root.destroy()"]),
+]
+
+def run_case(args, runs, work_dir):
+    """Return the median wall time of running the interpreter with args, or None if it fails"""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=work_dir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None
+    return statistics.median(times)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"Median of {runs} cold starts")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, args in CASES:
+            elapsed = run_case(args, runs, work_dir)
+            if elapsed is None:
+                print(f"  {label:24}: skipped (failed, e.g. no display)")
+            else:
+                print(f"  {label:24}: {elapsed * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
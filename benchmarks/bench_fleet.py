@@ -0,0 +1,57 @@
+"""Time a fleet rollout against loopback route agents with simulated latencies.
+
+Starts HOSTS agents on the fake backend in this process, each with its own
+per-operation latency, and pushes the same routes to all of them. With
+enough concurrency the rollout takes about as long as the slowest host;
+--concurrency 1 shows the one-host-at-a-time time for comparison.
+
+Usage: python benchmarks/bench_fleet.py [--hosts 50] [--routes 200] [--concurrency 16]
+                                        [--max-latency 0.005] [--seed 1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_generators import generate_routes
+from Routebackend import create_backend
+from Routefleet import push_to_fleet, start_agent
+
+TOKEN = "bench"
+
+async def rollout(args):
+    rng = random.Random(args.seed)
+    latencies = [rng.uniform(0, args.max_latency) for _ in range(args.hosts)]
+    servers = [await start_agent("127.0.0.1", 0, TOKEN, create_backend("fake"), latency) for latency in latencies]
+    addresses = [server.sockets[0].getsockname()[:2] for server in servers]
+    routes = generate_routes(args.routes, args.seed, invalid=0)
+    operations = [dict(details, action="add") for details in routes.values()]
+    
+    started = time.perf_counter()
+    reports = await push_to_fleet(addresses, TOKEN, operations, lambda event: None, concurrency=args.concurrency)
+    total = time.perf_counter() - started
+    for server in servers:
+        server.close()
+    
+    seconds = [report["seconds"] for report in reports]
+    failed = sum(1 for report in reports if report["state"] != "done" or report["failed"])
+    print(f"{args.hosts} hosts x {len(operations)} routes, {args.concurrency} at once: {total:.2f} s "
+          f"({failed} hosts failed)")
+    print(f"  slowest host {max(seconds):.2f} s, sum over hosts {sum(seconds):.2f} s, "
+          f"simulated latency {max(latencies) * len(operations):.2f} s at most")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a fleet rollout against loopback agents.")
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-latency", type=float, default=0.005, help="largest per-operation latency of a host")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(rollout(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Time the routes operations on synthetic route sets and record the results as JSON.
+
+Runs headless: only Routecore is needed. The route browser case also needs
+tkinter to import (no display), and is skipped without it. The 1m size
+takes a few minutes and about 1.5 GB of memory.
+
+Usage: python benchmarks/bench_suite.py [--sizes 1k,100k,1m] [--cases a,b] [--runs N]
+                                        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from route_generators import generate_routes, parse_size, route_set_digest, size_label
+from Routecore import (
+    CompactRouteTable, RouteIndex, RoutesFileReader, SqliteRouteStore, build_route_command, compute_network_info, is_valid_ip,
+    is_valid_mask, load_numpy, read_routes_file, validate_routes_bulk, write_json_atomic,
+)
+
+RESULTS_VERSION = 1
+
+def validate_form(routes, work_dir):
+    """Per-route validation, as the form does it for one route"""
+    for details in routes.values():
+        is_valid_ip(details["ip"])
+        is_valid_ip(details["mask"]) and is_valid_mask(details["mask"])
+        is_valid_ip(details["gateway"])
+
+def validate_bulk(routes, work_dir):
+    validate_routes_bulk(routes)
+
+def validate_bulk_python(routes, work_dir):
+    validate_routes_bulk(routes, use_numpy=False)
+
+def subnet_info(routes, work_dir):
+    """Subnet details for every route, with the cache cold as after opening a file"""
+    compute_network_info.cache_clear()
+    for details in routes.values():
+        compute_network_info(details["ip"], details["mask"])
+
+def route_commands(routes, work_dir):
+    for details in routes.values():
+        build_route_command("add", details)
+
+def save_json(routes, work_dir):
+    write_json_atomic({"routes": routes}, os.path.join(work_dir, "routes.json"))
+
+def load_json(routes, work_dir):
+    read_routes_file(os.path.join(work_dir, "routes.json"))
+
+def load_streaming(routes, work_dir):
+    """The incremental reader behind the GUI's background load"""
+    with open(os.path.join(work_dir, "routes.json"), "rb") as file:
+        for route in RoutesFileReader(file):
+            pass
+
+def load_compact(routes, work_dir):
+    """Streaming into the packed table the GUI loads JSON files into"""
+    CompactRouteTable.read(os.path.join(work_dir, "routes.json"))
+
+def save_sqlite(routes, work_dir):
+    SqliteRouteStore.create(os.path.join(work_dir, "routes.db"), routes)
+
+def build_index(routes, work_dir):
+    RouteIndex(routes)
+
+def route_browser(routes, work_dir):
+    """Sorting and indexing the route list, then a narrowing name filter"""
+    source = ListRouteSource(routes, lambda: None)
+    for text in ("r", "ro", "route_00"):
+        source.set_filter("Name", text)
+
+# Cases run in this order; save_json writes the file the load cases read
+CASES = [
+    ("validate_form", validate_form),
+    ("validate_bulk", validate_bulk),
+    ("validate_bulk_python", validate_bulk_python),
+    ("subnet_info", subnet_info),
+    ("route_commands", route_commands),
+    ("save_json", save_json),
+    ("load_json", load_json),
+    ("load_streaming", load_streaming),
+    ("load_compact", load_compact),
+    ("save_sqlite", save_sqlite),
+    ("build_index", build_index),
+    ("route_browser", route_browser),
+]
+
+try:
+    from Routegui import ListRouteSource
+except ImportError:
+    ListRouteSource = None
+
+def skip_reason(case):
+    """Why a case cannot run here, or None"""
+    if case == "route_browser" and ListRouteSource is None:
+        return "tkinter is not available"
+    if case == "validate_bulk" and load_numpy() is None:
+        return "NumPy is not installed"
+    return None
+
+def default_runs(count):
+    """Fewer repetitions for bigger sets, so the whole suite stays within minutes"""
+    if count <= 10000:
+        return 10
+    if count <= 200000:
+        return 3
+    return 1
+
+def time_case(function, routes, work_dir, runs):
+    """Return the wall times of runs calls, with the collector settled before each"""
+    times = []
+    for _ in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        function(routes, work_dir)
+        times.append(time.perf_counter() - start)
+    return times
+
+def environment():
+    """What the results were measured on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    numpy = load_numpy()
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "commit": commit,
+    }
+
+def compare(results, baseline_path):
+    """Print each case's median against the same case and size in a baseline results file"""
+    with open(baseline_path, "r") as file:
+        baseline = {(entry["case"], entry["size"]): entry for entry in json.load(file)["results"]}
+    print(f"\nCompared with {baseline_path} (ratio < 1 is faster)")
+    for entry in results:
+        old = baseline.get((entry["case"], entry["size"]))
+        if old is None or "median_s" not in old or "median_s" not in entry:
+            continue
+        if old["digest"] != entry["digest"]:
+            note = "  (different route data)"
+        else:
+            note = ""
+        ratio = entry["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        print(f"  {entry['case']:22} {size_label(entry['size']):>5}: {old['median_s']:9.4f} s -> "
+              f"{entry['median_s']:9.4f} s  x{ratio:5.2f}{note}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routes operations on synthetic route sets.")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="comma-separated sizes (default: 1k,100k,1m)")
+    parser.add_argument("--cases", help=f"comma-separated cases (default: all of {', '.join(n for n, f in CASES)})")
+    parser.add_argument("--runs", type=int, help="repetitions per case (default: by size)")
+    parser.add_argument("--seed", type=int, default=1, help="route generator seed")
+    parser.add_argument("--output", default="bench_results.json", help="results file (default: bench_results.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file to compare with")
+    args = parser.parse_args()
+    
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(",")]
+    except ValueError as e:
+        parser.error(str(e))
+    names = args.cases.split(",") if args.cases else [name for name, function in CASES]
+    unknown = set(names) - {name for name, function in CASES}
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    
+    report = {"version": RESULTS_VERSION, "started": datetime.datetime.now().isoformat(timespec="seconds"),
+              "environment": environment(), "seed": args.seed, "results": []}
+    for count in sizes:
+        routes = generate_routes(count, args.seed)
+        digest = route_set_digest(routes)
+        runs = args.runs or default_runs(count)
+        print(f"{size_label(count)} routes (digest {digest}), {runs} runs per case")
+        with tempfile.TemporaryDirectory() as work_dir:
+            # The load cases read the file that save_json writes
+            if "save_json" not in names and ({"load_json", "load_streaming", "load_compact"} & set(names)):
+                save_json(routes, work_dir)
+            for name, function in CASES:
+                if name not in names:
+                    continue
+                entry = {"case": name, "size": count, "digest": digest}
+                reason = skip_reason(name)
+                if reason:
+                    entry["skipped"] = reason
+                    print(f"  {name:22}: skipped, {reason}")
+                else:
+                    times = time_case(function, routes, work_dir, runs)
+                    entry.update(runs=runs, median_s=statistics.median(times), min_s=min(times),
+                                 max_s=max(times), per_route_us=statistics.median(times) / count * 1e6)
+                    print(f"  {name:22}: {entry['median_s']:9.4f} s  ({entry['per_route_us']:7.2f} us/route)")
+                report["results"].append(entry)
+        del routes
+    
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(report["results"], args.compare)
+
+if __name__ == "__main__":
+    main()
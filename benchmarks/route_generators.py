@@ -0,0 +1,102 @@
+"""Deterministic synthetic route sets for the benchmarks.
+
+The same size and seed always give the same routes, on any platform and
+Python version, so timings from different runs and machines compare like for
+like; route_set_digest fingerprints a set for the results file.
+
+Usage: python benchmarks/route_generators.py SIZE OUTPUT [--seed N]
+       SIZE is a count or one of 1k, 100k, 1m; OUTPUT ends in .json or .db
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+
+# Prefix lengths weighted roughly like an enterprise routes file: mostly /24
+# and longer, some host routes, a few wide summaries
+PREFIX_WEIGHTS = [(8, 1), (12, 1), (16, 4), (20, 4), (22, 6), (23, 6), (24, 40), (25, 6), (26, 6),
+                  (27, 6), (28, 6), (29, 4), (30, 4), (32, 6)]
+
+def parse_size(text):
+    """Turn "1k", "100k", "1m" or a plain count into a number of routes"""
+    text = text.lower()
+    if text in SIZES:
+        return SIZES[text]
+    if text.isdigit() and int(text) > 0:
+        return int(text)
+    raise ValueError(f"invalid size: {text} (use a count or one of {', '.join(SIZES)})")
+
+def size_label(count):
+    """The short label for a count, e.g. 100000 -> "100k\""""
+    for label, size in SIZES.items():
+        if size == count:
+            return label
+    return str(count)
+
+def dotted(value):
+    return f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+def generate_routes(count, seed=1, misaligned=0.1, invalid=0.01, gateways=64):
+    """Generate a routes dict of count routes
+    
+    Prefix lengths follow PREFIX_WEIGHTS. A fraction of routes use an IP
+    inside the network instead of the network address (misaligned), a small
+    fraction have a non-contiguous mask or an out-of-range octet (invalid),
+    and switch addresses are shared: they are drawn from a pool of gateways
+    with a skewed distribution, so a few carry most routes, as in practice.
+    """
+    rng = random.Random(seed)
+    lengths, weights = zip(*PREFIX_WEIGHTS)
+    pool = [f"10.255.{index // 254}.{index % 254 + 1}" for index in range(gateways)]
+    pool_weights = [1 / (rank + 1) for rank in range(gateways)]
+    prefix_lengths = rng.choices(lengths, weights, k=count)
+    switches = rng.choices(pool, pool_weights, k=count)
+    
+    routes = {}
+    for index in range(count):
+        prefix_length = prefix_lengths[index]
+        mask = (0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF
+        ip = rng.getrandbits(32)
+        if rng.random() >= misaligned:
+            ip &= mask
+        route = {"ip": dotted(ip), "mask": dotted(mask), "gateway": switches[index]}
+        roll = rng.random()
+        if roll < invalid / 2:
+            route["mask"] = "255.0.255.0"
+        elif roll < invalid:
+            route["ip"] = f"10.0.{index % 256}.256"
+        routes[f"route_{index:07d}"] = route
+    return routes
+
+def route_set_digest(routes):
+    """A short fingerprint of a route set, stored with results to show two runs used the same data"""
+    digest = hashlib.sha256()
+    for name, details in routes.items():
+        digest.update(f"{name}\0{details['ip']}\0{details['mask']}\0{details['gateway']}\n".encode())
+    return digest.hexdigest()[:16]
+
+def main():
+    from Routecore import SqliteRouteStore, is_sqlite_path
+    
+    parser = argparse.ArgumentParser(description="Write a synthetic routes file.")
+    parser.add_argument("size", help="number of routes, or 1k, 100k, 1m")
+    parser.add_argument("output", help="routes file to write (.json, or .db for a SQLite route store)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    
+    routes = generate_routes(parse_size(args.size), args.seed)
+    if is_sqlite_path(args.output):
+        SqliteRouteStore.create(args.output, routes)
+    else:
+        with open(args.output, "w") as file:
+            json.dump({"routes": routes}, file, indent=4)
+    print(f"Wrote {len(routes)} routes to {args.output} (digest {route_set_digest(routes)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Tests for route analysis and aggregation, checked against route-by-route comparisons with ipaddress."""
+import ipaddress
+import os
+import bisect
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import aggregate_routes, analyse_routes, forwarding_segments, int_to_ip, prefix_to_mask, route_prefix
+
+def route(cidr, gateway):
+    network = ipaddress.IPv4Network(cidr, strict=False)
+    return {"ip": cidr.split("/")[0], "mask": str(network.netmask), "gateway": gateway}
+
+def closest_enclosing(routes):
+    """{cidr: (outer cidr, same gateways)} for every prefix inside another, found by comparing every pair"""
+    groups = {}
+    for details in routes.values():
+        try:
+            network = ipaddress.IPv4Network(f"{details['ip']}/{details['mask']}", strict=False)
+        except ValueError:
+            continue
+        groups.setdefault(network, set()).add(details["gateway"])
+    found = {}
+    for network in groups:
+        outers = [outer for outer in groups if outer != network and network.subnet_of(outer)]
+        if outers:
+            outer = max(outers, key=lambda outer: outer.prefixlen)
+            found[str(network)] = (str(outer), groups[network] == groups[outer])
+    return found
+
+def next_hops(routes, ip_str):
+    """The switch addresses of the longest prefixes containing ip_str, scanning every route"""
+    address = ipaddress.IPv4Address(ip_str)
+    matches = []
+    for details in routes.values():
+        try:
+            network = ipaddress.IPv4Network(f"{details['ip']}/{details['mask']}", strict=False)
+        except ValueError:
+            continue
+        if address in network:
+            matches.append((network.prefixlen, details["gateway"]))
+    longest = max((prefix_length for prefix_length, gateway in matches), default=None)
+    return {gateway for prefix_length, gateway in matches if prefix_length == longest}
+
+def prefix_gateways(routes):
+    result = {}
+    for details in routes.values():
+        prefix = route_prefix(details)
+        if prefix is not None:
+            result.setdefault(prefix, set()).add(details["gateway"])
+    return result
+
+class AnalyseRoutesTest(unittest.TestCase):
+    ROUTES = {
+        "corporate": route("10.0.0.0/8", "10.255.0.1"),
+        "site_a": route("10.1.0.0/16", "10.255.0.1"),
+        "site_a_again": route("10.1.2.3/16", "10.255.0.1"),
+        "site_b": route("10.2.0.0/16", "10.255.0.1"),
+        "site_b_backup": route("10.2.0.0/16", "10.255.0.2"),
+        "lab": route("10.3.0.0/16", "10.255.0.3"),
+        "lab_servers": route("10.3.4.0/24", "10.255.0.3"),
+        "lab_printers": route("10.3.4.128/25", "10.255.0.1"),
+        "home_0": route("192.168.0.0/24", "10.255.0.1"),
+        "home_1": route("192.168.1.0/24", "10.255.0.1"),
+        "dmz": route("172.16.0.0/16", "10.255.0.4"),
+        "dmz_next": route("172.17.0.0/16", "10.255.0.4"),
+        "broken": {"ip": "10.4.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"},
+    }
+    
+    def setUp(self):
+        self.result = analyse_routes(self.ROUTES)
+    
+    def test_duplicates_and_conflicts(self):
+        self.assertEqual(self.result["duplicates"], [("10.1.0.0/16", ["site_a", "site_a_again"])])
+        self.assertEqual(self.result["conflicts"],
+                         [("10.2.0.0/16", [("site_b", "10.255.0.1"), ("site_b_backup", "10.255.0.2")])])
+        self.assertEqual(self.result["invalid"], ["broken"])
+    
+    def test_nested_prefixes_name_the_closest_enclosing_route(self):
+        self.assertEqual(sorted(self.result["redundant"]), [
+            ("10.1.0.0/16", ["site_a", "site_a_again"], "10.0.0.0/8", ["corporate"]),
+            ("10.3.4.0/24", ["lab_servers"], "10.3.0.0/16", ["lab"]),
+        ])
+        self.assertEqual(sorted(self.result["shadowing"]), [
+            ("10.2.0.0/16", ["site_b", "site_b_backup"], "10.0.0.0/8", ["corporate"]),
+            ("10.3.0.0/16", ["lab"], "10.0.0.0/8", ["corporate"]),
+            ("10.3.4.128/25", ["lab_printers"], "10.3.4.0/24", ["lab_servers"]),
+        ])
+    
+    def test_disjoint_prefixes_are_not_reported(self):
+        reported = {entry[0] for category in ("redundant", "shadowing") for entry in self.result[category]}
+        self.assertFalse(reported & {"192.168.0.0/24", "192.168.1.0/24", "172.16.0.0/16", "172.17.0.0/16"})
+        routes = {name: self.ROUTES[name] for name in ("home_0", "home_1", "dmz", "dmz_next")}
+        self.assertEqual(analyse_routes(routes),
+                         {"invalid": [], "duplicates": [], "conflicts": [], "redundant": [], "shadowing": []})
+    
+    def test_nesting_matches_pairwise_comparison(self):
+        rng = random.Random(3)
+        routes = {}
+        for index in range(600):
+            prefix_length = rng.randrange(8, 33)
+            network = ((10 << 24) | rng.getrandbits(16) << 8) & prefix_to_mask(prefix_length)
+            routes[f"route_{index}"] = {"ip": int_to_ip(network), "mask": int_to_ip(prefix_to_mask(prefix_length)),
+                                        "gateway": f"10.255.0.{rng.randrange(1, 3)}"}
+        result = analyse_routes(routes)
+        found = {cidr: (outer_cidr, category == "redundant") for category in ("redundant", "shadowing")
+                 for cidr, names, outer_cidr, outer_names in result[category]}
+        self.assertEqual(found, closest_enclosing(routes))
+
+class AggregateRoutesTest(unittest.TestCase):
+    def aggregate(self, routes):
+        aggregated, report = aggregate_routes(routes)
+        self.assertEqual((report["before"], report["after"]), (len(routes), len(aggregated)))
+        self.assertTrue(report["verified"])
+        return aggregated
+    
+    def cidrs(self, routes):
+        return sorted((f"{int_to_ip(route_prefix(details)[0])}/{route_prefix(details)[1]}", details["gateway"])
+                      for details in routes.values() if route_prefix(details) is not None)
+    
+    def test_siblings_merge_into_their_parent(self):
+        routes = {f"site_{index}": route(f"10.0.{index}.0/24", "10.255.0.1") for index in range(4)}
+        routes["odd"] = route("10.0.4.0/24", "10.255.0.1")
+        aggregated = self.aggregate(routes)
+        self.assertEqual(self.cidrs(aggregated), [("10.0.0.0/22", "10.255.0.1"), ("10.0.4.0/24", "10.255.0.1")])
+        self.assertEqual(aggregated["odd"], routes["odd"])
+        self.assertIn("10.0.0.0/22 via 10.255.0.1", aggregated)
+    
+    def test_mixed_gateways_do_not_merge(self):
+        routes = {"a": route("10.1.0.0/24", "10.255.0.1"), "b": route("10.1.1.0/24", "10.255.0.2"),
+                  # Siblings with one switch address, under a parent routed to another
+                  "c": route("10.1.2.0/25", "10.255.0.1"), "d": route("10.1.2.128/25", "10.255.0.1"),
+                  "parent": route("10.1.2.0/24", "10.255.0.2"),
+                  "e": route("10.1.4.0/24", "10.255.0.1"), "e_backup": route("10.1.4.0/24", "10.255.0.2"),
+                  "f": route("10.1.5.0/24", "10.255.0.1")}
+        self.assertEqual(self.aggregate(routes), routes)
+    
+    def test_covered_routes_are_dropped_unless_another_gateway_is_between(self):
+        routes = {"outer": route("10.2.0.0/16", "10.255.0.1"), "inner": route("10.2.3.0/24", "10.255.0.1"),
+                  "middle": route("10.2.4.0/22", "10.255.0.2"), "hole": route("10.2.5.0/24", "10.255.0.1")}
+        self.assertEqual(sorted(self.aggregate(routes)), ["hole", "middle", "outer"])
+    
+    def test_unaligned_network(self):
+        routes = {"unaligned": route("10.3.0.5/24", "10.255.0.1"), "sibling": route("10.3.1.0/24", "10.255.0.1"),
+                  "alone": route("10.3.9.7/24", "10.255.0.1"), "broken": {"ip": "10.3.0.0", "mask": "255.0.255.0",
+                                                                         "gateway": "10.255.0.1"}}
+        aggregated = self.aggregate(routes)
+        self.assertEqual(self.cidrs(aggregated), [("10.3.0.0/23", "10.255.0.1"), ("10.3.9.0/24", "10.255.0.1")])
+        self.assertEqual(aggregated["alone"]["ip"], "10.3.9.7")
+        self.assertEqual(aggregated["broken"], routes["broken"])
+    
+    def test_next_hops_match_scan(self):
+        rng = random.Random(5)
+        routes = {}
+        for index in range(300):
+            prefix_length = rng.randrange(16, 29)
+            network = ((10 << 24) | rng.getrandbits(12) << 8) & prefix_to_mask(prefix_length)
+            routes[f"route_{index}"] = {"ip": int_to_ip(network), "mask": int_to_ip(prefix_to_mask(prefix_length)),
+                                        "gateway": f"10.255.0.{rng.randrange(1, 3)}"}
+        aggregated = self.aggregate(routes)
+        self.assertLess(len(aggregated), len(routes))
+        addresses = [int_to_ip((10 << 24) | rng.getrandbits(20)) for _ in range(500)]
+        for details in routes.values():
+            network = ipaddress.IPv4Network(f"{details['ip']}/{details['mask']}")
+            addresses += [str(network.network_address), str(network.broadcast_address),
+                          str(network.network_address - 1), str(network.broadcast_address + 1)]
+        segments = forwarding_segments(prefix_gateways(routes))
+        starts = [start for start, end, gateways in segments]
+        for ip_str in addresses:
+            self.assertEqual(next_hops(aggregated, ip_str), next_hops(routes, ip_str), ip_str)
+            start, end, gateways = segments[bisect.bisect_right(starts, int(ipaddress.IPv4Address(ip_str))) - 1]
+            self.assertEqual(gateways, next_hops(routes, ip_str), ip_str)
+    
+    def test_segments_tell_route_sets_apart(self):
+        routes = {"a": route("10.4.0.0/24", "10.255.0.1"), "b": route("10.4.0.128/25", "10.255.0.2")}
+        changed = dict(routes, b=route("10.4.0.128/25", "10.255.0.1"))
+        self.assertNotEqual(forwarding_segments(prefix_gateways(routes)), forwarding_segments(prefix_gateways(changed)))
+        self.assertEqual(forwarding_segments(prefix_gateways(changed)),
+                         forwarding_segments(prefix_gateways({"a": routes["a"]})))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests for the command line interface, run with the fake backend."""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Routecli
+
+class CliTestCase(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+    
+    def run_cli(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = Routecli.main(list(argv))
+        return status, stdout.getvalue(), stderr.getvalue()
+    
+    def write_routes(self, data):
+        file_path = os.path.join(self.work_dir, "routes.json")
+        with open(file_path, "w") as file:
+            json.dump(data, file)
+        return file_path
+
+class LoadRoutesTest(CliTestCase):
+    def test_route_that_is_not_an_object(self):
+        file_path = self.write_routes({"routes": {
+            "good": {"ip": "10.0.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"},
+            "a": "oops",
+        }})
+        for command in (["validate"], ["info"], ["plan", "--backend", "fake", "--route-print", file_path]):
+            status, stdout, stderr = self.run_cli(command[0], file_path, *command[1:])
+            self.assertEqual(status, 2, command)
+            self.assertEqual(stderr, f'error: {file_path}: route "a" is not an object\n')
+    
+    def test_routes_that_are_not_an_object(self):
+        status, stdout, stderr = self.run_cli("validate", self.write_routes({"routes": ["a"]}))
+        self.assertEqual(status, 2)
+        self.assertIn('expected an object with a "routes" object', stderr)
+    
+    def test_missing_file(self):
+        status, stdout, stderr = self.run_cli("validate", os.path.join(self.work_dir, "missing.json"))
+        self.assertEqual(status, 2)
+        self.assertIn("file not found", stderr)
+
+class PlanActionTest(CliTestCase):
+    ROUTES = {
+        "good": {"ip": "10.0.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"},
+        "no_gateway": {"ip": "10.1.0.0", "mask": "255.255.0.0"},
+        "bad_mask": {"ip": "10.2.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"},
+        "unaligned": {"ip": "10.3.0.5", "mask": "255.255.0.0", "gateway": "10.255.0.1"},
+    }
+    
+    def test_plan_skips_what_apply_skips(self):
+        file_path = self.write_routes({"routes": self.ROUTES})
+        for action, runnable, skipped in [("add", ["good", "unaligned"], ["no_gateway", "bad_mask"]),
+                                          ("delete", ["good", "no_gateway", "unaligned"], ["bad_mask"])]:
+            status, stdout, stderr = self.run_cli("plan", file_path, "--backend", "fake", "--action", action, "--json")
+            self.assertEqual(status, 0)
+            self.assertEqual([operation["name"] for operation in json.loads(stdout)], runnable)
+            self.assertEqual([line for line in stderr.splitlines() if line.startswith("SKIPPED")],
+                             [f"SKIPPED: {name}: invalid route" for name in skipped])
+            
+            # The dry run prints the same commands as the plan, and skips the same routes
+            status, plan, plan_errors = self.run_cli("plan", file_path, "--backend", "fake", "--action", action)
+            status, dry_run, dry_run_errors = self.run_cli("apply", file_path, "--backend", "fake", "--action", action,
+                                                           "--dry-run")
+            self.assertEqual((status, dry_run), (0, plan))
+            self.assertEqual(len(plan.splitlines()), len(runnable))
+            self.assertEqual(dry_run_errors.splitlines(), plan_errors.splitlines()[:-1])
+    
+    def test_named_routes(self):
+        file_path = self.write_routes({"routes": self.ROUTES})
+        status, stdout, stderr = self.run_cli("plan", file_path, "--backend", "fake", "--action", "add", "--json",
+                                              "--names", "bad_mask", "good")
+        self.assertEqual([operation["name"] for operation in json.loads(stdout)], ["good"])
+        self.assertIn("SKIPPED: bad_mask: invalid route", stderr)
+        self.assertNotIn("no_gateway", stderr)
+
+if __name__ == "__main__":
+    unittest.main()
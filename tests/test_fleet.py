@@ -0,0 +1,153 @@
+"""Tests for fleet rollouts, against stand-in agents on loopback with the fake backend."""
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Routefleet
+from Routebackend import create_backend
+from Routefleet import _send, push_to_fleet, push_to_host, serve_agent, start_agent
+
+TOKEN = "fleet-test-token"
+
+def route(index):
+    return {"action": "add", "ip": f"{10 + (index >> 16)}.{index >> 8 & 255}.{index & 255}.0",
+            "mask": "255.255.255.0", "gateway": "10.255.0.1"}
+
+class DroppingReader:
+    """A stream reader that reports the connection closed after a number of lines"""
+    
+    def __init__(self, reader, lines):
+        self.reader = reader
+        self.lines = lines
+    
+    async def readline(self):
+        if not self.lines:
+            return b""
+        self.lines -= 1
+        return await self.reader.readline()
+
+class FleetTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.events = []
+        patcher = mock.patch.object(Routefleet, "RETRY_DELAY", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def start_server(self, handler):
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        self.addAsyncCleanup(self.stop_server, server)
+        return server.sockets[0].getsockname()[:2]
+    
+    async def start_agent(self, backend, token=TOKEN, latency=0.0):
+        server = await start_agent("127.0.0.1", 0, token, backend, latency)
+        self.addAsyncCleanup(self.stop_server, server)
+        return server.sockets[0].getsockname()[:2]
+    
+    async def stop_server(self, server):
+        server.close()
+        await server.wait_closed()
+    
+    def host_states(self):
+        return [event["state"] for event in self.events if event["type"] == "host"]
+    
+    async def test_rollout_to_several_agents(self):
+        backends = [create_backend("fake") for _ in range(3)]
+        addresses = [await self.start_agent(backend) for backend in backends]
+        operations = [route(index) for index in range(1000)] + [route(0)]
+        reports = await asyncio.wait_for(push_to_fleet(addresses, TOKEN, operations, self.events.append,
+                                                       concurrency=2), 60)
+        for report, backend in zip(reports, backends):
+            self.assertEqual((report["state"], report["ok"], report["failed"], report["not_run"]),
+                             ("done", 1000, 1, 0))
+            self.assertEqual(report["results"][-1]["exit_code"], 1)
+            self.assertEqual(len(backend.list_routes()), 1000)
+    
+    async def test_invalid_operations_are_skipped(self):
+        backend = create_backend("fake")
+        address = await self.start_agent(backend)
+        operations = [route(0), dict(route(1), mask="255.0.255.0"), route(2), dict(route(3), gateway=""),
+                      dict(route(4), action="flush"), route(5)]
+        reports = await asyncio.wait_for(push_to_fleet([address], TOKEN, operations, self.events.append), 60)
+        skipped = [(event["index"], event["error"]) for event in self.events if event["type"] == "skipped"]
+        self.assertEqual(skipped, [(1, "invalid route: 10.0.1.0 mask 255.0.255.0"), (3, "invalid gateway: "),
+                                   (4, "unsupported action: flush")])
+        self.assertEqual(sorted(event["index"] for event in self.events if event["type"] == "result"), [0, 2, 5])
+        
+        report = reports[0]
+        self.assertEqual((report["state"], report["ok"], report["failed"], report["not_run"], report["skipped"]),
+                         ("done", 3, 0, 0, 3))
+        self.assertEqual([result["exit_code"] for result in report["results"]], [0, None, 0, None, None, 0])
+        self.assertEqual(report["results"][3]["error"], "invalid gateway: ")
+        self.assertEqual(sorted(record["ip"] for record in backend.list_routes()),
+                         ["10.0.0.0", "10.0.2.0", "10.0.5.0"])
+    
+    async def test_retry_after_dropped_connection(self):
+        backend = create_backend("fake")
+        connections = []
+        
+        async def flaky(reader, writer):
+            connections.append(writer)
+            if len(connections) == 1:
+                # The auth message and 100 requests, then the agent drops the connection
+                reader = DroppingReader(reader, 101)
+            await serve_agent(reader, writer, TOKEN, backend)
+        
+        address = await self.start_server(flaky)
+        report = await asyncio.wait_for(push_to_host(address, TOKEN, [route(index) for index in range(500)],
+                                                     self.events.append, timeout=5, retries=1), 60)
+        self.assertEqual((report["state"], report["attempts"], report["not_run"]), ("done", 2, 0))
+        self.assertEqual(len(connections), 2)
+        self.assertEqual(len(backend.list_routes()), 500)
+        
+        # Operations answered before the drop are not sent again
+        retry = self.host_states().index("retrying")
+        host_events = [index for index, event in enumerate(self.events) if event["type"] == "host"]
+        first = {event["index"] for event in self.events[:host_events[retry]] if event["type"] == "result"}
+        second = {event["index"] for event in self.events[host_events[retry]:] if event["type"] == "result"}
+        self.assertGreaterEqual(len(first), 50)
+        self.assertEqual(first & second, set())
+        self.assertEqual(first | second, set(range(500)))
+    
+    async def test_auth_failure_is_not_retried(self):
+        backend = create_backend("fake")
+        address = await self.start_agent(backend, token="another-token")
+        report = await asyncio.wait_for(push_to_host(address, TOKEN, [route(index) for index in range(10)],
+                                                     self.events.append, timeout=5, retries=2), 60)
+        self.assertEqual((report["state"], report["attempts"], report["not_run"]), ("failed", 1, 10))
+        self.assertEqual(report["error"], "authentication failed")
+        self.assertNotIn("retrying", self.host_states())
+        self.assertEqual(backend.list_routes(), [])
+    
+    async def test_silent_host_times_out(self):
+        address = await self.start_agent(create_backend("fake"), latency=2.0)
+        report = await asyncio.wait_for(push_to_host(address, TOKEN, [route(index) for index in range(10)],
+                                                     self.events.append, timeout=0.2, retries=1), 30)
+        self.assertEqual((report["state"], report["attempts"]), ("failed", 2))
+        self.assertEqual(report["error"], "no answer within 0.2 s")
+    
+    async def test_host_that_stops_reading_times_out(self):
+        stalled = asyncio.Event()
+        
+        async def stop_reading(reader, writer):
+            _send(writer, {"type": "hello", "nonce": "0", "host": "stalled", "backend": "fake"})
+            await reader.readline()
+            _send(writer, {"type": "ready"})
+            try:
+                await stalled.wait()
+            finally:
+                writer.close()
+        
+        address = await self.start_server(stop_reading)
+        self.addCleanup(stalled.set)
+        # Far more requests than the socket buffers hold, should they all be sent at once
+        report = await asyncio.wait_for(push_to_host(address, TOKEN, [route(index) for index in range(200000)],
+                                                     self.events.append, timeout=0.5, retries=0), 30)
+        self.assertEqual((report["state"], report["ok"], report["not_run"]), ("failed", 0, 200000))
+        self.assertEqual(report["error"], "no answer within 0.5 s")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,277 @@
+"""Tests for flow traces and the destination reader, checked against longest-prefix scans with ipaddress."""
+import io
+import ipaddress
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Routecore
+from Routecore import (CompactRouteTable, FlowTrace, _PrefixRanges, int_to_ip, load_numpy, read_destinations,
+                       simulate_flows)
+
+PREFIX_LENGTHS = [8, 12, 14, 16, 18, 20, 22, 24, 26, 28, 30, 31, 32]
+GATEWAYS = ["10.255.0.1", "10.255.0.2", "10.255.0.3"]
+INVALID_DESTINATIONS = ["-", "", "10.0.0", "256.1.1.1", "not an address"]
+
+def random_network(rng):
+    """A prefix, mostly inside 10.0.0.0/14 so that many of them nest"""
+    prefix_length = rng.choice(PREFIX_LENGTHS)
+    address = (10 << 24 | rng.getrandbits(18)) if rng.random() < 0.9 else rng.getrandbits(32)
+    return ipaddress.IPv4Network((address, prefix_length), strict=False)
+
+def random_addresses(rng, count):
+    return [(10 << 24 | rng.getrandbits(18)) if rng.random() < 0.8 else rng.getrandbits(32) for _ in range(count)]
+
+def random_routes(rng, count):
+    routes = {}
+    for index in range(count):
+        network = random_network(rng)
+        # Routes may name a host of the network rather than the network address
+        address = int(network.network_address) | (rng.getrandbits(32) & int(network.hostmask) if index % 5 == 0 else 0)
+        routes[f"route_{index:04d}"] = {"ip": int_to_ip(address), "mask": str(network.netmask),
+                                        "gateway": rng.choice(GATEWAYS)}
+    # Routes sharing a prefix but not a switch address, and routes that never match
+    routes["shared_a"] = {"ip": "172.16.0.0", "mask": "255.240.0.0", "gateway": "10.255.0.1"}
+    routes["shared_b"] = {"ip": "172.16.0.0", "mask": "255.240.0.0", "gateway": "10.255.0.2"}
+    routes["bad_mask"] = {"ip": "10.0.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"}
+    routes["bad_ip"] = {"ip": "10.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"}
+    return routes
+
+def random_system_routes(rng, routes, count):
+    records = []
+    for index in range(count):
+        network = random_network(rng)
+        records.append({"ip": str(network.network_address), "mask": str(network.netmask),
+                        "gateway": rng.choice(GATEWAYS + ["10.254.0.1"]), "metric": 25})
+    # System prefixes the routes replace
+    for name in ("route_0001", "shared_a"):
+        records.append(dict(routes[name], gateway="10.254.0.9", metric=10))
+    return {"active": records[::2], "persistent": records[1::2]}
+
+def networks(records):
+    """Map each valid prefix of route records to the set of its switch addresses"""
+    hop_sets = {}
+    for details in records:
+        try:
+            network = ipaddress.IPv4Network(f"{details['ip']}/{details['mask']}", strict=False)
+        except ValueError:
+            continue
+        hop_sets.setdefault(network, set()).add(details["gateway"])
+    return hop_sets
+
+def hop_label(gateways):
+    return ", ".join(sorted(gateways))
+
+def longest_match(address, candidates):
+    matches = [network for network in candidates if address in network]
+    return max(matches, key=lambda network: network.prefixlen, default=None)
+
+def scan_flows(routes, destinations, system_routes=None):
+    """The flow trace report, worked out address by address"""
+    route_networks = networks(routes.values())
+    system_networks = networks(system_routes["active"] + system_routes["persistent"]) if system_routes else {}
+    names = {}
+    for name, details in routes.items():
+        for network in networks([details]):
+            names.setdefault(network, []).append(name)
+    report = {"destinations": len(destinations), "invalid": 0, "matched": 0, "unmatched": 0,
+              "route_hits": {name: 0 for network_names in names.values() for name in network_names},
+              "system_hits": {}, "unmatched_addresses": set(), "change_counts": {}, "changed_addresses": {}}
+    for text in destinations:
+        try:
+            address = ipaddress.IPv4Address(text)
+        except ValueError:
+            report["invalid"] += 1
+            continue
+        winner = longest_match(address, list(route_networks) + list(system_networks))
+        if winner is None:
+            report["unmatched"] += 1
+            report["unmatched_addresses"].add(address)
+            new = None
+        elif winner in route_networks:
+            report["matched"] += 1
+            for name in names[winner]:
+                report["route_hits"][name] += 1
+            new = hop_label(route_networks[winner])
+        else:
+            report["matched"] += 1
+            cidr = str(winner)
+            report["system_hits"][cidr] = report["system_hits"].get(cidr, 0) + 1
+            new = hop_label(system_networks[winner])
+        if system_routes is not None:
+            current = longest_match(address, system_networks)
+            old = hop_label(system_networks[current]) if current is not None else None
+            if old != new:
+                report["change_counts"][(old, new)] = report["change_counts"].get((old, new), 0) + 1
+                report["changed_addresses"].setdefault((old, new), set()).add(address)
+    return report
+
+def batches(values, batch_size):
+    return [values[start:start + batch_size] for start in range(0, len(values), batch_size)]
+
+class PrefixRangesTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.networks = sorted({random_network(rng) for _ in range(400)} | {
+            ipaddress.IPv4Network(cidr) for cidr in ("0.0.0.0/0", "0.0.0.0/1", "0.0.0.0/32", "255.255.255.0/24",
+                                                     "255.255.255.255/32")},
+            key=lambda network: (int(network.network_address), network.prefixlen))
+        keys = [int(network.network_address) << 6 | network.prefixlen for network in self.networks]
+        self.prefixes = list(zip(keys, range(len(keys))))
+        self.none = len(keys)
+        # The edges of every prefix, and random addresses
+        self.addresses = sorted({edge for network in self.networks
+                                 for address in (int(network.network_address), int(network.broadcast_address))
+                                 for edge in (address - 1, address, address + 1) if 0 <= edge <= 0xFFFFFFFF}
+                                | set(random_addresses(rng, 5000)))
+    
+    def expected(self):
+        owners = {network: owner for owner, network in enumerate(self.networks)}
+        by_length = sorted(self.networks, key=lambda network: -network.prefixlen)
+        expected = []
+        for address in self.addresses:
+            ip = ipaddress.IPv4Address(address)
+            expected.append(next((owners[network] for network in by_length if ip in network), self.none))
+        return expected
+    
+    def test_lookup_matches_scan(self):
+        expected = self.expected()
+        self.assertEqual(_PrefixRanges(self.prefixes, self.none).lookup(self.addresses), expected)
+        np = load_numpy()
+        if np is None:
+            self.skipTest("NumPy is not installed")
+        ranges = _PrefixRanges(self.prefixes, self.none, np)
+        self.assertEqual(ranges.lookup(np.array(self.addresses, dtype=np.uint32)).tolist(), expected)
+    
+    def test_no_prefixes(self):
+        self.assertEqual(_PrefixRanges([], 7).lookup([0, 12345, 0xFFFFFFFF]), [7, 7, 7])
+        self.assertEqual(_PrefixRanges([(0, 0)], 1).lookup([0, 0xFFFFFFFF]), [0, 0])
+
+class FlowTraceTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(6)
+        self.routes = random_routes(rng, 300)
+        self.system_routes = random_system_routes(rng, self.routes, 40)
+        self.destinations = [int_to_ip(address) for address in random_addresses(rng, 6000)]
+        self.destinations += INVALID_DESTINATIONS + ["172.16.1.1", "172.31.0.9", "172.16.1.1"]
+        rng.shuffle(self.destinations)
+        self.modes = [False] + ([True] if load_numpy() is not None else [])
+    
+    def assertReportMatchesScan(self, report, expected, sample_size, one_batch):
+        for key in ("destinations", "invalid", "matched", "unmatched", "route_hits", "system_hits"):
+            self.assertEqual(report[key], expected[key], key)
+        self.assertEqual(report["changed"], sum(expected["change_counts"].values()))
+        
+        # Samples are distinct addresses of their kind, as many as there are up to sample_size, and the
+        # lowest ones when the destinations come in one batch
+        samples = [(report["unmatched_sample"], expected["unmatched_addresses"])]
+        counts = {(change["old"], change["new"]): change["count"] for change in report["changes"]}
+        self.assertEqual(counts, expected["change_counts"])
+        self.assertEqual([change["count"] for change in report["changes"]], sorted(counts.values(), reverse=True))
+        samples += [(change["sample"], expected["changed_addresses"][(change["old"], change["new"])])
+                    for change in report["changes"]]
+        for sample, addresses in samples:
+            self.assertEqual(len(set(sample)), len(sample))
+            self.assertEqual(len(sample), min(sample_size, len(addresses)))
+            self.assertLessEqual({ipaddress.IPv4Address(text) for text in sample}, addresses)
+            if one_batch:
+                self.assertEqual(sample, [str(address) for address in sorted(addresses)[:sample_size]])
+    
+    def test_routes_only(self):
+        expected = scan_flows(self.routes, self.destinations)
+        self.assertTrue(expected["unmatched"])
+        self.assertEqual((expected["route_hits"]["shared_a"], expected["route_hits"]["shared_b"]), (3, 3))
+        for use_numpy in self.modes:
+            for routes in (self.routes, CompactRouteTable(self.routes)):
+                with self.subTest(use_numpy=use_numpy, routes=type(routes).__name__):
+                    report = FlowTrace(routes, use_numpy=use_numpy).run([self.destinations], 5)
+                    self.assertReportMatchesScan(report, expected, 5, True)
+                    self.assertEqual(report["changes"], [])
+    
+    def test_system_routes_and_changes(self):
+        expected = scan_flows(self.routes, self.destinations, self.system_routes)
+        self.assertTrue(expected["system_hits"])
+        self.assertIn(("10.254.0.9", "10.255.0.1, 10.255.0.2"), expected["change_counts"])
+        self.assertIn(None, [old for old, new in expected["change_counts"]])
+        for use_numpy in self.modes:
+            for routes in (self.routes, CompactRouteTable(self.routes)):
+                with self.subTest(use_numpy=use_numpy, routes=type(routes).__name__):
+                    trace = FlowTrace(routes, self.system_routes, use_numpy)
+                    self.assertReportMatchesScan(trace.run([self.destinations], 8), expected, 8, True)
+                    # A trace runs again, over any batching, to the same counts
+                    report = trace.run(batches(self.destinations, 700) + [[]], 8)
+                    self.assertReportMatchesScan(report, expected, 8, False)
+    
+    def test_simulate_flows(self):
+        report = simulate_flows(self.routes, [self.destinations], self.system_routes, use_numpy=False)
+        expected = FlowTrace(self.routes, self.system_routes, use_numpy=False).run([self.destinations])
+        del report["seconds"], expected["seconds"]
+        self.assertEqual(report, expected)
+    
+    def test_no_routes(self):
+        for use_numpy in self.modes:
+            report = FlowTrace({}, use_numpy=use_numpy).run([["10.0.0.1", "-", "10.0.0.1"]])
+            self.assertEqual((report["matched"], report["unmatched"], report["invalid"]), (0, 2, 1))
+            self.assertEqual((report["route_hits"], report["unmatched_sample"]), ({}, ["10.0.0.1"]))
+
+class ReadDestinationsTest(unittest.TestCase):
+    def read(self, text, column=None, batch_size=1000, read_size=None):
+        if read_size is None:
+            return list(read_destinations(io.StringIO(text), column, batch_size))
+        with mock.patch.object(Routecore, "DESTINATION_READ_SIZE", read_size):
+            return list(read_destinations(io.StringIO(text), column, batch_size))
+    
+    def assertReads(self, text, expected, column=None):
+        """Check the values read from text over a range of chunk and batch sizes"""
+        for read_size in (1, 2, 5, 64, None):
+            for batch_size in (1, 3, 1000):
+                with self.subTest(read_size=read_size, batch_size=batch_size):
+                    read = self.read(text, column, batch_size, read_size)
+                    self.assertEqual([value for batch in read for value in batch], expected)
+                    self.assertEqual([len(batch) for batch in read], [len(batch) for batch in batches(expected,
+                                                                                                        batch_size)])
+    
+    def test_one_address_per_line(self):
+        addresses = [int_to_ip(address) for address in random_addresses(random.Random(2), 300)]
+        self.assertReads("\n".join(addresses) + "\n", addresses)
+        self.assertReads("# exported\n\n" + "\r\n".join(addresses[:50]) + "\n# end\n   \n", addresses[:50])
+        self.assertReads("dstaddr\n10.0.0.1\n-\n10.0.0.2", ["10.0.0.1", "-", "10.0.0.2"])
+    
+    def test_csv_columns(self):
+        rows = [("10.9.0.1", f"10.0.{index}.1", "443") for index in range(40)]
+        body = "".join(f'"{source}",{destination},{port}\n' for source, destination, port in rows)
+        destinations = [destination for source, destination, port in rows]
+        self.assertReads("srcaddr,DstAddr,port\n" + body, destinations)
+        self.assertReads("src,dst,port\n" + body, [source for source, destination, port in rows], "src")
+        self.assertReads("src,dst,port\n" + body, destinations, "DST")
+        self.assertReads(body, destinations, 1)
+        self.assertReads(body.replace(",", "\t"), [port for source, destination, port in rows], 2)
+        # "destination" is preferred to "dst", and short rows give no value
+        self.assertReads("dst,destination\n10.0.0.1,10.0.0.2\n10.0.0.3\n", ["10.0.0.2", ""])
+    
+    def test_flow_log(self):
+        header = "version account-id interface-id srcaddr dstaddr srcport dstport protocol packets bytes\n"
+        records = [f"2 123456789010 eni-1235b8ca {int_to_ip(address)} 10.0.{index % 7}.{index} 49761 3389 6 20 4249\n"
+                   for index, address in enumerate(random_addresses(random.Random(1), 100))]
+        records[5] = "2 123456789010 eni-1235b8ca - - - - - - -\n"
+        expected = [record.split()[4] for record in records]
+        self.assertReads(header + "".join(records), expected)
+        self.assertReads("".join(records), expected, 4)
+    
+    def test_errors_and_empty_files(self):
+        with self.assertRaises(ValueError):
+            self.read("src,port\n10.0.0.1,80\n")
+        with self.assertRaises(ValueError):
+            self.read("src,dst\n10.0.0.1,10.0.0.2\n", "destination")
+        with self.assertRaises(ValueError):
+            self.read("10.0.0.1,10.0.0.2\n", "dst")
+        self.assertEqual(self.read(""), [])
+        self.assertEqual(self.read("# nothing\n\n"), [])
+        self.assertEqual(self.read("dstaddr\n"), [])
+
+if __name__ == "__main__":
+    unittest.main()
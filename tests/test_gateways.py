@@ -0,0 +1,140 @@
+"""Tests for the switch address index and bulk re-pointing, checked against scans of the routes."""
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import (CompactRouteTable, GatewayIndex, SqliteGatewayIndex, SqliteRouteStore, int_to_ip,
+                       plan_repoint, prefix_to_mask)
+
+GATEWAYS = ["10.255.0.1", "10.255.0.2", "10.255.0.3", "10.255.1.1", "", "10.255.0", "010.255.0.1", "gw-core"]
+
+def random_routes(rng, count):
+    routes = {}
+    for index in range(count):
+        prefix_length = rng.choice([8, 16, 24, 32])
+        address = (10 << 24) | rng.getrandbits(24)
+        routes[f"route_{index:04d}"] = {"ip": int_to_ip(address), "mask": int_to_ip(prefix_to_mask(prefix_length)),
+                                        "gateway": rng.choice(GATEWAYS)}
+    routes["bad_mask"] = {"ip": "10.0.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"}
+    return routes
+
+def scan_counts(routes):
+    counts = {}
+    for details in routes.values():
+        counts[details["gateway"]] = counts.get(details["gateway"], 0) + 1
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+def scan_routes_for(routes, gateway):
+    return sorted(name for name, details in routes.items() if details["gateway"] == gateway)
+
+class GatewayIndexTests:
+    """Tests shared by the in-memory and the SQLite switch address indexes"""
+    
+    def setUp(self):
+        self.rng = random.Random(4)
+        self.routes = random_routes(self.rng, 500)
+        self.index = self.make_index(self.routes)
+    
+    def assertMatchesScan(self):
+        self.assertEqual(self.index.counts(), scan_counts(self.routes))
+        for gateway in GATEWAYS + ["10.255.9.9"]:
+            self.assertEqual(self.index.routes_for(gateway), scan_routes_for(self.routes, gateway), gateway)
+    
+    def test_index_matches_scan(self):
+        self.assertMatchesScan()
+    
+    def test_index_after_edits(self):
+        names = sorted(self.routes)
+        for name in self.rng.sample(names, 100):
+            self.remove(name)
+        for name in self.rng.sample(names, 100):
+            self.set(name, dict(self.routes.get(name, {"ip": "10.1.0.0", "mask": "255.255.0.0"}),
+                                gateway=self.rng.choice(GATEWAYS)))
+        self.set("added", {"ip": "10.2.0.0", "mask": "255.255.0.0", "gateway": "10.255.7.7"})
+        self.assertMatchesScan()
+        self.assertEqual(self.index.routes_for("10.255.7.7"), ["added"])
+
+class GatewayIndexTest(GatewayIndexTests, unittest.TestCase):
+    def make_index(self, routes):
+        return GatewayIndex(routes)
+    
+    def set(self, name, details):
+        self.routes[name] = details
+        self.index.add(name, details)
+    
+    def remove(self, name):
+        self.routes.pop(name, None)
+        self.index.remove(name)
+    
+    def test_matching(self):
+        for text in ["10.255.0", "10.255.0.1", "10.255.1", "", "gw", "none"]:
+            expected = sorted(name for name, details in self.routes.items() if details["gateway"].startswith(text))
+            self.assertEqual(sorted(self.index.matching(text)), expected, text)
+    
+    def test_route_that_is_not_an_object(self):
+        self.set("not an object", "10.0.0.0/8")
+        self.assertIn("not an object", self.index.routes_for(""))
+
+class CompactGatewayIndexTest(GatewayIndexTest):
+    def make_index(self, routes):
+        return GatewayIndex(CompactRouteTable(routes))
+    
+    def test_route_that_is_not_an_object(self):
+        pass  # A packed table only holds routes that are objects
+
+class SqliteGatewayIndexTest(GatewayIndexTests, unittest.TestCase):
+    def make_index(self, routes):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        file_path = os.path.join(work_dir.name, "routes.db")
+        SqliteRouteStore.create(file_path, routes)
+        self.store = SqliteRouteStore(file_path)
+        self.addCleanup(self.store.close)
+        return SqliteGatewayIndex(self.store)
+    
+    def set(self, name, details):
+        self.routes[name] = details
+        self.store[name] = details
+    
+    def remove(self, name):
+        self.routes.pop(name, None)
+        self.store.pop(name, None)
+
+class PlanRepointTest(unittest.TestCase):
+    def test_changes_and_operations(self):
+        rng = random.Random(8)
+        routes = random_routes(rng, 300)
+        index = GatewayIndex(routes)
+        route_names = index.routes_for("10.255.0.1")
+        changes, operations = plan_repoint(routes, route_names, "10.255.9.1")
+        self.assertEqual(changes, [(name, routes[name], dict(routes[name], gateway="10.255.9.1"))
+                                   for name in route_names])
+        
+        expected = []
+        for name in route_names:
+            try:
+                network = ipaddress.IPv4Network(f"{routes[name]['ip']}/{routes[name]['mask']}", strict=False)
+            except ValueError:
+                continue
+            for action, gateway in (("delete", "10.255.0.1"), ("add", "10.255.9.1")):
+                expected.append({"name": name, "action": action, "ip": str(network.network_address),
+                                 "mask": str(network.netmask), "gateway": gateway})
+        self.assertEqual(operations, expected)
+        self.assertIn("bad_mask", route_names)
+        self.assertNotIn("bad_mask", [operation["name"] for operation in operations])
+        
+        # Applying the changes moves every route, and only those
+        for name, before, after in changes:
+            routes[name] = after
+            index.add(name, after)
+        self.assertEqual(index.routes_for("10.255.0.1"), [])
+        self.assertEqual(index.routes_for("10.255.9.1"), route_names)
+        self.assertEqual(index.counts(), scan_counts(routes))
+
+if __name__ == "__main__":
+    unittest.main()
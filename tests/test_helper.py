@@ -0,0 +1,152 @@
+"""Tests for the route helper protocol, run against the fake backend without elevation."""
+import json
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routebackend import create_backend, result_status
+from Routehelper import LocalRouteRunner, RouteHelperClient, helper_launcher
+
+JOB_TIMEOUT = 60
+
+def route(action, index, gateway="10.255.0.1"):
+    return {"action": action, "ip": f"{10 + (index >> 16)}.{index >> 8 & 255}.{index & 255}.0",
+            "mask": "255.255.255.0", "gateway": gateway}
+
+def run_job(runner, operations):
+    """Submit one job and wait for it; returns (results by index, output lines by index, status events)"""
+    results, output, statuses = {}, {}, []
+    done = threading.Event()
+    
+    def on_event(event):
+        if event["type"] == "result":
+            results.setdefault(event["index"], []).append(event)
+        elif event["type"] == "output":
+            output.setdefault(event["index"], []).append(event["line"])
+        elif event["type"] == "status":
+            statuses.append(event)
+        elif event["type"] == "done":
+            done.set()
+    
+    runner.submit(operations, on_event)
+    if not done.wait(JOB_TIMEOUT):
+        raise AssertionError("the job did not finish")
+    return results, output, statuses
+
+class RunnerTests:
+    """Tests shared by the helper client and the in-process runner"""
+    
+    def test_results_per_index(self):
+        operations = [route("add", 1), {"action": "add", "ip": "10.0.0.1", "mask": "255.0.255.0", "gateway": ""},
+                      route("add", 1), {"op": "print"}, route("delete", 2), route("change", 1, "10.255.0.2")]
+        results, output, statuses = run_job(self.runner, operations)
+        self.assertEqual(sorted(results), list(range(len(operations))))
+        self.assertTrue(all(len(events) == 1 for events in results.values()))
+        statuses = [result_status(results[index][0]["exit_code"]) for index in range(len(operations))]
+        self.assertEqual(statuses, ["ok", "not run", "failed (exit 1)", "ok", "failed (exit 1)", "ok"])
+        self.assertIn("invalid route", results[1][0]["error"])
+        self.assertEqual(output[2], ["The route addition failed: The object already exists."])
+        self.assertTrue(any("10.0.1.0" in line for line in output[3]))
+    
+    def test_large_job(self):
+        # Enough requests and replies to fill the socket buffers if the client stopped reading to send
+        count = 100000
+        results, output, statuses = run_job(self.runner, [route("add", index) for index in range(count)])
+        self.assertEqual(len(results), count)
+        self.assertTrue(all(events[0]["exit_code"] == 0 for events in results.values()))
+
+class HelperClientTest(RunnerTests, unittest.TestCase):
+    def setUp(self):
+        self.launch = helper_launcher("fake", elevate=False)
+        self.processes = []
+        self.runner = RouteHelperClient(self.start, connect_timeout=JOB_TIMEOUT)
+        self.addCleanup(self.stop)
+    
+    def start(self, port, token):
+        process = self.launch(port, token)
+        self.processes.append(process)
+        return process
+    
+    def stop(self):
+        self.runner.close()
+        if self.runner.thread is not None:
+            self.runner.thread.join(JOB_TIMEOUT)
+        for process in self.processes:
+            process.kill()
+            process.wait()
+    
+    def test_wrong_token_rejected(self):
+        impostors = []
+        
+        def start(port, token):
+            # Connects before the real helper, so it is the first one accepted
+            impostor = socket.create_connection(("127.0.0.1", port))
+            impostor.sendall((json.dumps({"type": "hello", "token": "0" * 32, "backend": "fake"}) + "\n").encode())
+            impostors.append(impostor)
+            return self.start(port, token)
+        
+        self.runner.launch = start
+        results, output, statuses = run_job(self.runner, [route("add", 1)])
+        self.assertEqual(results[0][0]["exit_code"], 0)
+        with impostors[0]:
+            impostors[0].settimeout(JOB_TIMEOUT)
+            self.assertEqual(impostors[0].recv(1), b"")
+    
+    def test_only_wrong_token_times_out(self):
+        def start(port, token):
+            return self.launch(port, "0" * 32)
+        
+        self.runner = RouteHelperClient(start, connect_timeout=2)
+        results, output, statuses = run_job(self.runner, [route("add", 1)])
+        self.assertEqual(result_status(results[0][0]["exit_code"]), "not run")
+        self.assertIn("timed out", statuses[-1]["message"])
+        self.assertTrue(statuses[-1]["error"])
+    
+    def test_helper_exit_mid_job(self):
+        count = 20000
+        results = {}
+        failures = []
+        done = threading.Event()
+        
+        def on_event(event):
+            if event["type"] == "result":
+                if not results:
+                    self.processes[0].kill()
+                results.setdefault(event["index"], []).append(event)
+            elif event["type"] == "status" and event.get("error"):
+                failures.append(event["message"])
+            elif event["type"] == "done":
+                done.set()
+        
+        self.runner.submit([route("add", index) for index in range(count)], on_event)
+        self.assertTrue(done.wait(JOB_TIMEOUT))
+        self.assertEqual(len(results), count)
+        self.assertTrue(all(len(events) == 1 for events in results.values()))
+        statuses = [result_status(events[0]["exit_code"]) for events in results.values()]
+        self.assertIn("not run", statuses)
+        self.assertEqual(set(statuses), {"ok", "not run"})
+        self.assertEqual(len(failures), 1)
+        
+        # The next job starts a new helper
+        results, output, statuses = run_job(self.runner, [route("add", 1)])
+        self.assertEqual(results[0][0]["exit_code"], 0)
+        self.assertEqual(len(self.processes), 2)
+    
+    def test_start_failure(self):
+        self.runner = RouteHelperClient(lambda port, token: None, connect_timeout=1)
+        results, output, statuses = run_job(self.runner, [route("add", 1), route("add", 2)])
+        self.assertEqual([result_status(results[index][0]["exit_code"]) for index in range(2)],
+                         ["not run", "not run"])
+        self.assertIn("timed out", statuses[-1]["message"])
+
+class LocalRunnerTest(RunnerTests, unittest.TestCase):
+    def setUp(self):
+        self.runner = LocalRouteRunner(create_backend("fake"))
+        self.addCleanup(self.runner.close)
+
+if __name__ == "__main__":
+    unittest.main()
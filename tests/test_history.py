@@ -0,0 +1,181 @@
+"""Tests for the persistent map and the undo/redo history built on it, checked against plain dicts."""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import PersistentMap, RouteHistory
+
+class CollidingKey:
+    """A key whose hash is shared with other keys"""
+    
+    def __init__(self, name, key_hash):
+        self.name = name
+        self.key_hash = key_hash
+    
+    def __hash__(self):
+        return self.key_hash
+    
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.name == self.name
+    
+    def __repr__(self):
+        return f"CollidingKey({self.name!r})"
+
+def route(index, gateway="10.255.0.1"):
+    return {"ip": f"10.{index}.0.0", "mask": "255.255.0.0", "gateway": gateway}
+
+class PersistentMapTest(unittest.TestCase):
+    def assertMapEqual(self, persistent, expected):
+        self.assertEqual(len(persistent), len(expected))
+        self.assertEqual(dict(persistent.items()), expected)
+        self.assertEqual(sorted(persistent, key=repr), sorted(expected, key=repr))
+        for key, value in expected.items():
+            self.assertIn(key, persistent)
+            self.assertEqual(persistent.get(key), value)
+    
+    def test_versions_match_dicts(self):
+        rng = random.Random(11)
+        # Small ints hash to themselves, so keys 2 ** 35 apart share the first seven levels of the trie,
+        # and -1 hashes like -2
+        keys = [f"route_{index}" for index in range(300)] + [index << 35 for index in range(20)] + [-1, -2]
+        versions = [(PersistentMap(), {})]
+        for step in range(3000):
+            persistent, expected = versions[-1]
+            key = rng.choice(keys)
+            if rng.random() < 0.3:
+                persistent, expected = persistent.remove(key), {k: v for k, v in expected.items() if k != key}
+            else:
+                persistent, expected = persistent.set(key, step), {**expected, key: step}
+            versions.append((persistent, expected))
+        # Every version is unchanged by the edits made after it
+        for persistent, expected in versions[::50] + versions[-5:]:
+            self.assertMapEqual(persistent, expected)
+    
+    def test_full_hash_collisions(self):
+        keys = [CollidingKey(name, 42) for name in "abcde"] + [CollidingKey("f", 42 + (1 << 40))]
+        persistent = PersistentMap()
+        for index, key in enumerate(keys):
+            persistent = persistent.set(key, index)
+        self.assertMapEqual(persistent, {key: index for index, key in enumerate(keys)})
+        removed = persistent.remove(keys[2]).remove(keys[5])
+        expected = {key: index for index, key in enumerate(keys) if index not in (2, 5)}
+        self.assertMapEqual(removed, expected)
+        self.assertMapEqual(removed.set(keys[0], "again"), {**expected, keys[0]: "again"})
+        self.assertIsNone(removed.get(CollidingKey("z", 42)))
+        self.assertEqual(len(persistent), len(keys))
+    
+    def test_set_and_remove_share_structure(self):
+        persistent = PersistentMap()
+        for index in range(5000):
+            persistent = persistent.set(f"route_{index}", index)
+        changed = persistent.set("route_17", "changed")
+        shared = sum(left is right for left, right in zip(persistent.root, changed.root))
+        self.assertEqual(shared, len(persistent.root) - 1)
+        self.assertEqual((persistent.get("route_17"), changed.get("route_17")), (17, "changed"))
+        self.assertIs(persistent.remove("missing"), persistent)
+        self.assertEqual(len(persistent.set("route_17", 17)), len(persistent))
+    
+    def test_diff(self):
+        rng = random.Random(5)
+        base = PersistentMap()
+        for index in range(2000):
+            base = base.set(index, index)
+        other = base
+        expected = {}
+        for key in rng.sample(range(2500), 200):
+            if key < 2000 and rng.random() < 0.5:
+                other = other.remove(key)
+                expected[key] = (key, "missing")
+            else:
+                other = other.set(key, -key)
+                expected[key] = (key if key < 2000 else "missing", -key)
+        self.assertEqual({key: (here, there) for key, here, there in base.diff(other, "missing")}, expected)
+        self.assertEqual(list(base.diff(base)), [])
+
+class RouteHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.routes = {f"route_{index}": route(index) for index in range(10)}
+        self.history = RouteHistory()
+        self.states = [dict(self.routes)]
+    
+    def edit(self, description, changes):
+        """Make an edit, as the form does: record (name, before, after) and apply it"""
+        del self.states[self.history.position + 1:]
+        self.history.record(description, [(name, self.routes.get(name), after) for name, after in changes])
+        self.apply(changes)
+        self.states.append(dict(self.routes))
+        # Entries over the limit are dropped from the start
+        del self.states[:len(self.states) - len(self.history.entries)]
+    
+    def apply(self, changes):
+        for name, details in changes:
+            if details is None:
+                self.routes.pop(name, None)
+            else:
+                self.routes[name] = details
+    
+    def move_to(self, index):
+        self.apply(self.history.move_to(index))
+        self.assertEqual(self.routes, self.states[index], f"entry {index}")
+    
+    def test_undo_and_redo(self):
+        self.edit("Edited route_1", [("route_1", route(1, "10.255.0.2"))])
+        self.edit("Deleted route_2", [("route_2", None)])
+        self.edit("Added route_10", [("route_10", route(10))])
+        self.edit("Re-pointed", [("route_1", route(1, "10.255.0.3")), ("route_3", route(3, "10.255.0.3"))])
+        for index in (3, 2, 1, 0):
+            self.assertTrue(self.history.can_undo)
+            self.apply(self.history.undo())
+            self.assertEqual(self.routes, self.states[index])
+        self.assertFalse(self.history.can_undo)
+        for index in (1, 2, 3, 4):
+            self.apply(self.history.redo())
+            self.assertEqual(self.routes, self.states[index])
+        self.assertFalse(self.history.can_redo)
+        self.assertEqual(sorted(self.history.undo()), [("route_1", route(1, "10.255.0.2")), ("route_3", route(3))])
+    
+    def test_move_to_across_branches(self):
+        self.edit("Edited route_1", [("route_1", route(1, "10.255.0.2"))])
+        self.edit("Deleted route_2", [("route_2", None)])
+        self.edit("Added route_10", [("route_10", route(10))])
+        self.apply(self.history.undo())
+        self.apply(self.history.undo())
+        self.assertTrue(self.history.can_redo)
+        
+        # A new edit drops the entries that could have been redone
+        self.edit("Edited route_2", [("route_2", route(2, "10.255.0.9")), ("route_11", route(11))])
+        self.assertFalse(self.history.can_redo)
+        self.assertEqual([entry["description"] for entry in self.history.entries],
+                         ["Opened", "Edited route_1", "Edited route_2"])
+        self.edit("Deleted route_1", [("route_1", None)])
+        for index in (0, 3, 1, 2, 0, 3):
+            self.move_to(index)
+    
+    def test_random_edits_and_moves(self):
+        rng = random.Random(9)
+        names = [f"route_{index}" for index in range(15)]
+        for step in range(300):
+            if rng.random() < 0.3:
+                self.move_to(rng.randrange(len(self.history.entries)))
+                continue
+            changes = [(name, None if rng.random() < 0.3 else route(step % 250, f"10.255.0.{rng.randrange(1, 4)}"))
+                       for name in rng.sample(names, rng.randrange(1, 4))]
+            self.edit(f"Edit {step}", changes)
+        for index in range(len(self.history.entries)):
+            self.move_to(index)
+    
+    def test_limit_keeps_the_latest_entries(self):
+        self.history = RouteHistory(limit=3)
+        for index in range(6):
+            self.edit(f"Edit {index}", [(f"route_{index}", route(index, "10.255.0.9"))])
+        self.assertEqual([entry["description"] for entry in self.history.entries], ["Edit 3", "Edit 4", "Edit 5"])
+        for index in (0, 2, 1):
+            self.move_to(index)
+        self.assertEqual(self.routes["route_2"], route(2, "10.255.0.9"))
+        self.assertEqual(self.routes["route_5"], route(5))
+
+if __name__ == "__main__":
+    unittest.main()
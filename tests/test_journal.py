@@ -0,0 +1,93 @@
+"""Tests for the route edit journal and atomic routes file writes."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import RouteJournal, write_json_atomic
+
+def route(index, gateway="10.255.0.1"):
+    return {"ip": f"10.{index}.0.0", "mask": "255.255.0.0", "gateway": gateway}
+
+class RouteJournalTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.file_path = os.path.join(self.work_dir, "routes.json")
+        self.routes = {"routes": {"first": route(1), "second": route(2)}}
+        write_json_atomic(self.routes, self.file_path)
+    
+    def load(self):
+        """Read the routes file and replay the journal, as opening the file does"""
+        with open(self.file_path, "r") as file:
+            routes = json.load(file)
+        journal = RouteJournal(self.file_path)
+        return routes, journal.replay(routes)
+    
+    def test_record_and_replay(self):
+        journal = RouteJournal(self.file_path)
+        journal.record("third", route(3))
+        journal.record("first", None)
+        journal.record_batch([("second", route(2, "10.255.0.2")), ("fourth", route(4)), ("third", None)])
+        routes, entries = self.load()
+        self.assertEqual(entries, 5)
+        self.assertEqual(routes["routes"], {"second": route(2, "10.255.0.2"), "fourth": route(4)})
+    
+    def test_compaction_is_due_at_the_threshold(self):
+        journal = RouteJournal(self.file_path, compact_every=3)
+        self.assertFalse(journal.record("third", route(3)))
+        self.assertFalse(journal.record("first", None))
+        self.assertTrue(journal.record("fourth", route(4)))
+        
+        routes, entries = self.load()
+        journal.compact(routes)
+        self.assertFalse(os.path.exists(journal.journal_path))
+        self.assertEqual(journal.entries, 0)
+        self.assertEqual(self.load(), (routes, 0))
+        self.assertEqual(sorted(routes["routes"]), ["fourth", "second", "third"])
+        
+        # Entries made before reopening count towards the next compaction
+        journal.record("fifth", route(5))
+        journal = RouteJournal(self.file_path, compact_every=3)
+        list(journal.read())
+        self.assertFalse(journal.record("sixth", route(6)))
+        self.assertTrue(journal.record("seventh", route(7)))
+    
+    def test_failed_write_leaves_the_original(self):
+        with open(self.file_path, "rb") as file:
+            original = file.read()
+        journal = RouteJournal(self.file_path)
+        journal.record("third", route(3))
+        # Not JSON serializable, so the write fails part of the way through the routes
+        broken = {"routes": {"first": route(1), "third": {"ip": object()}}}
+        with self.assertRaises(TypeError):
+            journal.compact(broken)
+        with open(self.file_path, "rb") as file:
+            self.assertEqual(file.read(), original)
+        self.assertEqual(sorted(os.listdir(self.work_dir)), ["routes.json", "routes.json.journal"])
+        routes, entries = self.load()
+        self.assertEqual((entries, sorted(routes["routes"])), (1, ["first", "second", "third"]))
+    
+    def test_torn_last_line_is_ignored_and_cut_off(self):
+        journal = RouteJournal(self.file_path)
+        journal.record("third", route(3))
+        size = os.path.getsize(journal.journal_path)
+        with open(journal.journal_path, "a") as file:
+            line = json.dumps({"batch": [{"set": "fourth", "route": route(4)}, {"delete": "first"}]})
+            file.write(line[:len(line) // 2])
+        
+        routes, entries = self.load()
+        self.assertEqual((entries, sorted(routes["routes"])), (1, ["first", "second", "third"]))
+        self.assertEqual(os.path.getsize(journal.journal_path), size)
+        
+        # Later entries start on a clean line and replay
+        journal.record("fifth", route(5))
+        routes, entries = self.load()
+        self.assertEqual((entries, sorted(routes["routes"])), (2, ["fifth", "first", "second", "third"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Tests for parsing `route print` output and planning a reconcile against it."""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Routecli
+from Routecore import parse_route_print, plan_reconcile
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r") as file:
+        return file.read()
+
+class ParseRoutePrintTest(unittest.TestCase):
+    def setUp(self):
+        self.tables = parse_route_print(read_fixture("route_print.txt"))
+    
+    def test_active_routes(self):
+        active = self.tables["active"]
+        self.assertEqual(len(active), 18)
+        self.assertEqual(active[0], {"ip": "0.0.0.0", "mask": "0.0.0.0", "gateway": "192.168.1.1",
+                                     "metric": 25, "interface": "192.168.1.104"})
+        self.assertIn({"ip": "10.255.0.0", "mask": "255.255.255.0", "gateway": "On-link",
+                       "metric": 257, "interface": "10.255.0.101"}, active)
+    
+    def test_persistent_routes_with_default_metric(self):
+        self.assertEqual(self.tables["persistent"], [
+            {"ip": "10.1.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.12", "metric": None},
+            {"ip": "10.40.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.2", "metric": None},
+            {"ip": "10.50.16.0", "mask": "255.255.240.0", "gateway": "10.255.0.4", "metric": 5},
+        ])
+    
+    def test_ipv6_and_interface_list_are_skipped(self):
+        gateways = {record["gateway"] for table in self.tables.values() for record in table}
+        self.assertFalse(any(":" in gateway for gateway in gateways))
+
+class PlanReconcileTest(unittest.TestCase):
+    ROUTES = {
+        "installed": {"ip": "10.1.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.12"},
+        "persistent_only": {"ip": "10.40.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.2"},
+        "moved": {"ip": "10.20.0.0", "mask": "255.255.252.0", "gateway": "10.255.0.9"},
+        "split": {"ip": "10.30.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.2"},
+        "new": {"ip": "10.60.0.5", "mask": "255.255.0.0", "gateway": "10.255.0.4"},
+        "no_gateway": {"ip": "10.70.0.0", "mask": "255.255.0.0"},
+        "bad_gateway": {"ip": "10.80.0.0", "mask": "255.255.0.0", "gateway": "10.255.0"},
+    }
+    
+    def setUp(self):
+        self.system_routes = parse_route_print(read_fixture("route_print.txt"))
+    
+    def test_plan_is_minimal(self):
+        skipped = []
+        plan = plan_reconcile(self.ROUTES, self.system_routes, skipped=skipped)
+        self.assertEqual([(operation["action"], operation["name"]) for operation in plan],
+                         [("change", "moved"), ("delete", "split"), ("add", "split"), ("add", "new")])
+        self.assertEqual(plan[0]["old_gateway"], "10.255.0.2")
+        self.assertEqual(plan[3]["ip"], "10.60.0.0")
+        self.assertEqual(skipped, ["no_gateway", "bad_gateway"])
+    
+    def test_prune_deletes_only_managed_prefixes(self):
+        plan = plan_reconcile(self.ROUTES, self.system_routes, prune=True)
+        deletes = [(operation["ip"], operation["mask"], operation["gateway"])
+                   for operation in plan if operation["name"] is None]
+        self.assertEqual(deletes, [("10.50.16.0", "255.255.240.0", "10.255.0.4")])
+    
+    def test_matching_table_needs_nothing(self):
+        routes = {"installed": self.ROUTES["installed"], "persistent_only": self.ROUTES["persistent_only"]}
+        self.assertEqual(plan_reconcile(routes, self.system_routes), [])
+
+class CliPlanTest(unittest.TestCase):
+    def test_plan_skips_routes_without_a_gateway(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            routes_path = os.path.join(work_dir, "routes.json")
+            with open(routes_path, "w") as file:
+                json.dump({"routes": PlanReconcileTest.ROUTES}, file)
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                status = Routecli.main(["plan", routes_path, "--backend", "fake", "--json",
+                                        "--route-print", os.path.join(FIXTURES, "route_print.txt")])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(json.loads(stdout.getvalue())), 4)
+        self.assertIn("SKIPPED: no_gateway", stderr.getvalue())
+        self.assertIn("SKIPPED: bad_gateway", stderr.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
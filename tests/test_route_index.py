@@ -0,0 +1,133 @@
+"""Tests for longest-prefix and covering lookups, checked against a scan with ipaddress."""
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import CompactRouteTable, RouteIndex, SqliteRouteIndex, SqliteRouteStore, int_to_ip, prefix_to_mask
+
+def random_route(rng):
+    """A route inside 10.0.0.0/14, so that prefixes nest and collide often"""
+    prefix_length = rng.choice([0, 8, 12, 14, 16, 16, 20, 22, 24, 24, 24, 28, 30, 32])
+    address = (10 << 24) | rng.getrandbits(18)
+    return {"ip": int_to_ip(address), "mask": int_to_ip(prefix_to_mask(prefix_length)),
+            "gateway": f"10.255.0.{rng.randrange(1, 5)}"}
+
+def random_routes(rng, count):
+    routes = {f"route_{index:04d}": random_route(rng) for index in range(count)}
+    routes["bad_mask"] = {"ip": "10.0.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"}
+    routes["bad_ip"] = {"ip": "10.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"}
+    return routes
+
+def route_network(details):
+    try:
+        return ipaddress.IPv4Network(f"{details['ip']}/{details['mask']}", strict=False)
+    except ValueError:
+        return None
+
+def scan(routes, ip_str):
+    """(prefix length, name, cidr) of every valid route containing ip_str, found one route at a time"""
+    address = ipaddress.IPv4Address(ip_str)
+    found = []
+    for name, details in routes.items():
+        network = route_network(details)
+        if network is not None and address in network:
+            found.append((network.prefixlen, name, f"{network.network_address}/{network.prefixlen}"))
+    return found
+
+class RouteIndexTests:
+    """Tests shared by the in-memory and the SQLite route indexes"""
+    
+    def setUp(self):
+        self.rng = random.Random(7)
+        self.routes = random_routes(self.rng, 400)
+        self.index = self.make_index(self.routes)
+    
+    def destinations(self):
+        addresses = [int_to_ip((10 << 24) | self.rng.getrandbits(18)) for _ in range(300)]
+        # Network and broadcast addresses sit on the edges of the prefixes
+        networks = [route_network(details) for details in self.routes.values()]
+        for network in [network for network in networks if network is not None][:100]:
+            addresses += [str(network.network_address), str(network.broadcast_address)]
+        return addresses + ["192.168.1.1", "0.0.0.0", "255.255.255.255"]
+    
+    def assertMatchesScan(self):
+        for ip_str in self.destinations():
+            found = scan(self.routes, ip_str)
+            self.assertEqual(sorted(self.index.covering(ip_str)), sorted(name for _, name, _ in found), ip_str)
+            if not found:
+                self.assertIsNone(self.index.lookup(ip_str), ip_str)
+                continue
+            longest = max(prefix_length for prefix_length, _, _ in found)
+            cidr = next(cidr for prefix_length, _, cidr in found if prefix_length == longest)
+            names = sorted(name for prefix_length, name, _ in found if prefix_length == longest)
+            self.assertEqual(self.index.lookup(ip_str), (cidr, names), ip_str)
+    
+    def test_lookups_match_scan(self):
+        self.assertMatchesScan()
+        self.assertEqual(len(self.index), len(self.routes) - 2)
+    
+    def test_lookups_after_edits(self):
+        names = sorted(self.routes)
+        for name in self.rng.sample(names, 150):
+            self.remove(name)
+        for name in self.rng.sample(names, 50):
+            self.set(name, random_route(self.rng))
+        for index in range(100):
+            self.set(f"added_{index:03d}", random_route(self.rng))
+        self.set("default", {"ip": "0.0.0.0", "mask": "0.0.0.0", "gateway": "10.255.0.1"})
+        self.assertMatchesScan()
+    
+    def test_invalid_input(self):
+        self.assertIsNone(self.index.lookup("10.0.0"))
+        self.assertEqual(self.index.covering("not an address"), [])
+        self.assertNotIn("missing", self.index)
+
+class RouteIndexTest(RouteIndexTests, unittest.TestCase):
+    def make_index(self, routes):
+        return RouteIndex(routes)
+    
+    def set(self, name, details):
+        self.routes[name] = details
+        self.index.add(name, details)
+    
+    def remove(self, name):
+        self.routes.pop(name, None)
+        self.index.remove(name)
+    
+    def test_removing_every_route_empties_the_trie(self):
+        for name in list(self.routes):
+            self.remove(name)
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index._root)
+
+class CompactRouteIndexTest(RouteIndexTest):
+    def make_index(self, routes):
+        return RouteIndex(CompactRouteTable(routes))
+
+class SqliteRouteIndexTest(RouteIndexTests, unittest.TestCase):
+    def make_index(self, routes):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        file_path = os.path.join(work_dir.name, "routes.db")
+        SqliteRouteStore.create(file_path, routes)
+        self.store = SqliteRouteStore(file_path)
+        self.addCleanup(self.store.close)
+        return SqliteRouteIndex(self.store)
+    
+    def set(self, name, details):
+        self.routes[name] = details
+        self.store[name] = details
+        self.index.add(name, details)
+    
+    def remove(self, name):
+        self.routes.pop(name, None)
+        self.store.pop(name, None)
+        self.index.remove(name)
+
+if __name__ == "__main__":
+    unittest.main()
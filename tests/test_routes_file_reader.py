@@ -0,0 +1,168 @@
+"""Tests for the streaming routes file reader and background loads, checked against the json module."""
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import (ROUTE_LOAD_BATCH_MAX, ROUTE_LOAD_CHUNK_SIZE, CompactRouteTable, RouteFileLoad,
+                       RoutesFileError, RoutesFileReader, read_site_routes, route_prefix)
+
+CHUNK_SIZES = [1, 2, 3, 4, 5, 7, 16, 64, 4096, ROUTE_LOAD_CHUNK_SIZE]
+LOAD_TIMEOUT = 30
+
+def route(index):
+    return {"ip": f"10.{index >> 8 & 255}.{index & 255}.0", "mask": "255.255.255.0", "gateway": "10.255.0.1"}
+
+def read_routes(data, chunk_size):
+    return list(RoutesFileReader(io.BytesIO(data), chunk_size))
+
+def expected_routes(data):
+    return list(json.loads(data.decode("utf-8-sig"))["routes"].items())
+
+class RoutesFileReaderTest(unittest.TestCase):
+    def assertReadsLikeJson(self, data, chunk_sizes=CHUNK_SIZES):
+        expected = expected_routes(data)
+        for chunk_size in chunk_sizes:
+            self.assertEqual(read_routes(data, chunk_size), expected, f"chunk size {chunk_size}")
+    
+    def test_numbers_cut_by_a_chunk(self):
+        for number in ["1500.25", "1e5", "1E+5", "-2.5e-10", "0.125", "-0", "12345678901234567890", "3.0E2"]:
+            for document in [
+                f'{{"routes": {{"a": {{"ip": "10.0.0.0"}}}}, "tail": {number}, "z": 1}}',
+                f'{{"version": {number}, "routes": {{"a": {{"ip": "10.0.0.0", "metric": {number}}}, "b": {number}}}}}',
+                f'{{"routes": {{"a": {{"metric": {number}}}, "b": [{number}, {number}]}}, "tail": [{number}]}}',
+            ]:
+                with self.subTest(document=document):
+                    self.assertReadsLikeJson(document.encode(), range(1, 12))
+    
+    def test_chunk_size_does_not_change_the_routes(self):
+        routes = {f"route_{index:04d}": route(index) for index in range(300)}
+        routes["naïve é中 \\\"quoted\\\""] = route(1)
+        routes["nested"] = {"ip": "10.9.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.2",
+                            "tags": ["a", {"b": [1, 2.5, None, True]}], "note": "}, {"}
+        routes["not an object"] = "10.0.0.0/8"
+        routes["metric"] = {"ip": "10.8.0.0", "mask": "255.255.0.0", "gateway": "10.255.0.3", "metric": 2.5e-3}
+        document = {"version": 2, "comment": {"routes": "not these"}, "routes": routes, "after": [1.5, "x"]}
+        for text in [json.dumps(document, indent=4), json.dumps(document, separators=(",", ":")),
+                     json.dumps(document, ensure_ascii=False)]:
+            self.assertReadsLikeJson(text.encode())
+        self.assertReadsLikeJson(b"\xef\xbb\xbf" + json.dumps(document).encode())
+        self.assertReadsLikeJson(b'{"routes": {}}')
+        self.assertReadsLikeJson(b'{"routes": {"a": {}}}')
+    
+    def test_missing_routes_key(self):
+        self.assertEqual(read_routes(b'{"other": {"a": 1}}', 3), [])
+        self.assertEqual(read_routes(b'{}', 1), [])
+    
+    def test_error_positions(self):
+        for text in [
+            '{"routes": {"a": {"ip": "1"} "b": 1}}',
+            '{"routes": {"a": {"ip": "1"}, "b" 1}}',
+            '{"routes": {"a": {"ip": "1}}}',
+            '{"routes": {}}\n x',
+            '{"routes": {"a": {"ip": 1.}}}',
+            '{"x": [1, 2,], "routes": {}}',
+            '\n\n  {"routes": {"a":\n {"ip": tru}}}',
+            '{"routes": {"a": 1,}}',
+            '',
+            '{"routes": {"é": {"ip": "1"},\n "b": [}}}',
+            '{"routes": {"a": {"ip": "10.0.0.0"}}, "tail": 1500.}',
+        ]:
+            with self.assertRaises(json.JSONDecodeError) as expected:
+                json.loads(text)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(RoutesFileError) as raised:
+                        read_routes(text.encode(), chunk_size)
+                    error, json_error = raised.exception, expected.exception
+                    self.assertEqual((error.msg, error.pos, error.lineno, error.colno),
+                                     (json_error.msg, json_error.pos, json_error.lineno, json_error.colno))
+    
+    def test_routes_before_an_error_are_yielded(self):
+        reader = RoutesFileReader(io.BytesIO(b'{"routes": {"a": {"ip": "1"}, "b": {"ip": "2"}, "c" {}}}'), 4)
+        names = []
+        with self.assertRaises(RoutesFileError):
+            for name, details in reader:
+                names.append(name)
+        self.assertEqual(names, ["a", "b"])
+
+class RouteFileReadTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+    
+    def write(self, name, data):
+        file_path = os.path.join(self.work_dir, name)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+    
+    def test_number_across_the_chunk_boundary(self):
+        # Padded so that the file's first chunk ends right after "1500." and "1e"
+        for number, cut in [("1500.25", 5), ("1e5", 2), ("1.5e+5", 5)]:
+            start = b'{"routes": {"a": {"ip": "10.0.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"}}, '
+            padding = b" " * (ROUTE_LOAD_CHUNK_SIZE - len(start) - len(b'"tail": ') - cut)
+            file_path = self.write("routes.json", start + padding + f'"tail": {number}, "z": 1}}'.encode())
+            with self.subTest(number=number):
+                self.assertEqual(list(CompactRouteTable.read(file_path).items()),
+                                 [("a", {"ip": "10.0.0.0", "mask": "255.0.0.0", "gateway": "10.255.0.1"})])
+                report = read_site_routes(file_path)
+                self.assertIsNone(report["error"])
+                self.assertEqual(report["count"], 1)
+    
+    def load(self, file_path):
+        """Run a background load to the end; returns (items taken off the queue, the load)"""
+        load = RouteFileLoad(file_path)
+        load.start()
+        items = []
+        while not items or items[-1][0] == "routes":
+            items.append(load.queue.get(timeout=LOAD_TIMEOUT))
+        load.thread.join(LOAD_TIMEOUT)
+        return items, load
+    
+    def test_load_in_growing_batches(self):
+        routes = {f"route_{index:05d}": route(index) for index in range(5000)}
+        routes["broken"] = {"ip": "10.0.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"}
+        file_path = self.write("routes.json", json.dumps({"routes": routes}, indent=4).encode())
+        items, load = self.load(file_path)
+        self.assertEqual([kind for kind, batch in items], ["routes"] * (len(items) - 1) + ["done"])
+        sizes = [len(batch) for kind, batch in items]
+        self.assertEqual(sizes[:4], [100, 200, 400, 800])
+        self.assertLessEqual(max(sizes), ROUTE_LOAD_BATCH_MAX)
+        self.assertEqual([(name, details, prefix) for kind, batch in items for name, details, prefix in batch],
+                         [(name, details, route_prefix(details)) for name, details in routes.items()])
+        self.assertEqual((load.routes_read, load.progress()), (len(routes), 1.0))
+    
+    def test_load_error(self):
+        file_path = self.write("routes.json", b'{"routes": {"a": {"ip": "10.0.0.0"}, "b" {}}}')
+        items, load = self.load(file_path)
+        kind, error = items[-1]
+        self.assertEqual(kind, "error")
+        self.assertIsInstance(error, RoutesFileError)
+        self.assertEqual((error.msg, error.lineno, error.colno), ("Expecting ':' delimiter", 1, 42))
+    
+    def test_cancel_stops_the_worker(self):
+        routes = {f"route_{index:06d}": route(index) for index in range(100000)}
+        file_path = self.write("routes.json", json.dumps({"routes": routes}).encode())
+        load = RouteFileLoad(file_path)
+        load.start()
+        kind, batch = load.queue.get(timeout=LOAD_TIMEOUT)
+        self.assertEqual(kind, "routes")
+        # The worker is held up by the full queue, having read only part of the file
+        while not load.queue.full():
+            load.thread.join(0.01)
+        self.assertLess(load.progress(), 1.0)
+        self.assertLess(load.routes_read, len(routes))
+        load.cancel()
+        load.thread.join(LOAD_TIMEOUT)
+        self.assertFalse(load.thread.is_alive())
+        items = [load.queue.get_nowait() for _ in range(load.queue.qsize())]
+        self.assertNotIn("done", [kind for kind, batch in items])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests for the SQLite route store, checked against the same routes held in a dict."""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Routecore import SqliteRouteStore, route_cidr
+
+def route(index, gateway="10.255.0.1"):
+    return {"ip": f"10.{index >> 8 & 255}.{index & 255}.0", "mask": "255.255.255.0", "gateway": gateway}
+
+class SqliteRouteStoreTest(unittest.TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.file_path = os.path.join(work_dir.name, "routes.db")
+        self.routes = {f"route_{index:04d}": route(index, f"10.255.0.{index % 3 + 1}") for index in range(0, 600, 7)}
+        self.routes["no_gateway"] = {"ip": "10.1.0.0", "mask": "255.255.0.0", "gateway": ""}
+        self.routes["bad_mask"] = {"ip": "10.2.0.0", "mask": "255.0.255.0", "gateway": "10.255.0.1"}
+        SqliteRouteStore.create(self.file_path, self.routes)
+        self.store = self.open()
+    
+    def open(self):
+        store = SqliteRouteStore(self.file_path)
+        self.addCleanup(store.close)
+        return store
+    
+    def test_mapping_behaviour(self):
+        self.assertEqual(len(self.store), len(self.routes))
+        self.assertEqual(list(self.store), list(self.routes))
+        self.assertEqual(dict(self.store.items()), self.routes)
+        self.assertEqual(self.store["bad_mask"], self.routes["bad_mask"])
+        self.assertIn("no_gateway", self.store)
+        self.assertNotIn("missing", self.store)
+        with self.assertRaises(KeyError):
+            self.store["missing"]
+        with self.assertRaises(KeyError):
+            del self.store["missing"]
+        
+        self.store["route_0000"] = route(1, "10.255.0.9")
+        self.store["added"] = route(2)
+        del self.store["route_0007"]
+        self.assertEqual(self.store.pop("bad_mask"), self.routes["bad_mask"])
+        self.assertIsNone(self.store.get("bad_mask"))
+        self.store.update({"updated": route(3)})
+        self.routes.update({"route_0000": route(1, "10.255.0.9"), "added": route(2), "updated": route(3)})
+        del self.routes["route_0007"], self.routes["bad_mask"]
+        self.assertEqual(len(self.store), len(self.routes))
+        self.assertEqual(dict(self.store.items()), self.routes)
+        
+        # Every write is committed as it is made
+        self.store.close()
+        self.assertEqual(dict(self.open().items()), self.routes)
+    
+    def test_apply_changes_is_one_transaction(self):
+        self.store.apply_changes([("route_0000", None), ("added", route(1)), ("route_0007", route(2, "10.255.0.9"))])
+        self.assertNotIn("route_0000", self.store)
+        self.assertEqual((self.store["added"], self.store["route_0007"]), (route(1), route(2, "10.255.0.9")))
+        self.assertEqual(len(self.store), len(self.routes))
+        
+        before = dict(self.store.items())
+        with self.assertRaises(AttributeError):
+            self.store.apply_changes([("route_0014", None), ("changed", route(4)), ("broken", "not a route")])
+        with self.assertRaises(sqlite3.Error):
+            self.store.apply_changes([("changed", route(4)), (["not", "a", "name"], None)])
+        self.assertEqual(dict(self.store.items()), before)
+        self.assertEqual(len(self.store), len(before))
+    
+    def test_paged_queries_by_name(self):
+        names = sorted(self.routes)
+        self.assertEqual([row[0] for row in self.store.page("", (), 10, 25)], names[10:35])
+        self.assertEqual(self.store.page("", (), 0, 1), [("bad_mask", "", "10.255.0.1")])
+        self.assertEqual(self.store.page("", (), len(names), 10), [])
+        self.assertEqual([self.store.rank(name) for name in names], list(range(len(names))))
+        self.assertIsNone(self.store.rank("missing"))
+    
+    def test_filtered_queries_match_dict(self):
+        for where, params, matches in [
+            ("cidr LIKE ?", ("10.0.1%",), lambda name, details: route_cidr(details).startswith("10.0.1")),
+            ("gateway = ?", ("10.255.0.2",), lambda name, details: details["gateway"] == "10.255.0.2"),
+            ("network IS NULL", (), lambda name, details: not route_cidr(details)),
+        ]:
+            names = sorted(name for name, details in self.routes.items() if matches(name, details))
+            self.assertTrue(names, where)
+            self.assertEqual(self.store.count(where, params), len(names), where)
+            rows = self.store.page(where, params, 0, len(self.routes))
+            self.assertEqual(rows, [(name, route_cidr(self.routes[name]), self.routes[name]["gateway"])
+                                    for name in names], where)
+            self.assertEqual(self.store.page(where, params, 1, 2), rows[1:3], where)
+            self.assertEqual([self.store.rank(name, where, params) for name in names], list(range(len(names))))
+            outside = next(name for name in self.routes if name not in names)
+            self.assertIsNone(self.store.rank(outside, where, params), where)
+    
+    def test_gateway_queries(self):
+        self.assertEqual(self.store.gateway_routes("10.255.0.2"),
+                         sorted(name for name, details in self.routes.items() if details["gateway"] == "10.255.0.2"))
+        self.assertEqual(self.store.gateway_routes(""), ["no_gateway"])
+        counts = {}
+        for details in self.routes.values():
+            counts[details["gateway"]] = counts.get(details["gateway"], 0) + 1
+        self.assertEqual(self.store.gateway_counts(), sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+    
+    def test_dump_json_round_trips(self):
+        dump_path = f"{self.file_path}.json"
+        with open(dump_path, "w") as file:
+            self.store.dump_json(file)
+        with open(dump_path, "r") as file:
+            text = file.read()
+        self.assertEqual(text, json.dumps({"routes": self.routes}, indent=4))
+
+if __name__ == "__main__":
+    unittest.main()